@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 import traceback
-from openai import OpenAI
 from dotenv import load_dotenv
 from common.helper import EventHandler
+from common.client import get_client
 
 
 # 環境変数をロードします。
 load_dotenv()
 # OpenAIクライアントを初期化します。
-client = OpenAI(default_headers={"OpenAI-Beta": "assistants=v1"})
+client = get_client(default_headers={"OpenAI-Beta": "assistants=v1"})
 
 assistant = None
 thread = None
@@ -6,22 +6,43 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
 
-from openai import OpenAI
 from dotenv import load_dotenv
-import json
+from typing import List
+from typing_extensions import Annotated, TypedDict
 
-from common.helper import retrieve_runs, transform_latest_assistant_messages
+from common.helper import retrieve_runs
+from common.message_cache import ThreadMessageCache
+from common.payload_sink import open_payload_sink
+from common.tool_registry import ToolRegistry
+from common.client import get_client
 
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
 
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 THREAD_ID = os.getenv("THREAD_ID")
 FILE_ID = os.getenv("FILE_ID")
+# QAの出力先（拡張子で JSONL / SQLite / Parquet を選択します）
+QA_OUTPUT_PATH = os.getenv("QA_OUTPUT_PATH", "./qa_output.jsonl")
 
 
-def transport_qa_data(qa_data):
-    print(json.dumps(qa_data, indent=2, ensure_ascii=False))
+# アシスタントが使用するツールのレジストリ
+tools = ToolRegistry()
+
+# 転送されたQAの出力先。書き込みはバックグラウンドでまとめて行います
+sink = open_payload_sink(QA_OUTPUT_PATH)
+
+
+class QAData(TypedDict):
+    question: Annotated[str, "質問の内容"]
+    answer: Annotated[str, "questionに対する回答の内容"]
+
+
+@tools.tool(description="質問と回答のペアデータを外部システムに転送する。")
+def transport_qa_data(qa_data: List[QAData]):
+    # ファイルへの書き込みを待たずにツールの出力を返す
+    sink.write_many(qa_data)
+    print(f"{len(qa_data)}件のQAを {QA_OUTPUT_PATH} に転送しました")
     return "OK"
 
 
@@ -37,39 +58,7 @@ Please create the data in Japanese.
 Respond only with confirmation of the transfer to the user.
 """,
         file_ids=[FILE_ID],
-        tools=[
-            {"type": "retrieval"},
-            {
-                "type": "function",
-                "function": {
-                    "name": "transport_qa_data",
-                    "description": "質問と回答のペアデータを外部システムに転送する。",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "qa_data": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "question": {
-                                            "type": "string",
-                                            "description": "質問の内容",
-                                        },
-                                        "answer": {
-                                            "type": "string",
-                                            "description": "questionに対する回答の内容",
-                                        },
-                                    },
-                                    "required": ["question", "answer"],
-                                },
-                            }
-                        },
-                        "required": ["qa_data"],
-                    },
-                },
-            },
-        ],
+        tools=[{"type": "retrieval"}, *tools.schemas()],
     )
 
     client.beta.threads.messages.create(
@@ -91,9 +80,8 @@ Respond only with confirmation of the transfer to the user.
             tool_call_id = required_action.id
             func_name = required_action.function.name
             args_str = required_action.function.arguments
-            args_dict = json.loads(args_str)
 
-            result = globals()[func_name](**args_dict)
+            result = tools.dispatch(func_name, args_str)
             tool_outputs.append({"tool_call_id": tool_call_id, "output": result})
 
         run = client.beta.threads.runs.submit_tool_outputs(
@@ -106,12 +94,15 @@ Respond only with confirmation of the transfer to the user.
 
         print(run)
 
-    messages = client.beta.threads.messages.list(thread_id=THREAD_ID)
-    result = transform_latest_assistant_messages(messages=messages)
+    # 長いスレッドでも最新のuserメッセージ以降だけを取得する
+    result = ThreadMessageCache(client, THREAD_ID).transform_latest()
 
     for message in result:
         print(message["content"]["value"])
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        sink.close()
@@ -6,13 +6,15 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
 
-from openai import OpenAI
-from common.utils import update_env_file
+from common.config_store import shared_config
 from common.helper import retrieve_runs
+from common.upload_cache import UploadCache
+from common.client import get_client
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
+upload_cache = UploadCache(client)
 
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 THREAD_ID = os.getenv("THREAD_ID")
@@ -20,22 +22,23 @@ FILE_ID = os.getenv("FILE_ID")
 
 
 def main():
-    if ASSISTANT_ID:
-        client.beta.assistants.delete(assistant_id=ASSISTANT_ID)
-        update_env_file(
-            env_file_path=".env", key_to_update="ASSISTANT_ID", new_value=""
-        )
-    if THREAD_ID:
-        client.beta.threads.delete(thread_id=THREAD_ID)
-        update_env_file(env_file_path=".env", key_to_update="THREAD_ID", new_value="")
-
-    if FILE_ID:
-        client.files.delete(file_id=FILE_ID)
-        update_env_file(env_file_path=".env", key_to_update="FILE_ID", new_value="")
-
-    file = client.files.create(
-        file=open("../sample_files/manual.pdf", "rb"), purpose="assistants"
-    )
+    config = shared_config(".env")
+    # 削除したリソースのIDはまとめて1回でクリアする
+    with config.batch() as env:
+        if ASSISTANT_ID:
+            client.beta.assistants.delete(assistant_id=ASSISTANT_ID)
+            env["ASSISTANT_ID"] = ""
+        if THREAD_ID:
+            client.beta.threads.delete(thread_id=THREAD_ID)
+            env["THREAD_ID"] = ""
+
+    # 同じ内容のファイルがアップロード済みであれば再利用する
+    file = upload_cache.upload("../sample_files/manual.pdf")
+
+    # 以前のファイルが再利用したものと異なる場合のみ削除する
+    if FILE_ID and FILE_ID != file.id:
+        upload_cache.evict(FILE_ID, delete_remote=True)
+        config.update(FILE_ID="")
 
     assistant = client.beta.assistants.create(
         instructions="あなたは資料を参照してその内容について処理をするアシスタントボットです。",
@@ -46,13 +49,7 @@ def main():
 
     thread = client.beta.threads.create()
 
-    update_env_file(env_file_path=".env", key_to_update="FILE_ID", new_value=file.id)
-    update_env_file(
-        env_file_path=".env", key_to_update="ASSISTANT_ID", new_value=assistant.id
-    )
-    update_env_file(
-        env_file_path=".env", key_to_update="THREAD_ID", new_value=thread.id
-    )
+    config.update(FILE_ID=file.id, ASSISTANT_ID=assistant.id, THREAD_ID=thread.id)
 
     client.beta.threads.messages.create(
         thread_id=thread.id,
@@ -1,18 +1,87 @@
-from fastapi import FastAPI, Request, Path
-from fastapi.responses import StreamingResponse
+import sys
+import os
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(project_root)
+
+from fastapi import FastAPI, Header, Request, Path
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
-from openai import OpenAI
-from openai import AssistantEventHandler
 import threading
-import queue
 import asyncio
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 import json
+import openai
+
+from common.coalesce import DeltaCoalescer, iter_coalesced, aiter_coalesced
+from common.event_log import EventGap, EventLog, RunHub
+from common.registry import AssistantRegistry
+from common.relay import (
+    AsyncRelayQueue,
+    RelayClosed,
+    RelayQueue,
+    cancel_run_in_background,
+)
+from common.run_metrics import (
+    CONTENT_TYPE,
+    AsyncTimedEventHandler,
+    TimedEventHandler,
+    render_metrics,
+)
+from common.client import get_client, get_async_client
 
 # OpenAIクライアントのインスタンス化
-client = OpenAI()
+client = get_client()
+async_client = get_async_client()
+
+# ストリーミングの実行方式
+# "async": AsyncOpenAIとasyncio.Queueでイベントループ上で完結させる（デフォルト）
+# "thread": リクエストごとにスレッドを起動し、queue.Queue経由で受け渡す（従来方式）
+STREAM_MODE = os.getenv("STREAM_MODE", "async")
+
+# ストリームの終了を表すマーカー
+STOP = "STOP"
+
+# 差分をまとめて送信する間隔（ミリ秒）とサイズ（バイト）
+# SSE_FLUSH_MS=0 の場合は差分ごとに1フレームを送信します。
+SSE_FLUSH_MS = float(os.getenv("SSE_FLUSH_MS", "50"))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "1024"))
+# 送信待ちの差分を溜めるキューの上限と、満杯のときの方針（block / drop）は
+# 環境変数 RELAY_QUEUE_SIZE と RELAY_QUEUE_POLICY で指定します（common/relay.py）。
+# 再接続のために保持するイベント数と、再接続を待つ秒数は
+# 環境変数 EVENT_LOG_SIZE と RESUME_GRACE_SECONDS で指定します（common/event_log.py）。
+
+
+# アシスタントのレジストリ
+# 同じ設定のアシスタントをワーカー間・再起動間で共有します。
+registry = AssistantRegistry()
+
+# アシスタントの作成パラメータ
+ASSISTANT_PARAMS = dict(
+    name="数学の家庭教師",
+    description="あなたは数学の家庭教師です。コードを書いて実行し、数学の質問に答えてください。",
+    tools=[{"type": "code_interpreter"}],
+    model="gpt-4o",
+)
+
+
+def refresh_assistant(stale_id: str):
+    """
+    runの開始が NotFoundError で失敗したときに呼び出し、登録済みのアシスタントが削除されていれば作成し直します。
+
+    Parameters:
+    stale_id (str): 失敗したrunで使用したアシスタントのID。
+
+    Returns:
+    Optional[RegistryEntry]: 作成し直したアシスタントのエントリ。アシスタントが存在していた場合はNone。
+    """
+    entry = registry.assistant(client, verify=True, **ASSISTANT_PARAMS)
+    app.state.assistant = entry
+    return None if entry.id == stale_id else entry
 
 
 @asynccontextmanager
@@ -21,32 +90,19 @@ async def app_lifespan(app: FastAPI):
         # アプリケーションの初期化
         print("アプリケーションが開始します。")
         # ここでデータベース接続や初期設定を行う
-        app.state.assistant = client.beta.assistants.create(
-            name="数学の家庭教師",
-            description="あなたは数学の家庭教師です。コードを書いて実行し、数学の質問に答えてください。",
-            tools=[{"type": "code_interpreter"}],
-            model="gpt-4o",
-        )
-        # app.state.my_thread = client.beta.threads.create()
-        print("-----assistantの生成-------")
+        # レジストリに登録済みであればネットワーク通信なしでアシスタントを取得する
+        # （削除されていた場合は、最初のrunの開始時に refresh_assistant で作成し直す）
+        app.state.assistant = registry.assistant(client, **ASSISTANT_PARAMS)
+        print("-----assistantの取得-------")
         print(app.state.assistant)
-        # print("------threadの生成---------")
-        # print(app.state.my_thread)
 
         yield  # サーバが起動している間、ここで待機
 
     finally:
         # アプリケーションのクリーンアップ
         print("アプリケーションが終了します。")
-        # ここでデータベースの接続解除やクリーンアップを行う
-        # スレッドとアシスタントを削除するクリーンアップ処理を行います。
-        # if app.state.my_thread:
-        #     result_del = client.beta.threads.delete(app.state.my_thread.id)
-        #     print(result_del)
-
-        if app.state.assistant:
-            result_del_assistant = client.beta.assistants.delete(app.state.assistant.id)
-            print(result_del_assistant)
+        # アシスタントはレジストリを通じて他のワーカーと共有しているため、ここでは削除しない
+        # 削除する場合は maintainance_tools のスクリプトを使用する
 
 
 app = FastAPI(lifespan=app_lifespan)  # type: ignore
@@ -85,72 +141,261 @@ async def chat(request: ChatRequest):
     return res_dict
 
 
-def stream_data(q):
-    """イベントストリーム形式でデータを生成するジェネレータ"""
+@app.get("/metrics")
+def metrics():
+    """runの計測値（最初のトークンまでの時間など）を Prometheus のテキスト形式で返します。"""
+    return PlainTextResponse(render_metrics() + streams.render(), media_type=CONTENT_TYPE)
+
+
+def new_coalescer():
+    """サーバーの設定に従って差分をまとめるバッファを生成します。"""
+    return DeltaCoalescer(flush_interval_ms=SSE_FLUSH_MS, flush_bytes=SSE_FLUSH_BYTES)
+
+
+def sse_frame(data, event_id=None):
+    """
+    JSONでエンコードしてからSSEフォーマットの1フレームを生成します。
+    IDを指定した場合は id フィールドを付けます（再接続時に Last-Event-ID として送られます）。
+    """
+    frame = f'data: {json.dumps({"message": data})}\n\n'
+    return frame if event_id is None else f"id: {event_id}\n{frame}"
+
+
+# ストリームの終了を表すイベント。クライアントはこれを受け取ったら再接続しない
+DONE_FRAME = "event: done\ndata: {}\n\n"
+
+# 受信が遅れて続きのイベントが削除され、応答を最後まで送れないことを表すイベント
+RESET_FRAME = "event: reset\ndata: {}\n\n"
+
+# threadごとの最新のrunのイベントログ
+# クライアントが再接続した場合や、同じthreadを別のタブで開いた場合は、
+# 新しいrunを開始せずにここから再生します。
+streams = RunHub()
+
+
+async def follow_log(log: EventLog, after_id: Optional[int]):
+    """
+    イベントログからイベントストリーム形式でデータを生成する非同期ジェネレータ
+    続きのイベントが削除されている場合は、欠けた応答を続けずに reset イベントを送って終了します。
+    """
     try:
-        while True:
-            data = q.get()
-            print(data, end="", flush=True)
-            if data == "STOP":
-                break
-            # JSONでエンコードしてからSSEフォーマットで送信
-            yield f'data: {json.dumps({"message": data})}\n\n'
-            q.task_done()
-    finally:
-        q.task_done()
+        async for event_id, data in log.follow(after_id):
+            yield sse_frame(data, event_id)
+    except EventGap:
+        yield RESET_FRAME
+        return
+    yield DONE_FRAME
 
 
-@app.get("/stream/{thread_id}")
-async def stream_response(
-    base: Request, thread_id: str = Path(..., description="threadのid")
-):
-    assistant = base.app.state.assistant
-    q = queue.Queue()
+def tool_call_delta_texts(delta):
+    """
+    code_interpreterのツール呼び出しの差分から、クライアントに送信する文字列を取り出します。
+
+    Parameters:
+    delta (ToolCallDelta): ツールの呼び出しの変更内容を含むデルタオブジェクト。
+
+    Returns:
+    list: 送信する文字列のリスト。
+    """
+    texts = []
+    if delta.type == "code_interpreter":
+        if delta.code_interpreter.input:  # type: ignore
+            texts.append(delta.code_interpreter.input)  # type: ignore
+        if delta.code_interpreter.outputs:  # type: ignore
+            texts.append(f"\n\noutput >")
+            for output in delta.code_interpreter.outputs:  # type: ignore
+                if output.type == "logs":
+                    texts.append(f"\n{output.logs}")
+    return texts
+
+
+def report_dropped(q):
+    """drop の方針で捨てた差分の数を出力します。"""
+    if q.dropped:
+        print(f"キューが満杯のため {q.dropped} 件の差分を捨てました。")
+
 
-    class EventHandler(AssistantEventHandler):
+def start_run_async(assistant, thread_id: str) -> EventLog:
+    """
+    AsyncOpenAIを使用して、イベントループ上でrunのストリームをイベントログに書き込みます。
+    ストリームごとにOSスレッドを消費しないため、多数の同時接続を保持できます。
+    差分はキューを経由してまとめてから、1つのイベントとしてログに追加します。
+
+    Parameters:
+    assistant (Assistant): 使用するアシスタント。
+    thread_id (str): threadのid。
+
+    Returns:
+    EventLog: runのイベントログ。
+    """
+    q = AsyncRelayQueue()
+
+    class AsyncEventHandler(AsyncTimedEventHandler):
+        async def on_text_created(self, text):
+            await q.publish("")
+
+        async def on_text_delta(self, delta, snapshot):
+            await q.publish(delta.value)
+
+        async def on_tool_call_created(self, tool_call):
+            await q.publish(f"{tool_call.type}")
+
+        async def on_tool_call_delta(self, delta, snapshot):
+            for text in tool_call_delta_texts(delta):
+                await q.publish(text)
+
+    handler = AsyncEventHandler()
+
+    def open_stream(assistant_id):
+        return async_client.beta.threads.runs.stream(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            event_handler=handler,
+        )
+
+    async def assistant_event():
+        try:
+            async with AsyncExitStack() as stack:
+                try:
+                    stream = await stack.enter_async_context(open_stream(assistant.id))
+                except openai.NotFoundError:
+                    renewed = await asyncio.to_thread(refresh_assistant, assistant.id)
+                    if renewed is None:
+                        raise
+                    stream = await stack.enter_async_context(open_stream(renewed.id))
+                await stream.until_done()
+        except RelayClosed:
+            # abandon() でrunをキャンセル済み
+            pass
+        except asyncio.CancelledError:
+            q.close()
+            raise
+        except Exception as e:
+            print(f"Error occurred: {e}")
+        finally:
+            await q.finish(STOP)
+
+    async def pump():
+        try:
+            async for data in aiter_coalesced(q, new_coalescer(), STOP):
+                log.append(data)
+        finally:
+            report_dropped(q)
+            streams.finish(thread_id, log)
+
+    def abandon():
+        # 猶予時間内に再接続がなかったので、runのストリームを止め、runもキャンセルする
+        q.close()
+        task.cancel()
+        pump_task.cancel()
+        cancel_run_in_background(client, handler.current_run)
+
+    log = streams.start(thread_id, on_abandon=abandon)
+    task = asyncio.create_task(assistant_event())
+    pump_task = asyncio.create_task(pump())
+    return log
+
+
+def start_run_thread(assistant, thread_id: str) -> EventLog:
+    """
+    リクエストごとにスレッドを起動し、同期クライアントでrunのストリームをイベントログに書き込みます。
+
+    Parameters:
+    assistant (Assistant): 使用するアシスタント。
+    thread_id (str): threadのid。
+
+    Returns:
+    EventLog: runのイベントログ。
+    """
+    q = RelayQueue()
+    loop = asyncio.get_running_loop()
+
+    class EventHandler(TimedEventHandler):
         def on_text_created(self, text):
-            # q.put(f"\n")
-            q.put("")
+            # q.publish(f"\n")
+            q.publish("")
 
         def on_text_delta(self, delta, snapshot):
-            q.put(delta.value)
+            q.publish(delta.value)
 
         def on_tool_call_created(self, tool_call):
-            # q.put(f"\n{tool_call.type}\n")
-            q.put(f"{tool_call.type}")
+            # q.publish(f"\n{tool_call.type}\n")
+            q.publish(f"{tool_call.type}")
 
         def on_tool_call_delta(self, delta, snapshot):
-            if delta.type == "code_interpreter":
-                if delta.code_interpreter.input:  # type: ignore
-                    q.put(delta.code_interpreter.input)  # type: ignore
-                if delta.code_interpreter.outputs:  # type: ignore
-                    q.put(f"\n\noutput >")
-                    for output in delta.code_interpreter.outputs:  # type: ignore
-                        if output.type == "logs":
-                            q.put(f"\n{output.logs}")
+            for text in tool_call_delta_texts(delta):
+                q.publish(text)
+
+    handler = EventHandler()
+
+    def open_stream(assistant_id):
+        return client.beta.threads.runs.stream(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            event_handler=handler,
+        )
 
     def assistant_event():
         try:
-            with client.beta.threads.runs.stream(
-                thread_id=thread_id,
-                assistant_id=assistant.id,
-                event_handler=EventHandler(),
-            ) as stream:
+            with ExitStack() as stack:
+                try:
+                    stream = stack.enter_context(open_stream(assistant.id))
+                except openai.NotFoundError:
+                    renewed = refresh_assistant(assistant.id)
+                    if renewed is None:
+                        raise
+                    stream = stack.enter_context(open_stream(renewed.id))
                 stream.until_done()
+        except RelayClosed:
+            # abandon() でrunをキャンセル済み
+            pass
         except Exception as e:
             print(f"Error occurred: {e}")
         finally:
-            q.put("STOP")
+            q.finish(STOP)
+
+    def pump():
+        # EventLog はイベントループ上で操作する
+        try:
+            for data in iter_coalesced(q, new_coalescer(), STOP):
+                loop.call_soon_threadsafe(log.append, data)
+        except RelayClosed:
+            pass
+        finally:
+            report_dropped(q)
+            loop.call_soon_threadsafe(streams.finish, thread_id, log)
+
+    def abandon():
+        # 猶予時間内に再接続がなかったので、キューを閉じてスレッドを終了させ、runをキャンセルする
+        q.close()
+        cancel_run_in_background(client, handler.current_run)
 
-    assistant_event_thread = threading.Thread(target=assistant_event)
-    assistant_event_thread.start()
+    log = streams.start(thread_id, on_abandon=abandon)
+    threading.Thread(target=assistant_event).start()
+    threading.Thread(target=pump, daemon=True).start()
+    return log
 
-    # # 既存のThreadを使用してメッセージを取得
-    # async def event_stream():
-    #     while True:
-    #         # OpenAIからの応答を待機し、発生するたびにyield
-    #         # サンプルでは応答をシミュレート
-    #         yield f'data: {{"message": "Response from OpenAI"}}\n\n'
-    #         await asyncio.sleep(1)  # 応答間隔をシミュレート
 
-    return StreamingResponse(stream_data(q), media_type="text/event-stream")
+@app.get("/stream/{thread_id}")
+async def stream_response(
+    base: Request,
+    thread_id: str = Path(..., description="threadのid"),
+    last_event_id: Optional[str] = Header(None, description="最後に受け取ったイベントのID"),
+):
+    if last_event_id is not None:
+        # EventSource の再接続。新しいrunは開始せず、イベントログから続きを再生する
+        log = streams.get(thread_id)
+        if log is None or not last_event_id.isdigit() or not log.knows(int(last_event_id)):
+            # 再生できない場合（続きのイベントが削除された場合を含む）は 204 を返して、
+            # EventSource に再接続をやめさせる
+            return Response(status_code=204)
+        return StreamingResponse(
+            follow_log(log, int(last_event_id)), media_type="text/event-stream"
+        )
+
+    # 同じthreadで実行中のrunがあれば、最初から追いついてそのrunを共有する
+    # （runは全員が切断してから RESUME_GRACE_SECONDS が過ぎると中止されます）
+    assistant = base.app.state.assistant
+    start_run = start_run_thread if STREAM_MODE == "thread" else start_run_async
+    log = streams.open(thread_id, lambda: start_run(assistant, thread_id))
+    return StreamingResponse(follow_log(log, None), media_type="text/event-stream")
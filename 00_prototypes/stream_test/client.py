@@ -1,28 +1,29 @@
-import requests
-import json
+import sys
+import os
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(project_root)
+
+from common.stream_client import StreamClient
+
+# FastAPIサーバーのURL
+# 1つのセッションで接続を再利用するため、ターンごとにTCP接続を作り直さない
+stream_client = StreamClient("http://localhost:8000")
 
 
 def send_message_and_get_stream(message):
-    url = "http://localhost:8000/assistant/queue"  # FastAPIサーバーのエンドポイント
-    headers = {"Content-Type": "application/json"}
-    data = json.dumps({"message": message})
-
-    with requests.post(url, headers=headers, data=data, stream=True) as response:
-        buffer = b""  # バッファの初期化
-        print("ボット: ", end="", flush=True)
-        try:
-            for byte in response.iter_content(chunk_size=1):
-                buffer += byte
-                try:
-                    char = buffer.decode("utf-8")
-                    print(char, end="", flush=True)
-                    buffer = b""  # バッファをクリア
-                except UnicodeDecodeError:
-                    # マルチバイト文字の途中であれば、バッファに蓄積を続ける
-                    continue
-            print()  # レスポンスの後に改行を入れる
-        except Exception as e:
-            print(f"\nAn error occurred: {e}")
+    print("ボット: ", end="", flush=True)
+    try:
+        # 大きめのチャンクで読み込み、マルチバイト文字の途中で分割されても正しくデコードする
+        for text in stream_client.iter_text(
+            "POST", "/assistant/queue", json={"message": message}
+        ):
+            print(text, end="", flush=True)
+        print()  # レスポンスの後に改行を入れる
+    except Exception as e:
+        print(f"\nAn error occurred: {e}")
 
 
 # 使用例
@@ -31,3 +32,5 @@ while True:
     if input_msg == "さようなら":
         break
     send_message_and_get_stream(input_msg)
+
+stream_client.close()
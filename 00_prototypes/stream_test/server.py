@@ -1,12 +1,68 @@
+import sys
+import os
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(project_root)
+
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI
-from openai import AssistantEventHandler
 import threading
-import queue
-from contextlib import asynccontextmanager
+from contextlib import ExitStack, asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+import openai
+
+from common.registry import AssistantRegistry
+from common.client import get_client
+from common.relay import (
+    RelayClosed,
+    RelayQueue,
+    aiter_in_thread,
+    cancel_run,
+    cancel_run_in_background,
+)
+from common.run_metrics import CONTENT_TYPE, TimedEventHandler, render_metrics
+
+# アシスタントとスレッドのレジストリ
+# 同じ設定のアシスタントとスレッドをワーカー間・再起動間で共有します。
+registry = AssistantRegistry()
+
+# アシスタントの作成パラメータと、スレッドを識別する名前
+ASSISTANT_PARAMS = dict(
+    name="数学の家庭教師",
+    description="あなたは数学の家庭教師です。コードを書いて実行し、数学の質問に答えてください。",
+    tools=[{"type": "code_interpreter"}],
+    model="gpt-4-turbo-2024-04-09",
+)
+THREAD_NAME = "stream_test"
+
+
+def refresh_resources() -> bool:
+    """
+    NotFoundError を受けたときに呼び出し、登録済みのアシスタントとスレッドが削除されていれば作成し直します。
+
+    Returns:
+    bool: どちらかを作成し直した場合はTrue。
+    """
+    stale = (app.state.assistant.id, app.state.my_thread.id)
+    app.state.assistant = registry.assistant(client, verify=True, **ASSISTANT_PARAMS)
+    app.state.my_thread = registry.thread(client, name=THREAD_NAME, verify=True)
+    return (app.state.assistant.id, app.state.my_thread.id) != stale
+
+
+def with_recovery(request):
+    """
+    request(アシスタント, スレッド) を実行し、NotFoundError で失敗した場合は
+    削除されていたアシスタントやスレッドを作成し直してから1回だけ再試行します。
+    """
+    try:
+        return request(app.state.assistant, app.state.my_thread)
+    except openai.NotFoundError:
+        if not refresh_resources():
+            raise
+        return request(app.state.assistant, app.state.my_thread)
 
 
 @asynccontextmanager
@@ -15,16 +71,13 @@ async def app_lifespan(app: FastAPI):
         # アプリケーションの初期化
         print("アプリケーションが開始します。")
         # ここでデータベース接続や初期設定を行う
-        app.state.assistant = client.beta.assistants.create(
-            name="数学の家庭教師",
-            description="あなたは数学の家庭教師です。コードを書いて実行し、数学の質問に答えてください。",
-            tools=[{"type": "code_interpreter"}],
-            model="gpt-4-turbo-2024-04-09",
-        )
-        app.state.my_thread = client.beta.threads.create()
-        print("-----assistantの生成-------")
+        # レジストリに登録済みであればネットワーク通信なしで取得する
+        # （削除されていた場合は、リクエストで NotFoundError を受けたときに with_recovery で作成し直す）
+        app.state.assistant = registry.assistant(client, **ASSISTANT_PARAMS)
+        app.state.my_thread = registry.thread(client, name=THREAD_NAME)
+        print("-----assistantの取得-------")
         print(app.state.assistant)
-        print("------threadの生成---------")
+        print("------threadの取得---------")
         print(app.state.my_thread)
 
         yield  # サーバが起動している間、ここで待機
@@ -32,15 +85,8 @@ async def app_lifespan(app: FastAPI):
     finally:
         # アプリケーションのクリーンアップ
         print("アプリケーションが終了します。")
-        # ここでデータベースの接続解除やクリーンアップを行う
-        # スレッドとアシスタントを削除するクリーンアップ処理を行います。
-        if app.state.my_thread:
-            result_del = client.beta.threads.delete(app.state.my_thread.id)
-            print(result_del)
-
-        if app.state.assistant:
-            result_del_assistant = client.beta.assistants.delete(app.state.assistant.id)
-            print(result_del_assistant)
+        # スレッドとアシスタントはレジストリを通じて他のワーカーと共有しているため、ここでは削除しない
+        # 削除する場合は maintainance_tools のスクリプトを使用する
 
 
 app = FastAPI(lifespan=app_lifespan)  # type: ignore
@@ -55,13 +101,19 @@ app.add_middleware(
 )
 
 # OpenAIクライアントのインスタンス化
-client = OpenAI()
+client = get_client()
 
 
 class ChatRequest(BaseModel):
     message: str
 
 
+@app.get("/metrics")
+def metrics():
+    """runの計測値（最初のトークンまでの時間など）を Prometheus のテキスト形式で返します。"""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
 @app.post("/chat")
 def chat(request: ChatRequest):
     def generate():
@@ -86,32 +138,42 @@ def chat(request: ChatRequest):
 # パターンA
 @app.post("/assistant")
 def assistant_stream(request: ChatRequest, base: Request):
-    my_thread = base.app.state.my_thread
-    assistant = base.app.state.assistant
+    handler = TimedEventHandler()
 
     def generate():
         try:
-            client.beta.threads.messages.create(
-                thread_id=my_thread.id, role="user", content=request.message
+            with_recovery(
+                lambda assistant, my_thread: client.beta.threads.messages.create(
+                    thread_id=my_thread.id, role="user", content=request.message
+                )
             )
 
-            with client.beta.threads.runs.stream(
-                thread_id=my_thread.id, assistant_id=assistant.id
-            ) as stream:
+            with ExitStack() as stack:
+                stream = with_recovery(
+                    lambda assistant, my_thread: stack.enter_context(
+                        client.beta.threads.runs.stream(
+                            thread_id=my_thread.id,
+                            assistant_id=assistant.id,
+                            event_handler=handler,
+                        )
+                    )
+                )
                 for text in stream.text_deltas:
                     yield text
 
         except Exception as e:
             yield f"Error: {str(e)}\n"
 
-    return StreamingResponse(generate(), media_type="text/plain")
-
+    def on_close():
+        # クライアントが途中で切断した場合はrunをキャンセルする
+        cancel_run_in_background(client, handler.current_run)
 
-# パターンB
-# イベントを格納するキュー
-event_queue = queue.Queue()
+    return StreamingResponse(
+        aiter_in_thread(generate(), on_close), media_type="text/plain"
+    )
 
 
+# パターンB
 def stream_data(q):
     """ストリーミング用のジェネレータ関数"""
     try:
@@ -129,54 +191,70 @@ def stream_data(q):
 
 @app.post("/assistant/queue")
 async def assistant_queue(request: ChatRequest, base: Request):
-    my_thread = base.app.state.my_thread
-    assistant = base.app.state.assistant
-    q = queue.Queue()
+    # 上限付きのキュー。クライアントが切断したら閉じて、イベントを受け取るスレッドを終了させる
+    q = RelayQueue()
 
     # ストリーミング用のジェネレータを起動
     generator = stream_data(q)
 
-    class EventHandler(AssistantEventHandler):
+    class EventHandler(TimedEventHandler):
         def on_text_created(self, text):
-            q.put(f"\n")
+            q.publish(f"\n")
 
         def on_text_delta(self, delta, snapshot):
-            q.put(delta.value)
+            q.publish(delta.value)
 
         def on_tool_call_created(self, tool_call):
-            q.put(f"\n{tool_call.type}\n")
+            q.publish(f"\n{tool_call.type}\n")
 
         def on_tool_call_delta(self, delta, snapshot):
             if delta.type == "code_interpreter":
                 if delta.code_interpreter.input:  # type: ignore
-                    q.put(delta.code_interpreter.input)  # type: ignore
+                    q.publish(delta.code_interpreter.input)  # type: ignore
                 if delta.code_interpreter.outputs:  # type: ignore
-                    q.put(f"\n\noutput >")
+                    q.publish(f"\n\noutput >")
                     for output in delta.code_interpreter.outputs:  # type: ignore
                         if output.type == "logs":
-                            q.put(f"\n{output.logs}")
+                            q.publish(f"\n{output.logs}")
+
+    handler = EventHandler()
 
-    client.beta.threads.messages.create(
-        thread_id=my_thread.id, role="user", content=request.message
+    with_recovery(
+        lambda assistant, my_thread: client.beta.threads.messages.create(
+            thread_id=my_thread.id, role="user", content=request.message
+        )
     )
 
     def assistant_event():
         try:
-            with client.beta.threads.runs.stream(
-                thread_id=my_thread.id,
-                assistant_id=assistant.id,
-                # instructions="Please address the user as Jane Doe. The user has a premium account.",
-                event_handler=EventHandler(),
-            ) as stream:
+            with ExitStack() as stack:
+                stream = with_recovery(
+                    lambda assistant, my_thread: stack.enter_context(
+                        client.beta.threads.runs.stream(
+                            thread_id=my_thread.id,
+                            assistant_id=assistant.id,
+                            # instructions="Please address the user as Jane Doe. The user has a premium account.",
+                            event_handler=handler,
+                        )
+                    )
+                )
                 stream.until_done()
 
+        except RelayClosed:
+            print("Client disconnected. Cancelling the run.")
+            cancel_run(client, handler.current_run)
         except Exception as e:
             print(f"Error occurred: {e}")
         finally:
             print("Stopping the data addition thread.")
-            q.put("STOP")
+            q.finish("STOP")
 
     assistant_event_thread = threading.Thread(target=assistant_event)
     assistant_event_thread.start()
 
-    return StreamingResponse(generator, media_type="text/plain")
+    def on_close():
+        q.close()
+        if assistant_event_thread.is_alive():
+            cancel_run_in_background(client, handler.current_run)
+
+    return StreamingResponse(aiter_in_thread(generator, on_close), media_type="text/plain")
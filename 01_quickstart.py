@@ -1,10 +1,10 @@
-from openai import OpenAI
 from dotenv import load_dotenv
+from common.client import get_client
 
 # 環境変数をロードします。
 load_dotenv()
 # OpenAIクライアントを初期化します。
-client = OpenAI()
+client = get_client()
 
 # チャットの補完を作成するためのリクエストを送信します。
 # ここでは、モデル 'gpt-3.5-turbo' を使用しています。
@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 import traceback
-from openai import OpenAI
 from dotenv import load_dotenv
 from common.helper import StreamingEventHandler
+from common.client import get_client
 
 
 # 環境変数をロードします。
 load_dotenv(override=True)
 # OpenAIクライアントを初期化します。
-client = OpenAI()
+client = get_client()
 
 assistant = None
 thread = None
@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-from openai import OpenAI
 import random
 import os
 from dotenv import load_dotenv
@@ -7,14 +6,17 @@ import traceback
 from common.utils import create_and_open_file
 from common.helper import (
     StreamingEventHandler,
-    file_download,
     transform_latest_assistant_messages,
 )
+from common.downloads import DownloadManager
+from common.upload_cache import UploadCache
+from common.client import get_client
 
 # 環境変数をロードします。
 load_dotenv(override=True)
 # OpenAIクライアントを初期化します。
-client = OpenAI()
+client = get_client()
+upload_cache = UploadCache(client)
 
 assistant = None
 file = None
@@ -22,8 +24,8 @@ thread = None
 
 try:
     # アシスタント用のファイルをアップロードします。
-    with open("./sample_files/Location_v2.csv", "rb") as sample_file:
-        file = client.files.create(file=sample_file, purpose="assistants")
+    # 同じ内容のファイルがアップロード済みであれば再利用します。
+    file = upload_cache.upload("./sample_files/Location_v2.csv")
 
     # ランダムな番号を生成してアシスタントに名前を付けます。
     random_num = random.randint(1, 100)
@@ -110,9 +112,12 @@ try:
     print(eventHandler.files_of_sitation)
 
     # 画像ファイルをダウンロードします。
-    for image_file_id in eventHandler.file_ids:
-        image_file_path = os.path.join(f"./output/{thread.id}", image_file_id + ".png")
-        file_download(file_id=image_file_id, file_path=image_file_path)
+    # 同じクライアントを使い回し、複数のファイルを並行してダウンロードします。
+    summary = DownloadManager(client).download_many(
+        (image_file_id, os.path.join(f"./output/{thread.id}", image_file_id + ".png"))
+        for image_file_id in eventHandler.file_ids
+    )
+    print(summary)
 
 
 # 例外が発生した場合にエラー情報を出力し、最終的にアシスタント、ファイル、スレッドを削除するためのクリーンアップ処理を行います。
@@ -125,10 +130,8 @@ finally:
     if assistant:
         result_del_assistant = client.beta.assistants.delete(assistant.id)
         print(result_del_assistant)
-    # ファイルの削除
-    if file:
-        result_del_file = client.files.delete(file_id=file.id)
-        print(result_del_file)
+    # アップロードしたファイルは次回の実行で再利用するため削除しない
+    # 不要になったファイルは maintainance_tools/05_upload_cache_gc.py で削除する
     # スレッドの削除
     if thread:
         result_del_thread = client.beta.threads.delete(thread.id)
@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 from typing_extensions import override
-from openai import AssistantEventHandler, OpenAI
+from openai import AssistantEventHandler
 import os
 import traceback
-import contextlib
 from dotenv import load_dotenv
-from common.utils import update_env_file
+from common.config_store import shared_config
 from common.helper import StreamingEventHandler
+from common.upload_cache import UploadCache
+from common.client import get_client
 
 # 環境変数をロードし、OpenAIクライアントを初期化します。
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
+upload_cache = UploadCache(client)
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 THREAD_ID = os.getenv("THREAD_ID")
 
@@ -66,21 +68,17 @@ def main():
         vector_store = client.beta.vector_stores.create(name="Sample_manual")
 
         # OpenAIにアップロードするファイルを準備する
-        # contextLib.ExitStackは、登録されたすべてのコンテキストマネージャ（この場合はファイルオブジェクト）を適切に閉じることを保証します。
         if not ASSISTANT_ID:
-            with contextlib.ExitStack() as stack:
-                # ファイルをアシスタントにアップロードします。
-                file = client.files.create(
-                    file=stack.enter_context(open("./sample_files/manual.pdf", "rb")),
-                    purpose="assistants",
-                )
+            # ファイルをアシスタントにアップロードします。
+            # 同じ内容のファイルがアップロード済みであれば再利用します。
+            file = upload_cache.upload("./sample_files/manual.pdf")
 
-                file_batch = client.beta.vector_stores.file_batches.create_and_poll(
-                    vector_store_id=vector_store.id, file_ids=[file.id]
-                )
+            file_batch = client.beta.vector_stores.file_batches.create_and_poll(
+                vector_store_id=vector_store.id, file_ids=[file.id]
+            )
 
-                print(file_batch.status)
-                print(file_batch.file_counts)
+            print(file_batch.status)
+            print(file_batch.file_counts)
 
             # アシスタントにvector storeを参照させるようにアップデートする
             assistant = client.beta.assistants.update(
@@ -96,8 +94,7 @@ def main():
         )
 
         # 環境変数ファイルを更新します。
-        update_env_file(".env", "ASSISTANT_ID", assistant.id)
-        update_env_file(".env", "THREAD_ID", thread.id)
+        shared_config(".env").update(ASSISTANT_ID=assistant.id, THREAD_ID=thread.id)
 
         # チャットボットの開始メッセージを表示します。
         print("チャットボット: こんにちは！何か聞きたいことはありますか？")
@@ -142,8 +139,8 @@ def main():
         # セッション終了時にインスタンスを削除するためのクリーンアップ処理を行います。
         if delete_instance:
             if file:
-                result_del_file = client.files.delete(file_id=file.id)
-                print(result_del_file)
+                # アップロードキャッシュから取り除き、ほかのスクリプトが使用していなければリモートのファイルも削除する
+                upload_cache.evict(file.id, delete_remote=True)
             if vector_store:
                 result_del_vc = client.beta.vector_stores.delete(
                     vector_store_id=vector_store.id
@@ -157,8 +154,7 @@ def main():
                 print(result_del_assistant)
 
             # 環境変数ファイルをクリアします。
-            update_env_file(".env", "ASSISTANT_ID", "")
-            update_env_file(".env", "THREAD_ID", "")
+            shared_config(".env").update(ASSISTANT_ID="", THREAD_ID="")
 
 
 # メイン関数を実行します。
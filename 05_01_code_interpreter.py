@@ -1,10 +1,10 @@
 import traceback
-from openai import OpenAI
 from dotenv import load_dotenv
 from common.helper import StreamingEventHandler
+from common.client import get_client
 
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
 
 assistant = None
 thread = None
@@ -1,12 +1,14 @@
 import traceback
 import os
-import contextlib
-from openai import OpenAI
 from dotenv import load_dotenv
-from common.helper import StreamingEventHandler, file_download
+from common.helper import StreamingEventHandler
+from common.upload_cache import UploadCache
+from common.downloads import DownloadManager
+from common.client import get_client
 
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
+upload_cache = UploadCache(client)
 
 assistant = None
 thread = None
@@ -14,17 +16,9 @@ files = []
 
 try:
     # ・ファイルをコードインタープリターに渡す
-    with contextlib.ExitStack() as stack:
-        file1 = client.files.create(
-            file=stack.enter_context(open("./sample_files/test_result1.csv", "rb")),
-            purpose="assistants",
-        )
-        files.append(file1)
-        file2 = client.files.create(
-            file=stack.enter_context(open("./sample_files/test_result2.csv", "rb")),
-            purpose="assistants",
-        )
-        files.append(file2)
+    # 同じ内容のファイルがアップロード済みであれば再利用する
+    files.append(upload_cache.upload("./sample_files/test_result1.csv"))
+    files.append(upload_cache.upload("./sample_files/test_result2.csv"))
 
     assistant = client.beta.assistants.create(
         name="数学の家庭教師",
@@ -50,9 +44,12 @@ try:
         stream.until_done()
 
     # 画像ファイルをダウンロードします。
-    for image_file_id in Eventhandler.file_ids:
-        image_file_path = os.path.join(f"./output/{thread.id}", image_file_id + ".png")
-        file_download(file_id=image_file_id, file_path=image_file_path)
+    # 同じクライアントを使い回し、複数のファイルを並行してダウンロードします。
+    summary = DownloadManager(client).download_many(
+        (image_file_id, os.path.join(f"./output/{thread.id}", image_file_id + ".png"))
+        for image_file_id in Eventhandler.file_ids
+    )
+    print(summary)
 
 
 except Exception as e:
@@ -65,7 +62,5 @@ finally:
     if assistant:
         result_del_assistant = client.beta.assistants.delete(assistant_id=assistant.id)
         print(result_del_assistant)
-    if len(files) > 0:
-        for file in files:
-            result_del_file = client.files.delete(file_id=file.id)
-            print(result_del_file)
+    # アップロードしたファイルは次回の実行で再利用するため削除しない
+    # 不要になったファイルは maintainance_tools/05_upload_cache_gc.py で削除する
@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-from openai import OpenAI
 import os
 import traceback
 from dotenv import load_dotenv
@@ -12,33 +11,55 @@ from common.helper import (
     retrieve_runs,
     latest_messages_from_assistant,
 )
+from common.tool_executor import ToolExecutor
+from common.tool_registry import ToolRegistry
+from common.tool_cache import ToolResultCache, MemoryCacheBackend
+from common.client import get_client
+from common.run_metrics import TimedEventHandler
 
-from openai import AssistantEventHandler
-from typing_extensions import override
-import ast
+from typing_extensions import Annotated, Literal, override
 
 # 環境変数をロードします。
 load_dotenv(override=True)
 # OpenAIクライアントを初期化します。
-client = OpenAI()
+client = get_client()
 
 
-def get_current_temperature(location, unit="c"):
+# アシスタントが使用するツールのレジストリ
+# 同じ引数で繰り返し呼ばれる天気系のツールは、戻り値をキャッシュする
+tools = ToolRegistry(cache=ToolResultCache(MemoryCacheBackend(max_entries=1024)))
+
+
+@tools.tool(
+    description="Get the current temperature for a specific location", cache_ttl=300
+)
+def get_current_temperature(
+    location: Annotated[str, "The city and state, e.g., San Francisco, CA"],
+    unit: Annotated[
+        Literal["Celsius", "Fahrenheit"],
+        "The temperature unit to use. Infer this from the user's location.",
+    ],
+):
     """
     指定された場所の現在の天気を取得します。
 
     Parameters:
     location (str): 天気を取得する場所。
-    unit (str): 温度の単位（'c' または 'f'）。
+    unit (str): 温度の単位（'Celsius' または 'Fahrenheit'）。
 
     Returns:
     str: 温度と単位を含む文字列。
     """
-    val = "22" if unit == "c" else "71.6"
+    val = "22" if unit == "Celsius" else "71.6"
     return f"{val}{unit}"
 
 
-def get_rain_probability(location):
+@tools.tool(
+    description="Get the probability of rain for a specific location", cache_ttl=300
+)
+def get_rain_probability(
+    location: Annotated[str, "The city and state, e.g., San Francisco, CA"]
+):
     """
     指定された場所の降水確率を取得します。
 
@@ -51,16 +72,15 @@ def get_rain_probability(location):
     return "0.5"
 
 
-def call_function_by_name(function_name, args_dict):
-    # グローバルスコープで関数名の文字列から関数を取得して実行
-    args = ast.literal_eval(args_dict)
-    function = globals()[function_name]
-    return function(**args)
+# 複数のツール呼び出しを並行して実行するエグゼキューター
+tool_executor = ToolExecutor.from_registry(tools, default_timeout=30)
 
 
-class EventHandler(AssistantEventHandler):
+class EventHandler(TimedEventHandler):
     @override
     def on_event(self, event):
+        # runの各段階の時間を計測する
+        super().on_event(event)
         # Retrieve events that are denoted with 'requires_action'
         # since these will have our tool_calls
         if event.event == "thread.run.requires_action":
@@ -68,26 +88,24 @@ class EventHandler(AssistantEventHandler):
             self.handle_requires_action(event.data, run_id)
 
     def handle_requires_action(self, data, run_id):
-        tool_outputs = []
-        for tool in data.required_action.submit_tool_outputs.tool_calls:
-            result = call_function_by_name(tool.function.name, tool.function.arguments)
-            tool_outputs.append({"tool_call_id": tool.id, "output": result})
-
-            # if tool.function.name == "get_current_temperature":
-            #     tool_outputs.append({"tool_call_id": tool.id, "output": "57"})
-            # elif tool.function.name == "get_rain_probability":
-            #     tool_outputs.append({"tool_call_id": tool.id, "output": "0.06"})
+        # すべてのツールを並行して実行し、失敗したツールはエラー内容を出力とする
+        tool_outputs = tool_executor.run(
+            data.required_action.submit_tool_outputs.tool_calls
+        )
 
         # Submit all tool_outputs at the same time
         self.submit_tool_outputs(tool_outputs, run_id)
 
     def submit_tool_outputs(self, tool_outputs, run_id):
+        # ツール呼び出しの作成から出力の送信までの時間を記録する
+        self.timer.tool_outputs_submitted()
         # Use the submit_tool_outputs_stream helper
+        # 同じタイマーを渡して、送信後の応答も同じrunとして計測する
         with client.beta.threads.runs.submit_tool_outputs_stream(
             thread_id=self.current_run.thread_id,  # type: ignore
             run_id=self.current_run.id,  # type: ignore
             tool_outputs=tool_outputs,
-            event_handler=EventHandler(),
+            event_handler=EventHandler(self.timer),
         ) as stream:
             for text in stream.text_deltas:
                 print(text, end="", flush=True)
@@ -107,47 +125,7 @@ def main():
         assistant = client.beta.assistants.create(
             instructions="You are a weather bot. Use the provided functions to answer questions.",
             model="gpt-4o",
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "get_current_temperature",
-                        "description": "Get the current temperature for a specific location",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "location": {
-                                    "type": "string",
-                                    "description": "The city and state, e.g., San Francisco, CA",
-                                },
-                                "unit": {
-                                    "type": "string",
-                                    "enum": ["Celsius", "Fahrenheit"],
-                                    "description": "The temperature unit to use. Infer this from the user's location.",
-                                },
-                            },
-                            "required": ["location", "unit"],
-                        },
-                    },
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "get_rain_probability",
-                        "description": "Get the probability of rain for a specific location",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "location": {
-                                    "type": "string",
-                                    "description": "The city and state, e.g., San Francisco, CA",
-                                }
-                            },
-                            "required": ["location"],
-                        },
-                    },
-                },
-            ],
+            tools=tools.schemas(),
         )
 
         # スレッドを作成し、ユーザーのメッセージを投稿します。
@@ -168,6 +146,7 @@ def main():
         print("予期せぬエラーが発生しました:", e)
         print(traceback.print_exc())
     finally:
+        tool_executor.close()
         # アシスタントとスレッドを削除するクリーンアップ処理を行います。
         if assistant:
             result_del_assistant = client.beta.assistants.delete(assistant.id)
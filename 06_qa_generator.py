@@ -1,21 +1,57 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 import traceback
-import json
 import os
-from common.helper import retrieve_runs, transform_latest_assistant_messages
-from common.utils import update_env_file
+from typing import List
+from typing_extensions import Annotated, TypedDict
+from common.helper import retrieve_runs
+from common.job_store import JobStore
+from common.message_cache import ThreadMessageCache
+from common.payload_sink import open_payload_sink
+from common.qa_dedup import QADedupIndex
+from common.registry import content_key
+from common.relay import FINAL_RUN_STATUSES
+from common.tool_registry import ToolRegistry
+from common.client import get_client
+from common.config_store import shared_config
 
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
 
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 THREAD_ID = os.getenv("THREAD_ID")
 FILE_ID = os.getenv("FILE_ID")
+# QAの出力先（拡張子で JSONL / SQLite を選択します。再開時に追記できないParquetは使用できません）
+QA_OUTPUT_PATH = os.getenv("QA_OUTPUT_PATH", "./qa_output.jsonl")
 
 
-def transport_qa_data(qa_data):
-    print(json.dumps(qa_data, indent=2, ensure_ascii=False))
+# アシスタントが使用するツールのレジストリ
+tools = ToolRegistry()
+
+# 作成済みのQAのインデックス（実行をまたいで .cache/qa_dedup に保存されます）
+dedup = QADedupIndex()
+
+# 転送されたQAの出力先。書き込みはバックグラウンドでまとめて行い、再開時は前回の出力に追記します
+sink = open_payload_sink(QA_OUTPUT_PATH, resumable=True)
+
+# 実行中のrunの状態（タイムアウトや中断の後に再実行すると、新しいrunを作成せずに再接続します）
+jobs = JobStore()
+
+
+class QAData(TypedDict):
+    question: Annotated[str, "作成した質問の内容"]
+    answer: Annotated[str, "questionに対する回答の内容"]
+
+
+@tools.tool(description="作成した質問と回答のペアデータを外部システムに転送する。")
+def transport_qa_data(qa_data: List[QAData]):
+    # 以前の実行や同じ依頼の中で作成した質問とほぼ重複するQAは転送しない
+    # インデックスの保存は、QAを出力先に書き込んでrunの状態を保存した後で行う
+    unique, duplicates = dedup.filter(qa_data, flush=False)
+    # ファイルへの書き込みを待たずにツールの出力を返す
+    sink.write_many(unique)
+    print(f"{len(unique)}件のQAを {QA_OUTPUT_PATH} に転送しました")
+    if duplicates:
+        print(f"重複するQAを{duplicates}件除外しました")
     return "OK"
 
 
@@ -25,32 +61,30 @@ def main():
     thread = None
 
     try:
-        file = (
-            client.files.retrieve(file_id=FILE_ID)
-            if FILE_ID
-            else client.files.create(
-                file=open("./sample_files/manual.pdf", "rb"), purpose="assistants"
+        # 作成したリソースのIDは最後にまとめて .env に書き込む
+        with shared_config(".env").batch() as env:
+            file = (
+                client.files.retrieve(file_id=FILE_ID)
+                if FILE_ID
+                else client.files.create(
+                    file=open("./sample_files/manual.pdf", "rb"), purpose="assistants"
+                )
             )
-        )
-        update_env_file(
-            env_file_path=".env", key_to_update="FILE_ID", new_value=file.id
-        )
+            env["FILE_ID"] = file.id
 
-        thread = (
-            client.beta.threads.retrieve(thread_id=THREAD_ID)
-            if THREAD_ID
-            else client.beta.threads.create()
-        )
-        update_env_file(
-            env_file_path=".env", key_to_update="THREAD_ID", new_value=thread.id
-        )
-
-        assistant = (
-            client.beta.assistants.retrieve(assistant_id=ASSISTANT_ID)
-            if ASSISTANT_ID
-            else client.beta.assistants.create(
-                name="QA作成アシスタント",
-                instructions="""
+            thread = (
+                client.beta.threads.retrieve(thread_id=THREAD_ID)
+                if THREAD_ID
+                else client.beta.threads.create()
+            )
+            env["THREAD_ID"] = thread.id
+
+            assistant = (
+                client.beta.assistants.retrieve(assistant_id=ASSISTANT_ID)
+                if ASSISTANT_ID
+                else client.beta.assistants.create(
+                    name="QA作成アシスタント",
+                    instructions="""
 あなたは資料を読んで想定される質問と回答を作成するためのアシスタントです。
 質問と回答を作成しツール`transport_qa_data`を使用して外部システムに転送します。
 ユーザーから質問と回答を作成する件数の指示がありますので、その件数分作成し、データを外部システムに転送てください。
@@ -58,71 +92,65 @@ def main():
 プログラム上での動作を想定しているため、同じことを何度も依頼されても、作業を省略せず一からやり直してください。
 何度もお願いすることになって申し訳ないのですが、がんばってください。
 """,
-                model="gpt-4-turbo-preview",
-                tools=[
-                    {"type": "retrieval"},
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "transport_qa_data",
-                            "description": "作成した質問と回答のペアデータを外部システムに転送する。",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "qa_data": {
-                                        "type": "array",
-                                        "items": {
-                                            "type": "object",
-                                            "properties": {
-                                                "question": {
-                                                    "type": "string",
-                                                    "description": "作成した質問の内容",
-                                                },
-                                                "answer": {
-                                                    "type": "string",
-                                                    "description": "questionに対する回答の内容",
-                                                },
-                                            },
-                                            "required": ["question", "answer"],
-                                        },
-                                    }
-                                },
-                                "required": ["qa_data"],
-                            },
-                        },
-                    },
-                ],
-                file_ids=[file.id],
+                    model="gpt-4-turbo-preview",
+                    tools=[{"type": "retrieval"}, *tools.schemas()],
+                    file_ids=[file.id],
+                )
             )
-        )
-        update_env_file(
-            env_file_path=".env", key_to_update="ASSISTANT_ID", new_value=assistant.id
-        )
+            env["ASSISTANT_ID"] = assistant.id
 
-        client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content="新規に10件のQAを作成し、外部システムに転送しなさい",
+        job = jobs.resume(
+            content_key("qa_generator", assistant_id=assistant.id, thread_id=thread.id),
+            "qa_generator",
+            {"assistant_id": assistant.id, "thread_id": thread.id},
         )
+        task = job.task("run")
 
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id, assistant_id=assistant.id
-        )
+        run = None
+        if task.get("run_id"):
+            # 前回の実行で作成したrunが終了していなければ再接続する
+            run = client.beta.threads.runs.retrieve(
+                thread_id=thread.id, run_id=task["run_id"]
+            )
+            if run.status in FINAL_RUN_STATUSES and run.status != "completed":
+                run = None
+            else:
+                print(f"作成済みのrun {run.id} に再接続します（{run.status}）")
+
+        if run is None:
+            client.beta.threads.messages.create(
+                thread_id=thread.id,
+                role="user",
+                content="新規に10件のQAを作成し、外部システムに転送しなさい",
+            )
+
+            run = client.beta.threads.runs.create(
+                thread_id=thread.id, assistant_id=assistant.id
+            )
+            task.update(run_id=run.id, status=run.status, tool_outputs={})
+            jobs.checkpoint(job)
 
         run = retrieve_runs(
             client=client, thread_id=thread.id, run_id=run.id, max_time=240
         )
 
         if run.required_action:
+            # 前回の実行で転送済みのツール呼び出しは、再実行せずに保存した出力を送信する
+            executed = task["tool_outputs"]
             tool_outputs = []
             for required_action in run.required_action.submit_tool_outputs.tool_calls:
                 tool_call_id = required_action.id
                 func_name = required_action.function.name
                 args_str = required_action.function.arguments
-                args_dict = json.loads(args_str)
 
-                result = globals()[func_name](**args_dict)
-                tool_outputs.append({"tool_call_id": tool_call_id, "output": result})
+                if tool_call_id not in executed:
+                    executed[tool_call_id] = tools.dispatch(func_name, args_str)
+                tool_outputs.append(
+                    {"tool_call_id": tool_call_id, "output": executed[tool_call_id]}
+                )
+            sink.flush()
+            jobs.checkpoint(job)
+            dedup.flush()
 
             run = client.beta.threads.runs.submit_tool_outputs(
                 thread_id=thread.id, run_id=run.id, tool_outputs=tool_outputs
@@ -132,8 +160,13 @@ def main():
                 client=client, thread_id=thread.id, run_id=run.id, max_time=120
             )
 
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        result = transform_latest_assistant_messages(messages=messages)
+        task["status"] = run.status
+        if run.status in FINAL_RUN_STATUSES:
+            jobs.finish(job, "completed" if run.status == "completed" else "failed")
+        else:
+            jobs.checkpoint(job)
+
+        result = ThreadMessageCache(client, thread.id).transform_latest()
 
         for message in result:
             print(message["content"]["value"])
@@ -141,7 +174,8 @@ def main():
     except Exception as e:
         print("エラーが発生しました。", e)
         print(traceback.print_exc())
-    # finally:
+    finally:
+        sink.close()
     # if assistant:
     #     result_assistant_delete = client.beta.assistants.delete(
     #         assistant_id=assistant.id
@@ -0,0 +1,146 @@
+from dotenv import load_dotenv
+import traceback
+import json
+import os
+import openai
+from typing import List
+from typing_extensions import Annotated, TypedDict
+from common.client import get_client
+from common.job_store import JobStore
+from common.payload_sink import open_payload_sink
+from common.qa_batch import CorpusItem, QABatchGenerator
+from common.qa_dedup import QADedupIndex
+from common.registry import AssistantRegistry, content_key
+from common.tool_registry import ToolRegistry
+from common.upload_cache import UploadCache
+
+load_dotenv(override=True)
+client = get_client()
+upload_cache = UploadCache(client)
+registry = AssistantRegistry()
+# 中断されたバッチの状態（.cache/jobs に保存し、同じ条件で再実行すると続きから再開します）
+jobs = JobStore()
+
+# 作成するQAの件数
+QA_TARGET = int(os.getenv("QA_TARGET", "100"))
+# 1つのrunに依頼するQAの件数
+QA_PER_RUN = int(os.getenv("QA_PER_RUN", "10"))
+# 同時に実行するrunの最大数
+QA_CONCURRENCY = int(os.getenv("QA_CONCURRENCY", "8"))
+# QAの出力先（拡張子で JSONL / SQLite を選択します。再開時に追記できないParquetは使用できません）
+QA_OUTPUT_PATH = os.getenv("QA_OUTPUT_PATH", "./qa_output.jsonl")
+# QAを作成する資料（カンマ区切り）
+QA_CORPUS = os.getenv("QA_CORPUS", "./sample_files/manual.pdf").split(",")
+
+
+# アシスタントが使用するツールのレジストリ
+tools = ToolRegistry()
+
+
+class QAData(TypedDict):
+    question: Annotated[str, "作成した質問の内容"]
+    answer: Annotated[str, "questionに対する回答の内容"]
+
+
+@tools.tool(description="作成した質問と回答のペアデータを外部システムに転送する。")
+def transport_qa_data(qa_data: List[QAData]):
+    # 受け取ったデータは QABatchGenerator が出力ファイルに書き込む
+    return "OK"
+
+
+def print_progress(shard, stats):
+    print(
+        f"shard {shard.index:>4} ({shard.item.source}): {shard.collected}/{shard.count}件  "
+        f"合計 {stats.qa}/{stats.target}件  {stats.qa_per_minute:.1f} QA/min"
+    )
+
+
+def main():
+    params = {"target": QA_TARGET, "per_run": QA_PER_RUN, "corpus": QA_CORPUS}
+    job = jobs.resume(content_key("qa_batch", **params), "qa_batch", params)
+    if job.resumed:
+        print(f"中断されたジョブ {job.id} を再開します")
+    # 資料のパス -> vector storeのID（再開したジョブでは実行中のrunが参照しているものを再利用する）
+    vector_stores = job.data.setdefault("vector_stores", {})
+
+    try:
+        # 資料ごとにvector storeを作成し、シャードのスレッドから参照させる
+        corpus = []
+        for path in QA_CORPUS:
+            if path not in vector_stores:
+                file = upload_cache.upload(path)
+                vector_store = client.beta.vector_stores.create(
+                    name=f"qa_{os.path.basename(path)}"
+                )
+                client.beta.vector_stores.file_batches.create_and_poll(
+                    vector_store_id=vector_store.id, file_ids=[file.id]
+                )
+                vector_stores[path] = vector_store.id
+                jobs.checkpoint(job)
+            corpus.append(
+                CorpusItem(
+                    source=os.path.basename(path),
+                    tool_resources={
+                        "file_search": {"vector_store_ids": [vector_stores[path]]}
+                    },
+                )
+            )
+
+        # 作成パラメータが同じアシスタントは再利用する（登録済みであればネットワーク通信なしで取得する）
+        assistant_params = dict(
+            name="QA作成アシスタント",
+            instructions="""
+あなたは資料を読んで想定される質問と回答を作成するためのアシスタントです。
+質問と回答を作成しツール`transport_qa_data`を使用して外部システムに転送します。
+ユーザーから質問と回答を作成する件数の指示がありますので、その件数分作成し、データを外部システムに転送てください。
+必ず転送を実施し、結果を応答してください。
+""",
+            model="gpt-4-turbo-preview",
+            tools=[{"type": "file_search"}, *tools.schemas()],
+        )
+        assistant = registry.assistant(client, **assistant_params)
+
+        # 再開したジョブは前回の出力に追記する
+        with open_payload_sink(QA_OUTPUT_PATH, resumable=True) as sink:
+            generator = QABatchGenerator(
+                client,
+                assistant.id,
+                tools,
+                sink,
+                per_run=QA_PER_RUN,
+                concurrency=QA_CONCURRENCY,
+                # 以前の実行で作成したQAとほぼ重複するものは出力せず、目標件数にも数えない
+                dedup=QADedupIndex(),
+                jobs=jobs,
+                on_progress=print_progress,
+            )
+            try:
+                stats = generator.generate(QA_TARGET, corpus, job=job)
+            except openai.NotFoundError:
+                # 登録済みのアシスタントが削除されていた場合は作成し直し、同じジョブを続きから再開する
+                renewed = registry.assistant(client, verify=True, **assistant_params)
+                if renewed.id == assistant.id:
+                    raise
+                generator.assistant_id = renewed.id
+                stats = generator.generate(QA_TARGET, corpus, job=job)
+
+        print(json.dumps(stats.result(), indent=2, ensure_ascii=False))
+        print(
+            f"{stats.qa}件のQAを {stats.elapsed:.1f}秒で作成しました"
+            f"（{stats.qa_per_minute:.1f} QA/min）: {QA_OUTPUT_PATH}"
+        )
+        if stats.qa < stats.target:
+            print(f"目標の{stats.target}件に達しませんでした（失敗したシャード: {stats.shards_failed}）")
+
+    except Exception as e:
+        print("エラーが発生しました。", e)
+        print(traceback.print_exc())
+    finally:
+        # 中断された場合は再開時に使用するため、vector storeを残す
+        if job.finished:
+            for vector_store_id in vector_stores.values():
+                client.beta.vector_stores.delete(vector_store_id=vector_store_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+common.cleanup.Cleaner のベンチマークです。
+
+モックのAPI（benchmarks.mock_api）を起動し、リソースの種類ごとにオブジェクトを作成してから
+Cleaner で削除し、削除の速度（オブジェクト数/秒）と残ったオブジェクトの数を確認します。
+
+    assistants / vector_stores  カーソルによるページングで一覧を取得して削除します。
+    files                       ページングのない一覧を取得し、purpose をサーバー側で絞り込んで削除します
+                                （用途の異なるファイルが残ることも確認します）。
+    threads                     一覧を取得できないため、IDを指定して削除します。
+
+実行例:
+    python -m benchmarks.bench_cleanup --objects 300 --workers 8
+"""
+
+import argparse
+import io
+
+from openai import OpenAI
+
+from benchmarks.harness import free_port, uvicorn_server
+from common.cleanup import Cleaner
+
+
+def count(client, kind):
+    """種類ごとに残っているオブジェクトの数を返します。"""
+    if kind == "files":
+        return len(client.files.list().data)
+    resource = client.beta.assistants if kind == "assistants" else client.beta.vector_stores
+    return sum(1 for _ in resource.list(limit=100))
+
+
+def check(kind, report, remaining, expected_remaining):
+    print(f"{kind:>14}: {report}  remaining={remaining}")
+    assert report.failed == 0, f"{kind}: {report.failed} deletions failed"
+    assert remaining == expected_remaining, f"{kind}: {remaining} != {expected_remaining}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    with uvicorn_server("benchmarks.mock_api:app", free_port()) as mock:
+        client = OpenAI(base_url=f"{mock}/v1", api_key="mock")
+        cleaner_options = {"workers": args.workers, "progress_interval": 60}
+
+        for kind in ("assistants", "vector_stores"):
+            for i in range(args.objects):
+                if kind == "assistants":
+                    client.beta.assistants.create(model="mock", name=f"bench-{i}")
+                else:
+                    client.beta.vector_stores.create(name=f"bench-{i}")
+            report = Cleaner(client, kind, **cleaner_options).run()
+            check(kind, report, count(client, kind), 0)
+
+        kept = max(1, args.objects // 10)
+        for i in range(args.objects + kept):
+            purpose = "assistants" if i < args.objects else "batch"
+            client.files.create(file=(f"bench-{i}.txt", io.BytesIO(b"x")), purpose=purpose)
+        dry_run = Cleaner(client, "files", dry_run=True, **cleaner_options)
+        report = dry_run.run(purpose="assistants")
+        assert report.matched == args.objects, report
+        report = Cleaner(client, "files", **cleaner_options).run(purpose="assistants")
+        check("files", report, count(client, "files"), kept)
+
+        ids = [client.beta.threads.create().id for _ in range(args.objects)]
+        report = Cleaner(client, "threads", **cleaner_options).run(ids=ids)
+        assert report.deleted == args.objects, report
+        print(f"{'threads':>14}: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+common.coalesce.DeltaCoalescer のベンチマークです。
+
+合成した差分（delta）を仮想時刻付きでバッファに流し込み、SSEフレームに変換して
+出力するまでの処理について、設定ごとのフレーム数・フレーム/秒・バイト/秒を計測します。
+flush_interval_ms=0 は差分ごとに1フレームを送信する従来の動作に相当します。
+
+実行例:
+    python -m benchmarks.bench_coalesce --deltas 200000 --rate 100
+"""
+
+import argparse
+import io
+import json
+import random
+import time
+
+from common.coalesce import DeltaCoalescer
+
+
+def synthetic_deltas(count, rate, seed=0):
+    """
+    平均 rate 個/秒で到着する差分を (仮想時刻, テキスト) の組で生成します。
+    日本語と英語のトークンを混ぜて、UTF-8のバイト数を実際の出力に近づけます。
+    """
+    rng = random.Random(seed)
+    vocabulary = ["こんにちは", "数学", "の", "答え", "は", " x", " = ", "3", "。", "\n"]
+    now = 0.0
+    for _ in range(count):
+        now += rng.expovariate(rate)
+        yield now, rng.choice(vocabulary)
+
+
+def run(deltas, flush_interval_ms, flush_bytes):
+    coalescer = DeltaCoalescer(
+        flush_interval_ms=flush_interval_ms, flush_bytes=flush_bytes
+    )
+    out = io.StringIO()
+    frames = 0
+    start = time.perf_counter()
+    for now, text in deltas:
+        # 差分の到着前に期限が過ぎていれば、タイマーによるフラッシュを再現する
+        timeout = coalescer.timeout(now)
+        if timeout == 0.0:
+            chunk = coalescer.flush()
+            if chunk is not None:
+                out.write(f'data: {json.dumps({"message": chunk})}\n\n')
+                frames += 1
+        chunk = coalescer.push(text, now=now)
+        if chunk is not None:
+            out.write(f'data: {json.dumps({"message": chunk})}\n\n')
+            frames += 1
+    chunk = coalescer.flush()
+    if chunk is not None:
+        out.write(f'data: {json.dumps({"message": chunk})}\n\n')
+        frames += 1
+    elapsed = time.perf_counter() - start
+    return frames, len(out.getvalue().encode("utf-8")), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--deltas", type=int, default=200000)
+    parser.add_argument("--rate", type=float, default=100, help="差分の到着レート（個/秒）")
+    parser.add_argument("--flush-bytes", type=int, default=1024)
+    args = parser.parse_args()
+
+    deltas = list(synthetic_deltas(args.deltas, args.rate))
+    print(f"deltas={args.deltas} rate={args.rate}/s flush_bytes={args.flush_bytes}")
+    for flush_interval_ms in [0, 20, 50, 100]:
+        frames, size, elapsed = run(deltas, flush_interval_ms, args.flush_bytes)
+        print(
+            f"flush_ms={flush_interval_ms:<4} frames={frames:<8} "
+            f"deltas/frame={args.deltas / frames:6.1f} "
+            f"frames/s={frames / elapsed:12.0f} bytes/s={size / elapsed:14.0f} "
+            f"cpu={elapsed * 1000:8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+common.config_store.ConfigStore のベンチマークです。
+
+    concurrent  複数のプロセスがそれぞれ自分のキーを繰り返し更新し、最後に .env に残った値から
+                失われた更新（他のプロセスの書き戻しで消えたキー）の数を数えます。
+                変更前の update_env_file（ロックなしで全体を読み込んで書き戻す）と比較します。
+    batch       1回の実行で3つのキー（FILE_ID・THREAD_ID・ASSISTANT_ID）を保存する時間を、
+                キーごとに書き込む方法と update でまとめて書き込む方法で比較します。
+    get         キャッシュを使った読み込みと、毎回ファイルを解析する読み込みを比較します。
+
+実行例:
+    python -m benchmarks.bench_config_store --processes 8 --updates 200
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common.config_store import ConfigStore, _parse_line
+
+
+def legacy_update_env_file(env_file_path, key_to_update, new_value):
+    """変更前の update_env_file と同じ処理です。"""
+    with open(env_file_path, "r") as file:
+        lines = file.readlines()
+    updated_lines = []
+    key_found = False
+    for line in lines:
+        if line.startswith(key_to_update + "="):
+            updated_lines.append(f"{key_to_update}={new_value}\n")
+            key_found = True
+        else:
+            updated_lines.append(line)
+    if not key_found:
+        updated_lines.append(f"{key_to_update}={new_value}\n")
+    with open(env_file_path, "w") as file:
+        file.writelines(updated_lines)
+
+
+def worker(mode, path, worker_id, updates):
+    key = f"WORKER_{worker_id}"
+    store = ConfigStore(path)
+    for i in range(updates):
+        try:
+            if mode == "legacy":
+                legacy_update_env_file(path, key, str(i))
+            else:
+                store.update({key: str(i)})
+        except (OSError, ValueError):
+            pass
+
+
+def bench_concurrent(mode, processes, updates, tmp):
+    path = os.path.join(tmp, f"{mode}.env")
+    with open(path, "w") as file:
+        file.write("# comment\nOPENAI_API_KEY=sk-test\n")
+    start = time.perf_counter()
+    workers = [
+        multiprocessing.Process(target=worker, args=(mode, path, i, updates))
+        for i in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - start
+    values = ConfigStore(path).values()
+    lost = sum(
+        1 for i in range(processes) if values.get(f"WORKER_{i}") != str(updates - 1)
+    )
+    intact = values.get("OPENAI_API_KEY") == "sk-test"
+    print(
+        f"concurrent {mode:>7}: {elapsed:6.2f}s  lost keys {lost}/{processes}  "
+        f"other keys intact={intact}"
+    )
+
+
+def bench_batch(tmp, runs=200):
+    path = os.path.join(tmp, "batch.env")
+    with open(path, "w") as file:
+        file.write("OPENAI_API_KEY=sk-test\n" + "".join(f"OTHER_{i}=x\n" for i in range(20)))
+    keys = ("FILE_ID", "THREAD_ID", "ASSISTANT_ID")
+
+    start = time.perf_counter()
+    for run in range(runs):
+        for key in keys:
+            legacy_update_env_file(path, key, f"{key.lower()}_{run}")
+    legacy = (time.perf_counter() - start) / runs
+
+    store = ConfigStore(path)
+    start = time.perf_counter()
+    for run in range(runs):
+        store.update({key: f"{key.lower()}_{run}_b" for key in keys})
+    batched = (time.perf_counter() - start) / runs
+    print(
+        f"batch: per-key rewrite {legacy * 1e3:6.2f}ms/run (3 writes, no fsync)  "
+        f"ConfigStore.update {batched * 1e3:6.2f}ms/run (1 atomic write + fsync)"
+    )
+
+
+def bench_get(tmp, reads=20000):
+    path = os.path.join(tmp, "get.env")
+    with open(path, "w") as file:
+        file.write("".join(f"KEY_{i}=value_{i}\n" for i in range(50)))
+
+    start = time.perf_counter()
+    for _ in range(reads):
+        with open(path, "r") as file:
+            dict(filter(None, (_parse_line(line) for line in file)))["KEY_25"]
+    uncached = (time.perf_counter() - start) / reads
+
+    store = ConfigStore(path)
+    start = time.perf_counter()
+    for _ in range(reads):
+        store.get("KEY_25")
+    cached = (time.perf_counter() - start) / reads
+    print(
+        f"get: parse every time {uncached * 1e6:6.1f}us  cached {cached * 1e6:6.1f}us  "
+        f"(file reads {store.reads})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--updates", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("legacy", "store"):
+            bench_concurrent(mode, args.processes, args.updates, tmp)
+        bench_batch(tmp)
+        bench_get(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+モックのAssistants APIに対して、common の補助関数を使った一連の処理を実行する
+エンドツーエンドのベンチマークです。
+
+シナリオごとに同時実行数を指定して処理を繰り返し、レイテンシーのパーセンタイル・
+スループット・メモリ使用量（クライアントとモックサーバーの最大常駐メモリ）・
+共有クライアントの接続の再利用率を出力します。
+
+    poll    スレッド作成 → メッセージ投稿 → run作成 → retrieve_runs で待機 → メッセージ取得・変換
+    stream  runs.stream と StreamingEventHandler で応答を受信（最初のトークンまでの時間も計測）
+    tools   requires_action を ToolExecutor で処理し、submit_tool_outputs_stream で応答を受信
+    files   ファイルのアップロードと DownloadManager によるダウンロード
+
+serversentevent/server.py の負荷は bench_sse_stream で計測します。
+
+実行例:
+    python -m benchmarks.bench_e2e --scenarios poll stream --concurrency 1 8 --iterations 50
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import AssistantEventHandler
+
+from benchmarks.harness import free_port, peak_rss_mb, summarize, uvicorn_server
+from common.client import get_client, pool_metrics
+from common.downloads import DownloadManager
+from common.helper import (
+    StreamingEventHandler,
+    retrieve_runs,
+    transform_latest_assistant_messages,
+)
+from common.tool_executor import ToolExecutor
+from common.tool_registry import ToolRegistry
+
+tools = ToolRegistry()
+
+
+@tools.tool(description="Look up the population of a city.")
+def lookup_population(city: str):
+    return {"city": city, "population": 1000000}
+
+
+class TimingHandler(StreamingEventHandler):
+    """StreamingEventHandler に最初のテキストを受信した時刻の記録を加えたハンドラーです。"""
+
+    def __init__(self):
+        super().__init__()
+        self.first_delta_at = None
+
+    def on_text_delta(self, delta, snapshot):
+        if self.first_delta_at is None:
+            self.first_delta_at = time.perf_counter()
+        super().on_text_delta(delta, snapshot)
+
+
+class ToolHandler(AssistantEventHandler):
+    """requires_action を ToolExecutor で処理し、ツールの出力を送信するハンドラーです。"""
+
+    def __init__(self, client, executor, timings):
+        super().__init__()
+        self.client = client
+        self.executor = executor
+        self.timings = timings
+
+    def on_event(self, event):
+        if event.event != "thread.run.requires_action":
+            return
+        start = time.perf_counter()
+        tool_outputs = self.executor.run(
+            event.data.required_action.submit_tool_outputs.tool_calls
+        )
+        handler = TimingHandler()
+        with self.client.beta.threads.runs.submit_tool_outputs_stream(
+            thread_id=event.data.thread_id,
+            run_id=event.data.id,
+            tool_outputs=tool_outputs,
+            event_handler=handler,
+        ) as stream:
+            stream.until_done()
+        if handler.first_delta_at is not None:
+            # ツールの実行から、出力を送信して最初の応答を受け取るまでの時間
+            self.timings.append(handler.first_delta_at - start)
+
+
+def poll_scenario(client, assistant_id, metrics):
+    thread = client.beta.threads.create()
+    client.beta.threads.messages.create(thread_id=thread.id, role="user", content="hello")
+    run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant_id)
+    retrieve_runs(client, thread.id, run.id, max_time=120)
+    messages = client.beta.threads.messages.list(thread_id=thread.id)
+    transform_latest_assistant_messages(messages)
+
+
+def stream_scenario(client, assistant_id, metrics):
+    thread = client.beta.threads.create()
+    client.beta.threads.messages.create(thread_id=thread.id, role="user", content="hello")
+    handler = TimingHandler()
+    start = time.perf_counter()
+    with client.beta.threads.runs.stream(
+        thread_id=thread.id, assistant_id=assistant_id, event_handler=handler
+    ) as stream:
+        stream.until_done()
+    if handler.first_delta_at is not None:
+        metrics["ttft"].append(handler.first_delta_at - start)
+
+
+def tools_scenario(client, assistant_id, metrics):
+    thread = client.beta.threads.create()
+    client.beta.threads.messages.create(thread_id=thread.id, role="user", content="hello")
+    handler = ToolHandler(client, metrics["executor"], metrics["tool_round_trip"])
+    with client.beta.threads.runs.stream(
+        thread_id=thread.id, assistant_id=assistant_id, event_handler=handler
+    ) as stream:
+        stream.until_done()
+
+
+def files_scenario(client, assistant_id, metrics):
+    payload = os.urandom(metrics["file_bytes"])
+    file = client.files.create(file=("bench.bin", payload), purpose="assistants")
+    path = os.path.join(metrics["tmp"], f"{file.id}.bin")
+    metrics["downloader"].download(file.id, path)
+    os.remove(path)
+    client.files.delete(file_id=file.id)
+    with metrics["lock"]:
+        metrics["bytes"] += 2 * len(payload)
+
+
+SCENARIOS = {
+    "poll": poll_scenario,
+    "stream": stream_scenario,
+    "tools": tools_scenario,
+    "files": files_scenario,
+}
+
+
+def run_scenario(client, name, concurrency, iterations, args):
+    """シナリオを指定された同時実行数で繰り返し、結果を集計します。"""
+    assistant = client.beta.assistants.create(
+        name=f"bench-{name}",
+        model="gpt-4o",
+        tools=tools.schemas() if name == "tools" else [],
+    )
+    executor = ToolExecutor.from_registry(tools)
+    metrics = {
+        "ttft": [],
+        "tool_round_trip": [],
+        "executor": executor,
+        "downloader": DownloadManager(client),
+        "file_bytes": args.file_kb * 1024,
+        "bytes": 0,
+        "lock": threading.Lock(),
+        "tmp": args.tmp,
+    }
+    latencies = []
+    errors = []
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            SCENARIOS[name](client, assistant.id, metrics)
+        except Exception as e:
+            errors.append(repr(e))
+            return
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    # StreamingEventHandler の出力はベンチマークの結果に混ぜない
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(iterations)))
+    elapsed = time.perf_counter() - start
+    executor.close()
+    client.beta.assistants.delete(assistant_id=assistant.id)
+
+    result = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "client_peak_rss_mb": peak_rss_mb(),
+    }
+    if metrics["ttft"]:
+        result["ttft"] = summarize(metrics["ttft"])
+    if metrics["tool_round_trip"]:
+        result["tool_round_trip"] = summarize(metrics["tool_round_trip"])
+    if metrics["bytes"]:
+        result["mib_per_sec"] = metrics["bytes"] / elapsed / (1024 * 1024)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def report(result):
+    latency = result["latency"]
+    line = (
+        f"{result['scenario']:>6} c={result['concurrency']:<4} ok={result['ok']:<5} "
+        f"err={result['errors']:<3} ops/s={result['ops_per_sec']:8.2f} "
+        f"p50={latency['p50'] * 1000:8.1f}ms p90={latency['p90'] * 1000:8.1f}ms "
+        f"p99={latency['p99'] * 1000:8.1f}ms"
+    )
+    if "ttft" in result:
+        line += f" ttft p50={result['ttft']['p50'] * 1000:7.1f}ms"
+    if "tool_round_trip" in result:
+        line += f" tool rt p50={result['tool_round_trip']['p50'] * 1000:7.1f}ms"
+    if "mib_per_sec" in result:
+        line += f" {result['mib_per_sec']:7.1f}MiB/s"
+    line += (
+        f" reuse={result['pool']['reuse_rate']:.2f}"
+        f" rss client={result['client_peak_rss_mb']:.0f}MiB"
+        f" server={result['server_peak_rss_mb']:.0f}MiB"
+    )
+    print(line)
+    if "first_error" in result:
+        print(f"        first error: {result['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--run-duration-ms", type=float, default=500)
+    parser.add_argument("--file-kb", type=int, default=1024)
+    parser.add_argument("--json", help="結果をJSONで保存するファイル")
+    args = parser.parse_args()
+
+    mock_env = {
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_TOKEN_INTERVAL_MS": str(args.interval_ms),
+        "MOCK_LATENCY_MS": str(args.latency_ms),
+        "MOCK_RUN_DURATION_MS": str(args.run_duration_ms),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, uvicorn_server(
+        "benchmarks.mock_api:app", free_port(), env=mock_env
+    ) as mock:
+        args.tmp = tmp
+        # 共有クライアント（コネクションプール）をモックに向ける
+        os.environ["OPENAI_BASE_URL"] = f"{mock}/v1"
+        os.environ["OPENAI_API_KEY"] = "mock"
+        client = get_client()
+        for name in args.scenarios:
+            for concurrency in args.concurrency:
+                result = run_scenario(client, name, concurrency, args.iterations, args)
+                result["server_peak_rss_mb"] = peak_rss_mb(mock.pid)
+                result["pool"] = pool_metrics()["sync"]
+                report(result)
+                results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
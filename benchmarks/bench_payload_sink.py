@@ -0,0 +1,138 @@
+"""
+common.payload_sink の出力先のベンチマークです。
+
+transport_qa_data が1回に10件のQAを受け取る呼び出しを繰り返し、呼び出し側（ツールの実行）が
+待たされる時間と、すべてのレコードを書き込み終えるまでのスループットを計測します。
+
+    legacy print        変更前の json.dumps(indent=2) の表示（行バッファのファイルに出力）
+    naive jsonl+fsync   呼び出しごとにファイルを開いて追記し、fsync する
+    naive sqlite        呼び出しごとに INSERT してコミットする（synchronous=FULL）
+    jsonl / sqlite / parquet (fsync=...)
+                        PayloadSink のグループコミット（parquet は pyarrow がある場合のみ）
+
+実行例:
+    python -m benchmarks.bench_payload_sink --calls 2000 --per-call 10
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.harness import summarize
+from common.payload_sink import JsonlPayloadSink, ParquetPayloadSink, SqlitePayloadSink
+
+ANSWER = "電源ボタンを3秒以上長押しすると、本体が再起動します。再起動しない場合は電源ケーブルを確認してください。"
+
+
+def make_calls(calls, per_call):
+    return [
+        [
+            {"question": f"質問{i}-{j}: 本体が反応しない場合はどうすればよいですか？", "answer": ANSWER}
+            for j in range(per_call)
+        ]
+        for i in range(calls)
+    ]
+
+
+def measure(name, batches, write, finish):
+    latencies = []
+    start = time.perf_counter()
+    for batch in batches:
+        call_start = time.perf_counter()
+        write(batch)
+        latencies.append(time.perf_counter() - call_start)
+    finish()
+    elapsed = time.perf_counter() - start
+    records = sum(len(batch) for batch in batches)
+    stats = summarize(latencies)
+    print(
+        f"{name:>28}: call p50 {stats['p50'] * 1e6:8.1f}us p99 {stats['p99'] * 1e6:8.1f}us  "
+        f"{records / elapsed:10.0f} records/s"
+    )
+
+
+def bench_legacy(batches, tmp):
+    output = open(os.path.join(tmp, "legacy.txt"), "w", buffering=1, encoding="utf-8")
+    measure(
+        "legacy print",
+        batches,
+        lambda batch: print(json.dumps(batch, indent=2, ensure_ascii=False), file=output),
+        output.close,
+    )
+
+
+def bench_naive_jsonl(batches, tmp):
+    path = os.path.join(tmp, "naive.jsonl")
+
+    def write(batch):
+        with open(path, "a", encoding="utf-8") as file:
+            for record in batch:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    measure("naive jsonl+fsync", batches, write, lambda: None)
+
+
+def bench_naive_sqlite(batches, tmp):
+    connection = sqlite3.connect(os.path.join(tmp, "naive.sqlite"))
+    connection.execute("PRAGMA synchronous=FULL")
+    connection.execute("CREATE TABLE qa (question TEXT, answer TEXT, payload TEXT)")
+
+    def write(batch):
+        for record in batch:
+            connection.execute(
+                "INSERT INTO qa VALUES (?, ?, ?)",
+                (record["question"], record["answer"], json.dumps(record, ensure_ascii=False)),
+            )
+            connection.commit()
+
+    measure("naive sqlite", batches, write, connection.close)
+
+
+def bench_sink(name, sink, batches):
+    measure(name, batches, sink.write_many, sink.close)
+    expected = sum(len(batch) for batch in batches)
+    assert sink.records == expected, f"{name}: {sink.records} != {expected}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--per-call", type=int, default=10)
+    args = parser.parse_args()
+
+    batches = make_calls(args.calls, args.per_call)
+    with tempfile.TemporaryDirectory(dir=".") as tmp:
+        bench_legacy(batches, tmp)
+        bench_naive_jsonl(batches, tmp)
+        bench_naive_sqlite(batches[: max(1, args.calls // 10)], tmp)
+        for fsync in ("always", "interval", "never"):
+            bench_sink(
+                f"jsonl (fsync={fsync})",
+                JsonlPayloadSink(os.path.join(tmp, f"{fsync}.jsonl"), fsync=fsync),
+                batches,
+            )
+        for fsync in ("always", "interval", "never"):
+            bench_sink(
+                f"sqlite (fsync={fsync})",
+                SqlitePayloadSink(
+                    os.path.join(tmp, f"{fsync}.sqlite"),
+                    columns=("question", "answer"),
+                    fsync=fsync,
+                ),
+                batches,
+            )
+        try:
+            sink = ParquetPayloadSink(os.path.join(tmp, "qa.parquet"))
+        except ImportError as e:
+            print(f"{'parquet':>28}: skipped ({e})")
+        else:
+            bench_sink("parquet (fsync=interval)", sink, batches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+common.qa_batch.QABatchGenerator のスループット（QA/min）のベンチマークです。
+
+モックのAPI（benchmarks.mock_api）を起動し、06_qa_generator.py と同じ1スレッド・1runずつの
+逐次実行（concurrency=1）と、同時実行数を増やした場合の QA/min を比較します。
+--max-active-runs を指定すると、モックが実行中のrunの数を制限して429を返すため、
+レート制限を受けたときの同時実行数の調整と再試行も確認できます。
+--error-rate を指定すると、モックがrunの作成とツールの出力の送信を一定の確率で503にするため、
+一時的なサーバーエラーからの再試行を確認できます。
+
+実行例:
+    python -m benchmarks.bench_qa_batch --target 200 --concurrency 1 8 32 --run-ms 2000
+"""
+
+import argparse
+import os
+import tempfile
+from typing import List
+
+from openai import OpenAI
+from typing_extensions import Annotated, TypedDict
+
+from benchmarks.harness import free_port, uvicorn_server
+from common.payload_sink import JsonlPayloadSink
+from common.qa_batch import QABatchGenerator
+from common.run_waiter import RunWaiter
+from common.tool_registry import ToolRegistry
+
+tools = ToolRegistry()
+
+
+class QAData(TypedDict):
+    question: Annotated[str, "作成した質問の内容"]
+    answer: Annotated[str, "questionに対する回答の内容"]
+
+
+@tools.tool(description="作成した質問と回答のペアデータを外部システムに転送する。")
+def transport_qa_data(qa_data: List[QAData]):
+    return "OK"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target", type=int, default=200)
+    parser.add_argument("--per-run", type=int, default=10)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--run-ms", type=float, default=2000, help="runが完了するまでの時間")
+    parser.add_argument("--max-active-runs", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="モックが503を返す確率")
+    args = parser.parse_args()
+
+    mock_env = {
+        "MOCK_RUN_DURATION_MS": str(args.run_ms),
+        "MOCK_ARRAY_ITEMS": str(args.per_run),
+        "MOCK_MAX_ACTIVE_RUNS": str(args.max_active_runs),
+        "MOCK_ERROR_RATE": str(args.error_rate),
+    }
+    with tempfile.TemporaryDirectory() as tmp, uvicorn_server(
+        "benchmarks.mock_api:app", free_port(), env=mock_env
+    ) as mock:
+        client = OpenAI(base_url=f"{mock}/v1", api_key="mock")
+        assistant = client.beta.assistants.create(
+            model="mock", tools=tools.schemas()  # type: ignore
+        )
+        for concurrency in args.concurrency:
+            path = os.path.join(tmp, f"qa_{concurrency}.jsonl")
+            # 逐次実行の従来の方法と同じ条件にするため、ポーリングは最小間隔で行う
+            waiter = RunWaiter(client, min_interval=0.2, max_interval=1.0)
+            with waiter, JsonlPayloadSink(path) as sink:
+                generator = QABatchGenerator(
+                    client,
+                    assistant.id,
+                    tools,
+                    sink,
+                    per_run=args.per_run,
+                    concurrency=concurrency,
+                    waiter=waiter,
+                )
+                stats = generator.generate(args.target)
+            assert sink.records == stats.qa
+            print(
+                f"concurrency={concurrency:<4} qa={stats.qa:<5} runs={stats.runs:<4} "
+                f"rate_limited={stats.rate_limited:<3} peak={stats.peak_in_flight:<4} "
+                f"elapsed={stats.elapsed:6.1f}s  {stats.qa_per_minute:8.1f} QA/min"
+            )
+
+
+if __name__ == "__main__":
+    main()
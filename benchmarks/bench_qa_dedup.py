@@ -0,0 +1,117 @@
+"""
+common.qa_dedup.QADedupIndex のベンチマークです。
+
+ランダムな日本語の質問を登録し、次の項目を計測します。
+
+    add     1件あたりの登録時間（MinHash署名の計算とLSHの検索を含む）
+    query   登録済みの件数を増やしたときの1件あたりの検索時間。
+            すべての登録済みの質問とJaccard類似度を比較する総当たりの方法と比較します。
+    reload  保存したインデックスの読み込み時間（MinHashは再計算しません）
+    recall  文字を置き換えて作った類似の質問について、真のJaccard類似度ごとに重複と判定した割合
+
+実行例:
+    python -m benchmarks.bench_qa_dedup --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from common.qa_dedup import QADedupIndex, normalize_ja, shingles
+
+CHARS = (
+    "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+    "操作設定画面電源保証期間交換修理方法確認製品機能接続表示"
+)
+
+
+def random_questions(count, rng):
+    return ["".join(rng.choice(CHARS) for _ in range(rng.randint(15, 60))) for _ in range(count)]
+
+
+def mutate(text, edits, rng):
+    chars = list(text)
+    for _ in range(edits):
+        chars[rng.randrange(len(chars))] = "ア"
+    return "".join(chars)
+
+
+def jaccard(a, b):
+    union = a | b
+    return len(a & b) / len(union) if union else 0.0
+
+
+def brute_force_find(sets, text, threshold):
+    """変更前に想定される方法です。すべての登録済みの質問と比較します。"""
+    target = shingles(normalize_ja(text))
+    return next((i for i, other in enumerate(sets) if jaccard(target, other) >= threshold), None)
+
+
+def bench_size(size, queries, rng):
+    questions = random_questions(size, rng)
+    probes = [mutate(rng.choice(questions), rng.randint(1, 4), rng) for _ in range(queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = QADedupIndex(tmp)
+        start = time.perf_counter()
+        for question in questions:
+            index.add(question)
+        add = (time.perf_counter() - start) / size
+        index.flush()
+
+        start = time.perf_counter()
+        for probe in probes:
+            index.find(probe)
+        lsh = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        reloaded = QADedupIndex(tmp)
+        reload = time.perf_counter() - start
+        assert len(reloaded) == len(index)
+
+    sets = [shingles(normalize_ja(question)) for question in questions]
+    brute_queries = max(1, min(queries, 200_000 // size))
+    start = time.perf_counter()
+    for probe in probes[:brute_queries]:
+        brute_force_find(sets, probe, index.threshold)
+    brute = (time.perf_counter() - start) / brute_queries
+
+    print(
+        f"n={size:<7} add {add * 1e6:7.0f}us/doc  query lsh {lsh * 1e6:7.0f}us  "
+        f"brute-force {brute * 1e6:9.0f}us  reload {reload:6.2f}s"
+    )
+
+
+def bench_recall(rng, count=5000):
+    questions = random_questions(count, rng)
+    index = QADedupIndex("")
+    for question in questions:
+        index.add(question)
+    buckets = {}
+    for question in questions:
+        probe = mutate(question, rng.randint(1, 4), rng)
+        similarity = jaccard(shingles(normalize_ja(question)), shingles(normalize_ja(probe)))
+        bucket = buckets.setdefault(min(int(similarity * 10), 9), [0, 0])
+        bucket[0] += 1
+        bucket[1] += index.find(probe) is not None
+    print(f"recall (threshold={index.threshold}):")
+    for k in sorted(buckets):
+        total, found = buckets[k]
+        print(f"  jaccard {k / 10:.1f}-{(k + 1) / 10:.1f}: n={total:<5} flagged={found / total:6.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for size in args.sizes:
+        bench_size(size, args.queries, rng)
+    bench_recall(rng)
+
+
+if __name__ == "__main__":
+    main()
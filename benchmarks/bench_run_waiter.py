@@ -0,0 +1,132 @@
+"""
+common.run_waiter.RunWaiter と、従来の backoff.expo による retrieve_runs の比較ベンチマークです。
+
+完了までの時間がランダムなrunを返すダミーのクライアントを使用し、
+完了したrun 1件あたりのAPI呼び出し回数と、runの完了から検知までの遅延を計測します。
+
+実行例:
+    python -m benchmarks.bench_run_waiter --runs 50 --min-duration 2 --max-duration 15
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import backoff
+
+from benchmarks.harness import summarize
+from common.run_waiter import RunWaiter
+
+
+class FakeRuns:
+    """指定時刻に完了するrunを返す runs.retrieve のダミー実装です。"""
+
+    def __init__(self, finish_at, latency):
+        self.finish_at = finish_at
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def retrieve(self, thread_id, run_id):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        done = time.monotonic() >= self.finish_at[run_id]
+        return SimpleNamespace(
+            id=run_id, status="completed" if done else "in_progress"
+        )
+
+
+def fake_client(finish_at, latency):
+    runs = FakeRuns(finish_at, latency)
+    return SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+
+
+class NotFinished(Exception):
+    pass
+
+
+def legacy_wait(client, thread_id, run_id, max_time):
+    """変更前の retrieve_runs と同じ backoff.expo によるポーリングです。"""
+
+    def _retrieve_runs():
+        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        if run.status == "completed":
+            return run
+        raise NotFinished()
+
+    return backoff.on_exception(backoff.expo, NotFinished, max_time=max_time)(
+        _retrieve_runs
+    )()
+
+
+def schedule(count, min_duration, max_duration, seed=0):
+    rng = random.Random(seed)
+    start = time.monotonic()
+    return {
+        f"run_{i}": start + rng.uniform(min_duration, max_duration)
+        for i in range(count)
+    }
+
+
+def bench_legacy(args):
+    finish_at = schedule(args.runs, args.min_duration, args.max_duration)
+    client = fake_client(finish_at, args.latency)
+    delays = []
+
+    def wait(run_id):
+        legacy_wait(client, "thread", run_id, max_time=args.max_duration * 4)
+        delays.append(time.monotonic() - finish_at[run_id])
+
+    # 従来のヘルパーは1回の呼び出しで1つのrunしか待てないため、runごとにスレッドを使う
+    with ThreadPoolExecutor(max_workers=args.runs) as executor:
+        list(executor.map(wait, finish_at))
+    return client.beta.threads.runs.calls, delays
+
+
+def bench_waiter(args):
+    finish_at = schedule(args.runs, args.min_duration, args.max_duration)
+    client = fake_client(finish_at, args.latency)
+    delays = []
+
+    with RunWaiter(client) as waiter:
+        futures = [
+            waiter.submit(
+                "thread",
+                run_id,
+                callback=lambda run: delays.append(
+                    time.monotonic() - finish_at[run.id]
+                ),
+            )
+            for run_id in finish_at
+        ]
+        for future in futures:
+            future.result()
+    return client.beta.threads.runs.calls, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--min-duration", type=float, default=2)
+    parser.add_argument("--max-duration", type=float, default=15)
+    parser.add_argument("--latency", type=float, default=0.05, help="retrieveの応答時間（秒）")
+    args = parser.parse_args()
+
+    for name, bench in [("legacy", bench_legacy), ("waiter", bench_waiter)]:
+        start = time.perf_counter()
+        calls, delays = bench(args)
+        elapsed = time.perf_counter() - start
+        stats = summarize(delays)
+        print(
+            f"{name:>6} runs={args.runs} calls={calls:<5} calls/run={calls / args.runs:5.2f} "
+            f"detect-delay p50={stats['p50']:5.2f}s p90={stats['p90']:5.2f}s "
+            f"max={stats['max']:5.2f}s wall={elapsed:5.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
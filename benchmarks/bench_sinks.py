@@ -0,0 +1,161 @@
+"""
+StreamingEventHandler の出力方式のスループットを比較するベンチマークです。
+
+合成したテキストの差分とcode_interpreterの差分をハンドラーに直接渡し、
+トークンごとに print(..., flush=True) する従来の実装と、各シンク（TerminalSink・FileSink・
+QueueSink・SSESink）について、1秒あたりのトークン数と実際の write システムコールの回数を計測します。
+最初に、従来の実装と TerminalSink の出力が完全に一致することを確認します。
+
+実行例:
+    python -m benchmarks.bench_sinks --tokens 20000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import queue
+import tempfile
+import time
+from types import SimpleNamespace
+
+from common.helper import StreamingEventHandler
+from common.sinks import FileSink, QueueSink, SSESink, TerminalSink
+
+
+class LegacyHandler:
+    """変更前の StreamingEventHandler の出力部分です（1トークンごとに print して flush する）。"""
+
+    def __init__(self, assistant_pronpt="assistant >"):
+        self.assistant_prompt = assistant_pronpt
+        self.file_ids = []
+
+    def on_text_created(self, text):
+        print(f"{self.assistant_prompt}", end="", flush=True)
+
+    def on_text_delta(self, delta, snapshot):
+        print(delta.value, end="", flush=True)
+
+    def on_text_done(self, text):
+        print("", end="\n")
+
+    def on_message_done(self, message):
+        print("on_message_done.....")
+        print(message)
+
+    def on_tool_call_created(self, tool_call):
+        print(f"{self.assistant_prompt} {tool_call.type}\n", flush=True)
+
+    def on_tool_call_delta(self, delta, snapshot):
+        if delta.type == "code_interpreter":
+            if delta.code_interpreter.input:
+                print(delta.code_interpreter.input, end="", flush=True)
+            if delta.code_interpreter.outputs:
+                print(delta)
+                print(f"\n\noutput >", flush=True)
+                for output in delta.code_interpreter.outputs:
+                    print("--output information--")
+                    print(f"\n{output}")
+                    if output.type == "logs":
+                        print(f"\n{output.logs}", flush=True)
+                    elif output.type == "image":
+                        self.file_ids.append(output.image.file_id)
+
+    def on_end(self):
+        pass
+
+
+def code_delta(input=None, outputs=None):
+    return SimpleNamespace(
+        type="code_interpreter",
+        code_interpreter=SimpleNamespace(input=input, outputs=outputs),
+    )
+
+
+def drive(handler, tokens):
+    """1つの応答分のイベントをハンドラーに渡します。"""
+    handler.on_tool_call_created(SimpleNamespace(type="code_interpreter"))
+    for i in range(20):
+        handler.on_tool_call_delta(code_delta(input=f"x{i} = {i}\n"), None)
+    handler.on_tool_call_delta(
+        code_delta(outputs=[SimpleNamespace(type="logs", logs="done")]), None
+    )
+    handler.on_text_created(None)
+    for i in range(tokens):
+        handler.on_text_delta(SimpleNamespace(value=f"トークン{i} "), None)
+    handler.on_text_done(None)
+    handler.on_message_done(SimpleNamespace(id="msg_bench", content=[]))
+    handler.on_end()
+
+
+class CountingRaw(io.RawIOBase):
+    """write の呼び出し回数（システムコールの回数）を数えるファイルです。"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.writes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.writes += 1
+        return os.write(self.fd, data)
+
+
+def counting_stdout(path):
+    raw = CountingRaw(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC))
+    return raw, io.TextIOWrapper(io.BufferedWriter(raw), encoding="utf-8")
+
+
+def check_identical(tokens):
+    legacy_out = io.StringIO()
+    with contextlib.redirect_stdout(legacy_out):
+        drive(LegacyHandler(), tokens)
+    new_out = io.StringIO()
+    with contextlib.redirect_stdout(new_out):
+        drive(StreamingEventHandler(), tokens)
+    assert legacy_out.getvalue() == new_out.getvalue(), "console output differs"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=20000)
+    args = parser.parse_args()
+
+    check_identical(200)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "stdout.txt")
+        variants = {
+            "legacy print(flush=True)": lambda: LegacyHandler(),
+            "TerminalSink per token": lambda: StreamingEventHandler(
+                sinks=[TerminalSink(flush_interval_ms=0)]
+            ),
+            "TerminalSink batched": lambda: StreamingEventHandler(),
+            "FileSink": lambda: StreamingEventHandler(
+                sinks=[FileSink(os.path.join(tmp, "file.txt"), mode="w")]
+            ),
+            "QueueSink": lambda: StreamingEventHandler(sinks=[QueueSink(queue.Queue())]),
+            "SSESink": lambda: StreamingEventHandler(
+                sinks=[SSESink(queue.Queue().put)]
+            ),
+        }
+        for name, factory in variants.items():
+            raw, stdout = counting_stdout(out_path)
+            handler = factory()
+            with contextlib.redirect_stdout(stdout):
+                start = time.perf_counter()
+                drive(handler, args.tokens)
+                elapsed = time.perf_counter() - start
+            if hasattr(handler, "close"):
+                handler.close()
+            stdout.close()
+            print(
+                f"{name:>26}: tokens/s={args.tokens / elapsed:12.0f} "
+                f"stdout writes={raw.writes:7d}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+serversentevent/server.py の /stream/{thread_id} の負荷ベンチマークです。
+
+モックのAssistants APIに向けてサーバーを起動し、STREAM_MODE（thread / async）ごとに
+同時接続数を増やしながら、完走したストリーム数・最初のトークンまでの時間・
+トークン間の遅延を計測します。
+
+実行例:
+    python -m benchmarks.bench_sse_stream --concurrency 50 200 1000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.harness import free_port, summarize, uvicorn_server
+
+
+async def consume_stream(client, url, results):
+    """1本のSSEストリームを最後まで読み、到着時刻を記録します。"""
+    start = time.perf_counter()
+    arrivals = []
+    try:
+        async with client.stream("GET", url) as response:
+            async for line in response.aiter_lines():
+                if line == "event: done":
+                    break
+                if line.startswith("data:"):
+                    arrivals.append(time.perf_counter())
+        results["ok"] += 1
+    except Exception:
+        results["error"] += 1
+        return
+    if arrivals:
+        results["ttft"].append(arrivals[0] - start)
+        results["gaps"].extend(b - a for a, b in zip(arrivals, arrivals[1:]))
+        results["tokens"] += len(arrivals)
+
+
+def create_threads(mock_url, count):
+    """モックのAPIにスレッドを作成し、IDのリストを返します。"""
+    with httpx.Client(base_url=f"{mock_url}/v1") as client:
+        return [client.post("/threads", json={}).json()["id"] for _ in range(count)]
+
+
+async def run_level(base_url, thread_ids, timeout):
+    """スレッドごとに1本ずつ同時にストリームを開き、結果を集計します。"""
+    concurrency = len(thread_ids)
+    results = {"ok": 0, "error": 0, "ttft": [], "gaps": [], "tokens": 0}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                consume_stream(client, f"{base_url}/stream/{thread_id}", results)
+                for thread_id in thread_ids
+            )
+        )
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def report(mode, concurrency, results, elapsed):
+    ttft = summarize(results["ttft"])
+    gaps = summarize(results["gaps"])
+    print(
+        f"{mode:>6} c={concurrency:<5} ok={results['ok']:<5} err={results['error']:<4} "
+        f"tokens/s={results['tokens'] / elapsed:10.1f} "
+        f"ttft p50={ttft['p50'] * 1000:7.1f}ms p99={ttft['p99'] * 1000:7.1f}ms "
+        f"gap p50={gaps['p50'] * 1000:6.2f}ms p99={gaps['p99'] * 1000:7.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--modes", nargs="+", default=["thread", "async"], help="計測するSTREAM_MODE"
+    )
+    parser.add_argument(
+        "--concurrency", nargs="+", type=int, default=[50, 200, 500, 1000]
+    )
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    mock_env = {
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_TOKEN_INTERVAL_MS": str(args.interval_ms),
+    }
+    with tempfile.TemporaryDirectory() as tmp, uvicorn_server(
+        "benchmarks.mock_api:app", mock_port, env=mock_env
+    ) as mock:
+        thread_ids = create_threads(mock, max(args.concurrency))
+        for mode in args.modes:
+            server_env = {
+                "OPENAI_BASE_URL": f"{mock}/v1",
+                "OPENAI_API_KEY": "mock",
+                "STREAM_MODE": mode,
+                # モックのサーバーは起動ごとにIDが変わるため、レジストリを共有しない
+                "ASSISTANT_REGISTRY_PATH": os.path.join(tmp, "registry.json"),
+            }
+            with uvicorn_server(
+                "server:app",
+                free_port(),
+                app_dir="00_prototypes/serversentevent",
+                env=server_env,
+            ) as server:
+                for concurrency in args.concurrency:
+                    results, elapsed = asyncio.run(
+                        run_level(server, thread_ids[:concurrency], args.timeout)
+                    )
+                    report(mode, concurrency, results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+common.stream_client のスループットのベンチマークです。
+
+このモジュール自体をテスト用のサーバー（日本語のテキストを小さなチャンクで返す text/plain と、
+IDと複数行の data を持つSSE）として起動し、次の項目を計測します。
+
+    text    従来の stream_test/client.py（1バイトずつ読み込み、毎回 decode を試す）と
+            StreamClient.iter_text（大きなチャンクとインクリメンタルデコーダー）の MB/s。
+            StreamClient は、ターンごとにセッションを作り直す場合と、接続を再利用する場合を比較します。
+            サーバーの送信速度に左右されないよう、クライアントのCPU時間も出力します。
+    sse     SSEの解析の events/s と、一定間隔で切断されたときに Last-Event-ID で再接続して
+            すべてのイベントを1回ずつ受け取れるか。
+
+実行例:
+    python -m benchmarks.bench_stream_client --kb 512 --turns 5 --events 20000
+"""
+
+import argparse
+import logging
+import random
+import time
+
+import requests
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from benchmarks.harness import free_port, uvicorn_server
+from common.stream_client import SSEParser, StreamClient
+
+app = FastAPI()
+
+# 切断のシミュレーションで出力されるトレースバックを表示しない
+logging.getLogger("uvicorn.error").setLevel(logging.CRITICAL)
+
+SAMPLE = "数学の質問にお答えします。二次方程式 x^2 + 2x + 1 = 0 の解は x = -1 です。"
+
+
+def sample_text(chars):
+    return (SAMPLE * (chars // len(SAMPLE) + 1))[:chars]
+
+
+@app.get("/text")
+async def text(chars: int = 10000, chunk: int = 3):
+    body = sample_text(chars)
+
+    async def generate():
+        # トークンと同じくらいの小さな断片で送る
+        for i in range(0, len(body), chunk):
+            yield body[i : i + chunk]
+
+    return StreamingResponse(generate(), media_type="text/plain")
+
+
+@app.get("/sse")
+async def sse(request: Request, events: int = 1000, fail_every: int = 0):
+    start = int(request.headers.get("last-event-id", "-1")) + 1
+
+    async def generate():
+        yield "retry: 10\n\n"
+        for i in range(start, events):
+            if fail_every and i > start and i % fail_every == 0:
+                # 接続を途中で切断する
+                raise RuntimeError("simulated disconnect")
+            yield f"id: {i}\nevent: delta\ndata: {SAMPLE}\ndata: {i}\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+def legacy_read(url):
+    """変更前の stream_test/client.py の読み込み方法です（出力は文字列として返します）。"""
+    out = []
+    with requests.get(url, stream=True) as response:
+        buffer = b""
+        for byte in response.iter_content(chunk_size=1):
+            buffer += byte
+            try:
+                char = buffer.decode("utf-8")
+                out.append(char)
+                buffer = b""
+            except UnicodeDecodeError:
+                continue
+    return "".join(out)
+
+
+def bench_text(base_url, kb, turns, chunk):
+    chars = kb * 1024 // 3  # 日本語はUTF-8で1文字3バイト
+    path = f"/text?chars={chars}&chunk={chunk}"
+    expected = sample_text(chars)
+    size = len(expected.encode("utf-8"))
+
+    def legacy(_):
+        return legacy_read(base_url + path)
+
+    def fresh_session(_):
+        with StreamClient(base_url) as client:
+            return "".join(client.iter_text("GET", path))
+
+    shared = StreamClient(base_url)
+
+    def keep_alive(_):
+        return "".join(shared.iter_text("GET", path))
+
+    for name, read in (
+        ("legacy 1-byte", legacy),
+        ("chunked (new session)", fresh_session),
+        ("chunked (keep-alive)", keep_alive),
+    ):
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        for turn in range(turns):
+            assert read(turn) == expected, f"{name}: decoded text differs"
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        print(
+            f"text chunk={chunk:<5} {name:>22}: {size * turns / elapsed / 1e6:8.2f} MB/s "
+            f"{elapsed / turns * 1000:8.1f} ms/turn  client cpu {cpu / turns * 1000:8.1f} ms/turn"
+        )
+    shared.close()
+
+
+def bench_parser(events):
+    """SSEParser を単体で計測し、チャンクの分割位置に依存しないことを確認します。"""
+    body = "retry: 10\r\n\r\n" + "".join(
+        f"id: {i}\r\nevent: delta\r\ndata: {SAMPLE}\r\ndata: {i}\r\n\r\n" for i in range(events)
+    )
+    start = time.perf_counter()
+    whole = SSEParser().feed(body)
+    elapsed = time.perf_counter() - start
+    parser = SSEParser()
+    pieces = []
+    position = 0
+    rng = random.Random(0)
+    while position < len(body):
+        size = rng.randint(1, 64)
+        pieces.extend(parser.feed(body[position : position + size]))
+        position += size
+    assert pieces == whole and len(whole) == events
+    print(f"sse  {'parser only':>22}: {events / elapsed:12.0f} events/s")
+
+
+def bench_sse(base_url, events, fail_every):
+    with StreamClient(base_url, reconnect_delay=0.01) as client:
+        for label, fail in (("no disconnects", 0), (f"disconnect every {fail_every}", fail_every)):
+            client.max_reconnects = events
+            start = time.perf_counter()
+            ids = [
+                int(event.id)
+                for event in client.iter_events(
+                    "GET", f"/sse?events={events}&fail_every={fail}"
+                )
+            ]
+            elapsed = time.perf_counter() - start
+            assert ids == list(range(events)), f"{label}: events lost or duplicated"
+            print(
+                f"sse  {label:>22}: {events / elapsed:12.0f} events/s "
+                f"(all {events} received once)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--kb", type=int, default=256)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument(
+        "--chunks", nargs="+", type=int, default=[3, 4096], help="サーバーが1回に送る文字数"
+    )
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--fail-every", type=int, default=2500)
+    args = parser.parse_args()
+
+    bench_parser(args.events)
+    with uvicorn_server("benchmarks.bench_stream_client:app", free_port()) as url:
+        for chunk in args.chunks:
+            bench_text(url, args.kb, args.turns, chunk)
+        bench_sse(url, args.events, args.fail_every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+common.tool_executor.ToolExecutor のベンチマークです。
+
+I/O待ちを模したツール（同期関数と非同期関数）を1回の requires_action で複数呼び出し、
+逐次実行と並行実行それぞれの requires_action 1サイクルあたりの所要時間を計測します。
+
+実行例:
+    python -m benchmarks.bench_tool_executor --calls 5 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from benchmarks.harness import summarize
+from common.tool_executor import ToolExecutor
+from common.tool_registry import ToolRegistry
+
+LATENCY = 0.2
+
+tools = ToolRegistry()
+
+
+@tools.tool
+def lookup_sync(location: str):
+    time.sleep(LATENCY)
+    return f"{location}: 22c"
+
+
+@tools.tool
+async def lookup_async(location: str):
+    await asyncio.sleep(LATENCY)
+    return f"{location}: 0.5"
+
+
+def tool_calls(count, name):
+    return [
+        SimpleNamespace(
+            id=f"call_{i}",
+            function=SimpleNamespace(
+                name=name, arguments=json.dumps({"location": f"city{i}"})
+            ),
+        )
+        for i in range(count)
+    ]
+
+
+def sequential(calls):
+    # 変更前の EventHandler.handle_requires_action と同じ逐次実行
+    outputs = []
+    for call in calls:
+        function, args = tools.prepare(call.function.name, call.function.arguments)
+        if asyncio.iscoroutinefunction(function):
+            result = asyncio.run(function(**args))
+        else:
+            result = function(**args)
+        outputs.append({"tool_call_id": call.id, "output": result})
+    return outputs
+
+
+def measure(label, run, calls, cycles):
+    timings = []
+    for _ in range(cycles):
+        start = time.perf_counter()
+        run(calls)
+        timings.append(time.perf_counter() - start)
+    stats = summarize(timings)
+    print(
+        f"{label:<22} calls={len(calls)} cycle p50={stats['p50'] * 1000:7.1f}ms "
+        f"p99={stats['p99'] * 1000:7.1f}ms"
+    )
+
+
+def main():
+    global LATENCY
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--cycles", type=int, default=10)
+    args = parser.parse_args()
+    LATENCY = args.latency
+
+    with ToolExecutor.from_registry(tools) as executor:
+        for name in ["lookup_sync", "lookup_async"]:
+            calls = tool_calls(args.calls, name)
+            measure(f"sequential/{name}", sequential, calls, args.cycles)
+            measure(f"executor/{name}", executor.run, calls, args.cycles)
+
+
+if __name__ == "__main__":
+    main()
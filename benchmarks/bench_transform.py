@@ -0,0 +1,196 @@
+"""
+アシスタントのメッセージ変換（transform_latest_assistant_messages）のマイクロベンチマークです。
+
+注釈の多い大量のメッセージを含むスレッドを生成し、従来の実装と
+common.message_transform の1回の走査による実装（辞書・レコード・ジェネレーター）について、
+1回の変換にかかる時間と tracemalloc によるメモリ確保量のピークを計測します。
+
+実行例:
+    python -m benchmarks.bench_transform --messages 1000 5000 --annotations 20
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+from openai.types.beta.threads import ImageFileContentBlock, Message, TextContentBlock
+
+from benchmarks.harness import summarize
+from common.helper import transform_latest_assistant_messages
+from common.message_transform import (
+    iter_latest_assistant_records,
+    latest_assistant_records,
+)
+
+
+def legacy_transform(messages):
+    """
+    変更前の transform_latest_assistant_messages の実装です。
+    ただし注釈の判定は、現在のSDKで一致するよう annotation.type で行います（比較のため）。
+    """
+    latest_assistant_data = []
+    user_index = next(
+        (i for i, m in enumerate(messages.data) if m.role == "user"), None
+    )
+    if user_index is not None:
+        latest_assistant_data = [
+            item for item in messages.data[:user_index] if item.role == "assistant"
+        ]
+    transformed_data = []
+    for item in latest_assistant_data:
+        text_content = None
+        image_file_ids = []
+        id = item.id
+        for content in item.content:
+            if isinstance(content, TextContentBlock):
+                text_info = content.text.value
+                file_paths = []
+                if hasattr(content.text, "annotations"):
+                    file_paths = [
+                        {
+                            "file_id": annotation.file_path.file_id,  # type: ignore
+                            "ext": os.path.splitext(annotation.text)[1][1:],
+                        }
+                        for annotation in content.text.annotations
+                        if annotation.type == "file_path"
+                    ]
+                text_content = {
+                    "type": "text",
+                    "value": text_info,
+                    "file_ids": file_paths,
+                }
+            elif isinstance(content, ImageFileContentBlock):
+                image_file_ids.append(content.image_file.file_id)
+        if text_content:
+            text_content["image_file_ids"] = image_file_ids
+            transformed_data.append({"id": id, "content": text_content})
+        else:
+            for image_file_id in image_file_ids:
+                transformed_data.append(
+                    {
+                        "id": id,
+                        "content": {"type": "image", "image_file_ids": [image_file_id]},
+                    }
+                )
+    return transformed_data[::-1]
+
+
+class Page:
+    """messages.list の戻り値と同じく data 属性を持つページです。"""
+
+    def __init__(self, data):
+        self.data = data
+
+
+def make_messages(count, annotations):
+    """
+    新しい順に並んだメッセージを生成します。最も古い1件だけが user のメッセージで、
+    それ以外はすべて最新のターンのアシスタントのメッセージです（最悪のケース）。
+    """
+    messages = []
+    for i in range(count):
+        role = "user" if i == count - 1 else "assistant"
+        notes = []
+        for j in range(annotations):
+            if j % 2:
+                notes.append(
+                    {
+                        "type": "file_citation",
+                        "text": f"【{j}†source】",
+                        "start_index": j,
+                        "end_index": j + 1,
+                        "file_citation": {"file_id": f"file-c{i}-{j}", "quote": ""},
+                    }
+                )
+            else:
+                notes.append(
+                    {
+                        "type": "file_path",
+                        "text": f"sandbox:/mnt/data/result_{i}_{j}.csv",
+                        "start_index": j,
+                        "end_index": j + 1,
+                        "file_path": {"file_id": f"file-p{i}-{j}"},
+                    }
+                )
+        content = [
+            {"type": "text", "text": {"value": f"answer {i}", "annotations": notes}}
+        ]
+        if i % 10 == 0:
+            content.append({"type": "image_file", "image_file": {"file_id": f"img-{i}"}})
+        if i % 97 == 0 and role == "assistant":
+            # テキストのない画像だけのメッセージ
+            content = [
+                {"type": "image_file", "image_file": {"file_id": f"img-{i}-{k}"}}
+                for k in range(3)
+            ]
+        messages.append(
+            Message.model_validate(
+                {
+                    "id": f"msg_{count - i:06d}",
+                    "object": "thread.message",
+                    "created_at": 0,
+                    "thread_id": "thread_bench",
+                    "role": role,
+                    "status": "completed",
+                    "content": content,
+                    "attachments": [],
+                    "metadata": {},
+                    "assistant_id": None,
+                    "run_id": None,
+                }
+            )
+        )
+    return Page(messages)
+
+
+IMPLEMENTATIONS = {
+    "legacy": legacy_transform,
+    "dicts": transform_latest_assistant_messages,
+    "records": latest_assistant_records,
+    "generator": lambda page: sum(1 for _ in iter_latest_assistant_records(page)),
+}
+
+
+def measure(function, page, repeat):
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(page)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", nargs="+", type=int, default=[1000, 5000])
+    parser.add_argument("--annotations", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for count in args.messages:
+        page = make_messages(count, args.annotations)
+        expected = legacy_transform(page)
+        assert transform_latest_assistant_messages(page) == expected
+        assert [r.as_dict() for r in latest_assistant_records(page)] == expected
+        assert [
+            r.as_dict() for r in iter_latest_assistant_records(page)
+        ] == expected[::-1]
+
+        for name, function in IMPLEMENTATIONS.items():
+            timing, peak = measure(function, page, args.repeat)
+            print(
+                f"messages={count:<6} annotations={args.annotations:<4} {name:>9} "
+                f"p50={timing['p50'] * 1000:8.2f}ms p90={timing['p90'] * 1000:8.2f}ms "
+                f"peak alloc={peak / 1024:9.1f}KiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
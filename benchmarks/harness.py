@@ -0,0 +1,140 @@
+"""
+ベンチマークスクリプトで共通して使用する補助関数です。
+"""
+
+import contextlib
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+# リポジトリのルートディレクトリ
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, p):
+    """
+    値のリストから指定されたパーセンタイルを計算します。
+
+    Parameters:
+    values (list): 数値のリスト。
+    p (float): パーセンタイル（0〜100）。
+
+    Returns:
+    float: パーセンタイル値。値が空の場合は0.0。
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def summarize(values):
+    """
+    値のリストから件数・平均・p50・p90・p99・最大値を計算します。
+
+    Parameters:
+    values (list): 数値のリスト。
+
+    Returns:
+    dict: 集計結果。
+    """
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def peak_rss_mb(pid=None):
+    """
+    プロセスの最大常駐メモリ（MiB）を返します。
+
+    Parameters:
+    pid (int): 対象のプロセスID。省略時は自分自身のプロセス。
+
+    Returns:
+    float: 最大常駐メモリ（MiB）。取得できない場合は0.0。
+    """
+    if pid is None:
+        # Linuxでは ru_maxrss はKiB単位
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with contextlib.suppress(OSError):
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class ServerURL(str):
+    """起動したサーバーのURLです。pid 属性にサーバーのプロセスIDを持ちます。"""
+
+    pid = None
+
+
+def free_port():
+    """空いているローカルのTCPポート番号を返します。"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    """指定されたポートが接続を受け付けるまで待機します。"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError):
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        time.sleep(0.1)
+    raise TimeoutError(f"port {port} did not open within {timeout}s")
+
+
+@contextlib.contextmanager
+def uvicorn_server(app, port, app_dir=".", env=None):
+    """
+    uvicornでアプリケーションを子プロセスとして起動し、終了時に停止します。
+
+    Parameters:
+    app (str): "module:attr" 形式のアプリケーション。
+    port (int): 待ち受けるポート番号。
+    app_dir (str): モジュールを検索するディレクトリ（リポジトリルートからの相対パス）。
+    env (dict): 追加で設定する環境変数。
+    """
+    process_env = dict(os.environ)
+    process_env.update(env or {})
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            app,
+            "--app-dir",
+            app_dir,
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        cwd=PROJECT_ROOT,
+        env=process_env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        url = ServerURL(f"http://127.0.0.1:{port}")
+        url.pid = process.pid
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
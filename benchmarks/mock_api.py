@@ -0,0 +1,805 @@
+"""
+ベンチマーク用のAssistants APIのモックサーバーです。
+
+OpenAIクライアントの base_url をこのサーバーに向けることで、実際のAPIを呼び出さずに
+このプロジェクトのスクリプトやサーバーを動かし、性能を計測できます。
+assistants / threads / messages / runs / files / vector_stores / chat.completions の
+うち、このプロジェクトで使用しているエンドポイントをメモリ上の状態で実装しています。
+
+起動例:
+    uvicorn benchmarks.mock_api:app --port 8100
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock python 05_tools_function_calling.py
+
+環境変数:
+    MOCK_TOKENS             1回の応答で返すトークン数（既定: 200）
+    MOCK_TOKEN_INTERVAL_MS  ストリーミングでトークンを返す間隔（既定: 10）
+    MOCK_LATENCY_MS         すべてのリクエストに加える応答遅延（既定: 0）
+    MOCK_RUN_DURATION_MS    ストリーミングしないrunが完了するまでの時間（既定: 500）
+    MOCK_REQUIRES_ACTION    1の場合、function ツールを持つrunは最初に requires_action になる（既定: 1）
+    MOCK_POLL_AFTER_MS      指定した場合、runの応答に openai-poll-after-ms ヘッダーを付ける
+    MOCK_ARRAY_ITEMS        requires_action の引数で配列に入れる要素数（既定: 1）
+    MOCK_MAX_ACTIVE_RUNS    指定した場合、実行中のrunがこの数に達するとrunの作成を429で拒否する
+    MOCK_ERROR_RATE         runの作成とツールの出力の送信を503で失敗させる確率（既定: 0）
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# 1回のrunで返すトークン数
+MOCK_TOKENS = int(os.getenv("MOCK_TOKENS", "200"))
+# トークンを返す間隔（ミリ秒）
+MOCK_TOKEN_INTERVAL_MS = float(os.getenv("MOCK_TOKEN_INTERVAL_MS", "10"))
+# すべてのリクエストに加える応答遅延（ミリ秒）
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "0"))
+# ストリーミングしないrunが完了するまでの時間（ミリ秒）
+MOCK_RUN_DURATION_MS = float(os.getenv("MOCK_RUN_DURATION_MS", "500"))
+# function ツールを持つrunで requires_action を発生させるかどうか
+MOCK_REQUIRES_ACTION = os.getenv("MOCK_REQUIRES_ACTION", "1") == "1"
+# クライアントにポーリング間隔を指示するヘッダーの値（ミリ秒）
+MOCK_POLL_AFTER_MS = os.getenv("MOCK_POLL_AFTER_MS")
+# requires_action の引数で配列に入れる要素数
+MOCK_ARRAY_ITEMS = int(os.getenv("MOCK_ARRAY_ITEMS", "1"))
+# 同時に実行できるrunの数（レート制限のシミュレーション）
+MOCK_MAX_ACTIVE_RUNS = int(os.getenv("MOCK_MAX_ACTIVE_RUNS", "0"))
+# runの作成とツールの出力の送信を一時的なサーバーエラーで失敗させる確率
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+
+
+async def latency():
+    """すべてのリクエストに MOCK_LATENCY_MS の遅延を加えます。"""
+    if MOCK_LATENCY_MS:
+        await asyncio.sleep(MOCK_LATENCY_MS / 1000)
+
+
+app = FastAPI(dependencies=[Depends(latency)])
+
+
+class MockError(Exception):
+    """OpenAIのAPIと同じ形式のエラー応答を返すための例外です。"""
+
+    def __init__(
+        self,
+        status_code,
+        message,
+        error_type="invalid_request_error",
+        code=None,
+        headers=None,
+    ):
+        self.status_code = status_code
+        self.message = message
+        self.error_type = error_type
+        self.code = code
+        self.headers = headers
+
+
+@app.exception_handler(MockError)
+async def mock_error_handler(request: Request, exc: MockError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={
+            "error": {
+                "message": exc.message,
+                "type": exc.error_type,
+                "param": None,
+                "code": exc.code,
+            }
+        },
+        headers=exc.headers,
+    )
+
+
+class MockState:
+    """モックサーバーが保持するオブジェクトです。"""
+
+    def __init__(self):
+        self.assistants = {}
+        self.threads = {}
+        # thread_id -> 作成順のメッセージのリスト
+        self.messages = {}
+        self.runs = {}
+        # file_id -> (ファイルオブジェクト, 内容)
+        self.files = {}
+        self.vector_stores = {}
+        self.file_batches = {}
+        # ストリーミングしないrunを進めるタスク
+        self.tasks = set()
+
+
+state = MockState()
+
+
+def new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def now():
+    return int(time.time())
+
+
+def sse(event, data):
+    """SSEの1イベント分の文字列を生成します。"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def get_or_404(store, object_id, kind):
+    obj = store.get(object_id)
+    if obj is None:
+        raise MockError(404, f"No {kind} found with id '{object_id}'.")
+    return obj
+
+
+def paginate(items, request: Request):
+    """
+    作成順に並んだオブジェクトのリストを、limit / order / after / before で絞り込みます。
+
+    Parameters:
+    items (list): 作成順（古い順）のオブジェクトのリスト。
+    request (Request): クエリパラメーターを持つリクエスト。
+
+    Returns:
+    dict: リスト形式の応答。
+    """
+    params = request.query_params
+    limit = int(params.get("limit", 20))
+    ordered = list(items) if params.get("order", "desc") == "asc" else items[::-1]
+    ids = [item["id"] for item in ordered]
+    if params.get("after") in ids:
+        ordered = ordered[ids.index(params["after"]) + 1 :]
+    elif params.get("before") in ids:
+        ordered = ordered[: ids.index(params["before"])]
+    data = ordered[:limit]
+    return {
+        "object": "list",
+        "data": data,
+        "first_id": data[0]["id"] if data else None,
+        "last_id": data[-1]["id"] if data else None,
+        "has_more": len(ordered) > limit,
+    }
+
+
+def run_response(run):
+    """runの応答を返します。MOCK_POLL_AFTER_MS が指定されている場合はヘッダーを付けます。"""
+    headers = {}
+    if MOCK_POLL_AFTER_MS:
+        headers["openai-poll-after-ms"] = MOCK_POLL_AFTER_MS
+    return JSONResponse(run, headers=headers)
+
+
+def reply_text():
+    return "".join(f"tok{i} " for i in range(MOCK_TOKENS))
+
+
+def sample_value(schema):
+    """JSONスキーマを満たすサンプルの値を生成します（requires_action の引数に使用します）。"""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        required = schema.get("required", list(properties))
+        return {key: sample_value(properties[key]) for key in required}
+    if kind == "array":
+        return [sample_value(schema.get("items", {})) for _ in range(MOCK_ARRAY_ITEMS)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return True
+    return "sample"
+
+
+def tool_calls_for(run):
+    """runの function ツールそれぞれについて、ツール呼び出しを1つずつ生成します。"""
+    return [
+        {
+            "id": new_id("call"),
+            "type": "function",
+            "function": {
+                "name": tool["function"]["name"],
+                "arguments": json.dumps(
+                    sample_value(tool["function"].get("parameters", {})),
+                    ensure_ascii=False,
+                ),
+            },
+        }
+        for tool in run["tools"]
+        if tool.get("type") == "function"
+    ]
+
+
+def message_object(thread_id, role, text, run_id=None, assistant_id=None, status="completed"):
+    content = []
+    if text is not None:
+        content = [{"type": "text", "text": {"value": text, "annotations": []}}]
+    return {
+        "id": new_id("msg"),
+        "object": "thread.message",
+        "created_at": now(),
+        "thread_id": thread_id,
+        "run_id": run_id,
+        "assistant_id": assistant_id,
+        "role": role,
+        "status": status,
+        "content": content,
+        "attachments": [],
+        "metadata": {},
+    }
+
+
+def add_message(thread_id, role, content, **kwargs):
+    if isinstance(content, list):
+        # [{"type": "text", "text": "..."}] 形式の content
+        content = "".join(part.get("text", "") for part in content)
+    message = message_object(thread_id, role, content, **kwargs)
+    state.messages.setdefault(thread_id, []).append(message)
+    return message
+
+
+# ---------------------------------------------------------------------------
+# assistants
+
+
+@app.post("/v1/assistants")
+async def create_assistant(request: Request):
+    body = await request.json()
+    assistant = {
+        "id": new_id("asst"),
+        "object": "assistant",
+        "created_at": now(),
+        "name": body.get("name"),
+        "description": body.get("description"),
+        "instructions": body.get("instructions"),
+        "model": body.get("model"),
+        "tools": body.get("tools", []),
+        "tool_resources": body.get("tool_resources", {}),
+        "metadata": body.get("metadata", {}),
+    }
+    state.assistants[assistant["id"]] = assistant
+    return assistant
+
+
+@app.get("/v1/assistants")
+async def list_assistants(request: Request):
+    return paginate(list(state.assistants.values()), request)
+
+
+@app.get("/v1/assistants/{assistant_id}")
+async def retrieve_assistant(assistant_id: str):
+    return get_or_404(state.assistants, assistant_id, "assistant")
+
+
+@app.post("/v1/assistants/{assistant_id}")
+async def update_assistant(assistant_id: str, request: Request):
+    assistant = get_or_404(state.assistants, assistant_id, "assistant")
+    assistant.update(await request.json())
+    return assistant
+
+
+@app.delete("/v1/assistants/{assistant_id}")
+async def delete_assistant(assistant_id: str):
+    get_or_404(state.assistants, assistant_id, "assistant")
+    del state.assistants[assistant_id]
+    return {"id": assistant_id, "object": "assistant.deleted", "deleted": True}
+
+
+# ---------------------------------------------------------------------------
+# threads / messages
+
+
+@app.post("/v1/threads")
+async def create_thread(request: Request):
+    body = await request.body()
+    body = json.loads(body) if body else {}
+    thread = {
+        "id": new_id("thread"),
+        "object": "thread",
+        "created_at": now(),
+        "tool_resources": body.get("tool_resources", {}),
+        "metadata": body.get("metadata", {}),
+    }
+    state.threads[thread["id"]] = thread
+    state.messages[thread["id"]] = []
+    for message in body.get("messages", []):
+        add_message(thread["id"], message.get("role", "user"), message.get("content"))
+    return thread
+
+
+@app.get("/v1/threads/{thread_id}")
+async def retrieve_thread(thread_id: str):
+    return get_or_404(state.threads, thread_id, "thread")
+
+
+@app.delete("/v1/threads/{thread_id}")
+async def delete_thread(thread_id: str):
+    get_or_404(state.threads, thread_id, "thread")
+    del state.threads[thread_id]
+    state.messages.pop(thread_id, None)
+    return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+
+
+@app.post("/v1/threads/{thread_id}/messages")
+async def create_message(thread_id: str, request: Request):
+    get_or_404(state.threads, thread_id, "thread")
+    body = await request.json()
+    return add_message(thread_id, body.get("role", "user"), body.get("content"))
+
+
+@app.get("/v1/threads/{thread_id}/messages")
+async def list_messages(thread_id: str, request: Request):
+    get_or_404(state.threads, thread_id, "thread")
+    messages = state.messages[thread_id]
+    run_id = request.query_params.get("run_id")
+    if run_id:
+        messages = [m for m in messages if m["run_id"] == run_id]
+    return paginate(messages, request)
+
+
+# ---------------------------------------------------------------------------
+# runs
+
+
+def check_rate_limit():
+    """実行中のrunが MOCK_MAX_ACTIVE_RUNS に達している場合は429を返します。"""
+    if not MOCK_MAX_ACTIVE_RUNS:
+        return
+    active = sum(
+        1
+        for run in state.runs.values()
+        if run["status"] in ("queued", "in_progress", "requires_action")
+    )
+    if active >= MOCK_MAX_ACTIVE_RUNS:
+        raise MockError(
+            429,
+            "Rate limit reached for active runs.",
+            error_type="requests",
+            code="rate_limit_exceeded",
+            headers={"retry-after": "1"},
+        )
+
+
+def maybe_fail():
+    """MOCK_ERROR_RATE の確率で503を返します。"""
+    if MOCK_ERROR_RATE and random.random() < MOCK_ERROR_RATE:
+        raise MockError(503, "The server is overloaded.", error_type="server_error")
+
+
+def new_run(thread_id, body):
+    assistant = get_or_404(state.assistants, body.get("assistant_id"), "assistant")
+    maybe_fail()
+    check_rate_limit()
+    run = {
+        "id": new_id("run"),
+        "object": "thread.run",
+        "created_at": now(),
+        "assistant_id": assistant["id"],
+        "thread_id": thread_id,
+        "status": "queued",
+        "instructions": body.get("instructions") or assistant.get("instructions") or "",
+        "model": body.get("model") or assistant.get("model") or "mock",
+        "tools": body.get("tools") or assistant.get("tools", []),
+        "metadata": body.get("metadata", {}),
+        "started_at": None,
+        "completed_at": None,
+        "cancelled_at": None,
+        "failed_at": None,
+        "expires_at": None,
+        "last_error": None,
+        "required_action": None,
+        "usage": None,
+    }
+    # ツールの出力を受け取った後は requires_action にしない
+    run["_pending_action"] = MOCK_REQUIRES_ACTION and bool(tool_calls_for(run))
+    state.runs[run["id"]] = run
+    for message in body.get("additional_messages") or []:
+        add_message(thread_id, message.get("role", "user"), message.get("content"))
+    return run
+
+
+def public(run):
+    return {key: value for key, value in run.items() if not key.startswith("_")}
+
+
+def require_action(run):
+    run["status"] = "requires_action"
+    run["required_action"] = {
+        "type": "submit_tool_outputs",
+        "submit_tool_outputs": {"tool_calls": tool_calls_for(run)},
+    }
+    run["_pending_action"] = False
+
+
+def complete(run):
+    run["status"] = "completed"
+    run["completed_at"] = now()
+    run["required_action"] = None
+    run["usage"] = {
+        "prompt_tokens": 10,
+        "completion_tokens": MOCK_TOKENS,
+        "total_tokens": 10 + MOCK_TOKENS,
+    }
+
+
+async def drive_run(run):
+    """ストリーミングしないrunを MOCK_RUN_DURATION_MS かけて進めます。"""
+    run["status"] = "in_progress"
+    run["started_at"] = run["started_at"] or now()
+    await asyncio.sleep(MOCK_RUN_DURATION_MS / 1000)
+    if run["status"] != "in_progress":
+        # キャンセルされた
+        return
+    if run["_pending_action"]:
+        require_action(run)
+        return
+    if run["thread_id"] in state.threads:
+        add_message(
+            run["thread_id"],
+            "assistant",
+            reply_text(),
+            run_id=run["id"],
+            assistant_id=run["assistant_id"],
+        )
+    complete(run)
+
+
+def start_run(run):
+    task = asyncio.create_task(drive_run(run))
+    state.tasks.add(task)
+    task.add_done_callback(state.tasks.discard)
+
+
+async def run_events(run):
+    """runのストリーミングイベントを一定間隔で生成します。"""
+    thread_id, run_id, assistant_id = run["thread_id"], run["id"], run["assistant_id"]
+    interval = MOCK_TOKEN_INTERVAL_MS / 1000
+
+    if run["status"] == "queued":
+        yield sse("thread.run.created", public(run))
+        yield sse("thread.run.queued", public(run))
+    run["status"] = "in_progress"
+    run["started_at"] = run["started_at"] or now()
+    yield sse("thread.run.in_progress", public(run))
+
+    if run["_pending_action"]:
+        require_action(run)
+        tool_calls = run["required_action"]["submit_tool_outputs"]["tool_calls"]
+        step = {
+            "id": new_id("step"),
+            "object": "thread.run.step",
+            "created_at": now(),
+            "assistant_id": assistant_id,
+            "thread_id": thread_id,
+            "run_id": run_id,
+            "type": "tool_calls",
+            "status": "in_progress",
+            "step_details": {"type": "tool_calls", "tool_calls": []},
+            "last_error": None,
+            "expired_at": None,
+            "cancelled_at": None,
+            "failed_at": None,
+            "completed_at": None,
+            "metadata": {},
+            "usage": None,
+        }
+        yield sse("thread.run.step.created", step)
+        for index, tool_call in enumerate(tool_calls):
+            delta = {
+                "id": step["id"],
+                "object": "thread.run.step.delta",
+                "delta": {
+                    "step_details": {
+                        "type": "tool_calls",
+                        "tool_calls": [{"index": index, **tool_call}],
+                    }
+                },
+            }
+            yield sse("thread.run.step.delta", delta)
+        yield sse("thread.run.requires_action", public(run))
+        yield "event: done\ndata: [DONE]\n\n"
+        return
+
+    message = message_object(
+        thread_id, "assistant", None, run_id, assistant_id, status="in_progress"
+    )
+    if thread_id in state.messages:
+        state.messages[thread_id].append(message)
+    yield sse("thread.message.created", message)
+    yield sse("thread.message.in_progress", message)
+    for i in range(MOCK_TOKENS):
+        if interval:
+            await asyncio.sleep(interval)
+        if run["status"] == "cancelled":
+            # ストリーム中に runs.cancel された
+            message["status"] = "incomplete"
+            yield sse("thread.run.cancelled", public(run))
+            yield "event: done\ndata: [DONE]\n\n"
+            return
+        delta = {
+            "id": message["id"],
+            "object": "thread.message.delta",
+            "delta": {
+                "content": [
+                    {"index": 0, "type": "text", "text": {"value": f"tok{i} "}}
+                ]
+            },
+        }
+        yield sse("thread.message.delta", delta)
+    message["status"] = "completed"
+    message["content"] = [
+        {"type": "text", "text": {"value": reply_text(), "annotations": []}}
+    ]
+    yield sse("thread.message.completed", message)
+    complete(run)
+    yield sse("thread.run.completed", public(run))
+    yield "event: done\ndata: [DONE]\n\n"
+
+
+@app.post("/v1/threads/{thread_id}/runs")
+async def create_run(thread_id: str, request: Request):
+    get_or_404(state.threads, thread_id, "thread")
+    body = await request.json()
+    run = new_run(thread_id, body)
+    if body.get("stream"):
+        return StreamingResponse(run_events(run), media_type="text/event-stream")
+    start_run(run)
+    return run_response(public(run))
+
+
+@app.post("/v1/threads/runs")
+async def create_thread_and_run(request: Request):
+    body = await request.json()
+    check_rate_limit()
+    thread_body = body.get("thread") or {}
+    thread = {
+        "id": new_id("thread"),
+        "object": "thread",
+        "created_at": now(),
+        "tool_resources": thread_body.get("tool_resources", {}),
+        "metadata": thread_body.get("metadata", {}),
+    }
+    state.threads[thread["id"]] = thread
+    state.messages[thread["id"]] = []
+    for message in thread_body.get("messages", []):
+        add_message(thread["id"], message.get("role", "user"), message.get("content"))
+    run = new_run(thread["id"], body)
+    if body.get("stream"):
+        return StreamingResponse(run_events(run), media_type="text/event-stream")
+    start_run(run)
+    return run_response(public(run))
+
+
+@app.get("/v1/threads/{thread_id}/runs/{run_id}")
+async def retrieve_run(thread_id: str, run_id: str):
+    return run_response(public(get_or_404(state.runs, run_id, "run")))
+
+
+@app.post("/v1/threads/{thread_id}/runs/{run_id}/submit_tool_outputs")
+async def submit_tool_outputs(thread_id: str, run_id: str, request: Request):
+    run = get_or_404(state.runs, run_id, "run")
+    maybe_fail()
+    if run["status"] != "requires_action":
+        raise MockError(
+            400, f"Run {run_id} is not in status requires_action (status={run['status']})."
+        )
+    body = await request.json()
+    run["_tool_outputs"] = body.get("tool_outputs", [])
+    run["status"] = "in_progress"
+    run["required_action"] = None
+    if body.get("stream"):
+        return StreamingResponse(run_events(run), media_type="text/event-stream")
+    start_run(run)
+    return run_response(public(run))
+
+
+@app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+async def cancel_run(thread_id: str, run_id: str):
+    run = get_or_404(state.runs, run_id, "run")
+    if run["status"] in ("queued", "in_progress", "requires_action"):
+        run["status"] = "cancelled"
+        run["cancelled_at"] = now()
+    return run_response(public(run))
+
+
+# ---------------------------------------------------------------------------
+# files
+
+
+@app.post("/v1/files")
+async def create_file(request: Request):
+    # python-multipart に依存しないよう、multipart/form-data を email パーサーで解析する
+    header = f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode()
+    form = BytesParser(policy=HTTP).parsebytes(header + await request.body())
+    fields, content, filename = {}, b"", "upload"
+    for part in form.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if part.get_filename():
+            filename = part.get_filename()
+            content = part.get_payload(decode=True) or b""
+        else:
+            fields[name] = part.get_content().strip()
+    file = {
+        "id": new_id("file"),
+        "object": "file",
+        "bytes": len(content),
+        "created_at": now(),
+        "filename": filename,
+        "purpose": fields.get("purpose", "assistants"),
+        "status": "processed",
+        "status_details": None,
+    }
+    state.files[file["id"]] = (file, content)
+    return file
+
+
+@app.get("/v1/files")
+async def list_files(request: Request):
+    purpose = request.query_params.get("purpose")
+    data = [
+        file
+        for file, _ in state.files.values()
+        if purpose is None or file["purpose"] == purpose
+    ]
+    return {"object": "list", "data": data}
+
+
+@app.get("/v1/files/{file_id}")
+async def retrieve_file(file_id: str):
+    return get_or_404(state.files, file_id, "file")[0]
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    _, content = get_or_404(state.files, file_id, "file")
+    return Response(content, media_type="application/octet-stream")
+
+
+@app.delete("/v1/files/{file_id}")
+async def delete_file(file_id: str):
+    get_or_404(state.files, file_id, "file")
+    del state.files[file_id]
+    return {"id": file_id, "object": "file", "deleted": True}
+
+
+# ---------------------------------------------------------------------------
+# vector_stores
+
+
+def file_counts(file_ids):
+    return {
+        "in_progress": 0,
+        "completed": len(file_ids),
+        "failed": 0,
+        "cancelled": 0,
+        "total": len(file_ids),
+    }
+
+
+@app.post("/v1/vector_stores")
+async def create_vector_store(request: Request):
+    body = await request.json()
+    file_ids = body.get("file_ids", [])
+    vector_store = {
+        "id": new_id("vs"),
+        "object": "vector_store",
+        "created_at": now(),
+        "name": body.get("name"),
+        "usage_bytes": 0,
+        "file_counts": file_counts(file_ids),
+        "status": "completed",
+        "expires_after": body.get("expires_after"),
+        "expires_at": None,
+        "last_active_at": now(),
+        "metadata": body.get("metadata", {}),
+        "_file_ids": list(file_ids),
+    }
+    state.vector_stores[vector_store["id"]] = vector_store
+    return public(vector_store)
+
+
+@app.get("/v1/vector_stores")
+async def list_vector_stores(request: Request):
+    return paginate([public(v) for v in state.vector_stores.values()], request)
+
+
+@app.get("/v1/vector_stores/{vector_store_id}")
+async def retrieve_vector_store(vector_store_id: str):
+    return public(get_or_404(state.vector_stores, vector_store_id, "vector store"))
+
+
+@app.delete("/v1/vector_stores/{vector_store_id}")
+async def delete_vector_store(vector_store_id: str):
+    get_or_404(state.vector_stores, vector_store_id, "vector store")
+    del state.vector_stores[vector_store_id]
+    return {"id": vector_store_id, "object": "vector_store.deleted", "deleted": True}
+
+
+@app.post("/v1/vector_stores/{vector_store_id}/file_batches")
+async def create_file_batch(vector_store_id: str, request: Request):
+    vector_store = get_or_404(state.vector_stores, vector_store_id, "vector store")
+    file_ids = (await request.json()).get("file_ids", [])
+    vector_store["_file_ids"].extend(file_ids)
+    vector_store["file_counts"] = file_counts(vector_store["_file_ids"])
+    vector_store["usage_bytes"] = sum(
+        state.files[file_id][0]["bytes"]
+        for file_id in vector_store["_file_ids"]
+        if file_id in state.files
+    )
+    batch = {
+        "id": new_id("vsfb"),
+        "object": "vector_store.files_batch",
+        "created_at": now(),
+        "vector_store_id": vector_store_id,
+        "status": "completed",
+        "file_counts": file_counts(file_ids),
+    }
+    state.file_batches[batch["id"]] = batch
+    return batch
+
+
+@app.get("/v1/vector_stores/{vector_store_id}/file_batches/{batch_id}")
+async def retrieve_file_batch(vector_store_id: str, batch_id: str):
+    return get_or_404(state.file_batches, batch_id, "file batch")
+
+
+# ---------------------------------------------------------------------------
+# chat.completions
+
+
+async def chat_chunks(completion_id, model):
+    interval = MOCK_TOKEN_INTERVAL_MS / 1000
+
+    def chunk(delta, finish_reason=None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": now(),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    yield f"data: {json.dumps(chunk({'role': 'assistant', 'content': ''}))}\n\n"
+    for i in range(MOCK_TOKENS):
+        if interval:
+            await asyncio.sleep(interval)
+        yield f"data: {json.dumps(chunk({'content': f'tok{i} '}))}\n\n"
+    yield f"data: {json.dumps(chunk({}, 'stop'))}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    completion_id = new_id("chatcmpl")
+    model = body.get("model", "mock")
+    if body.get("stream"):
+        return StreamingResponse(
+            chat_chunks(completion_id, model), media_type="text/event-stream"
+        )
+    await asyncio.sleep(MOCK_TOKENS * MOCK_TOKEN_INTERVAL_MS / 1000)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": now(),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": reply_text()},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 10,
+            "completion_tokens": MOCK_TOKENS,
+            "total_tokens": 10 + MOCK_TOKENS,
+        },
+    }
@@ -0,0 +1,330 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+
+import openai
+
+# 時間をおいて再試行する一時的なエラー
+TRANSIENT_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class ResourceKind(NamedTuple):
+    """
+    削除対象のリソースの一覧取得・削除・名前の取得方法です。
+
+    list_params は (ページサイズ, 用途) から list に渡す引数を返します。
+    ファイルの一覧はカーソルによるページングに対応しておらず limit を受け付けないため、
+    種類ごとに渡す引数を変えます。
+    """
+
+    list: Optional[Callable]
+    delete: Callable
+    name: Callable
+    list_params: Callable[[int, Optional[str]], Dict[str, Any]] = lambda page_size, purpose: {}
+    # 一覧の取得時にサーバー側で用途（purpose）を絞り込めるかどうか
+    filters_purpose: bool = False
+
+
+def _paged(page_size: int, purpose: Optional[str]) -> Dict[str, Any]:
+    return {"limit": page_size}
+
+
+def _by_purpose(page_size: int, purpose: Optional[str]) -> Dict[str, Any]:
+    return {} if purpose is None else {"purpose": purpose}
+
+
+def resource_kinds(client):
+    """
+    クリーンアップできるリソースの種類を返します。
+
+    Parameters:
+    client (OpenAI): OpenAIクライアント。
+
+    Returns:
+    dict: {種類: ResourceKind}
+    """
+    return {
+        "assistants": ResourceKind(
+            list=client.beta.assistants.list,
+            delete=lambda id: client.beta.assistants.delete(assistant_id=id),
+            name=lambda obj: obj.name,
+            list_params=_paged,
+        ),
+        "files": ResourceKind(
+            list=client.files.list,
+            delete=lambda id: client.files.delete(file_id=id),
+            name=lambda obj: obj.filename,
+            list_params=_by_purpose,
+            filters_purpose=True,
+        ),
+        "vector_stores": ResourceKind(
+            list=client.beta.vector_stores.list,
+            delete=lambda id: client.beta.vector_stores.delete(vector_store_id=id),
+            name=lambda obj: obj.name,
+            list_params=_paged,
+        ),
+        # スレッドは一覧を取得するAPIがないため、IDを指定して削除する
+        "threads": ResourceKind(
+            list=None,
+            delete=lambda id: client.beta.threads.delete(thread_id=id),
+            name=lambda obj: None,
+        ),
+    }
+
+
+class CleanupReport(NamedTuple):
+    """クリーンアップの結果です。"""
+
+    listed: int
+    matched: int
+    deleted: int
+    skipped: int
+    failed: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        """削除したオブジェクト数/秒。"""
+        return self.deleted / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"listed={self.listed} matched={self.matched} deleted={self.deleted} "
+            f"skipped={self.skipped} failed={self.failed} "
+            f"seconds={self.seconds:.1f} rate={self.rate:.1f}/s"
+        )
+
+
+class Checkpoint:
+    """
+    削除済みのIDを1行ずつ追記するファイルです。
+    中断したクリーンアップを再開したときに、削除済みのIDを再度削除しないようにします。
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            if os.path.exists(path):
+                with open(path, "r") as file:
+                    self.done = {line.strip() for line in file if line.strip()}
+            self._file = open(path, "a")
+
+    def __contains__(self, object_id):
+        return object_id in self.done
+
+    def add(self, object_id):
+        with self._lock:
+            self.done.add(object_id)
+            if self._file:
+                self._file.write(object_id + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+class Cleaner:
+    """
+    リソースの一覧をページ単位で取得しながら、削除リクエストを並行して実行するクラスです。
+
+    削除は上限付きのスレッドプールで実行し、同時に処理中のリクエスト数も制限します。
+    レート制限（429）やサーバーエラー（5xx）を受けた場合は Retry-After またはジッター付きの
+    指数バックオフですべてのワーカーの送信を一時停止し、再試行します。一覧のページの取得も同様です。
+    """
+
+    def __init__(
+        self,
+        client,
+        kind: str,
+        workers: int = 8,
+        dry_run: bool = False,
+        checkpoint_path: Optional[str] = None,
+        max_retries: int = 8,
+        progress_interval: float = 5.0,
+    ):
+        """
+        Parameters:
+        client (OpenAI): OpenAIクライアント。
+        kind (str): "assistants", "files", "vector_stores", "threads" のいずれか。
+        workers (int): 同時に実行する削除リクエストの最大数。
+        dry_run (bool): Trueの場合は削除対象を表示するだけで削除しません。
+        checkpoint_path (str): 削除済みのIDを記録するファイルのパス。
+        max_retries (int): レート制限などの一時的なエラーで再試行する最大回数。
+        progress_interval (float): 進捗を表示する間隔（秒）。
+        """
+        # 再試行はこのクラスで制御するため、クライアントの自動リトライは無効にする
+        self.client = client.with_options(max_retries=0)
+        self.kind = kind
+        self.resource = resource_kinds(self.client)[kind]
+        self.workers = workers
+        self.dry_run = dry_run
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+        self._counts = {"listed": 0, "matched": 0, "deleted": 0, "skipped": 0, "failed": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counts[key] += n
+
+    def iter_objects(self, page_size: int = 100, purpose: Optional[str] = None) -> Iterator:
+        """
+        リソースの一覧をページ単位で取得します。
+        各ページの最後のオブジェクトは次のページのカーソルになるため、
+        一覧の取得がすべて終わってから返します（削除によってカーソルが無効にならないようにする）。
+
+        Parameters:
+        page_size (int): 1ページのオブジェクト数（ページングに対応した種類のみ）。
+        purpose (str): ファイルの用途。サーバー側で絞り込みます（files のみ）。
+        """
+        if self.resource.list is None:
+            raise ValueError(f"{self.kind} cannot be listed; pass IDs explicitly")
+        params = self.resource.list_params(page_size, purpose)
+        deferred = []
+        page = self._call(lambda: self.resource.list(**params))
+        while True:
+            data = page.data
+            self._count("listed", len(data))
+            yield from data[:-1]
+            if data:
+                deferred.append(data[-1])
+            if not page.has_next_page():
+                break
+            page = self._call(page.get_next_page)
+        yield from deferred
+
+    def _wait_if_paused(self):
+        while True:
+            with self._lock:
+                delay = self._pause_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def _pause(self, seconds):
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+    def _call(self, request: Callable):
+        """
+        リクエストを実行し、一時的なエラーの場合は他のワーカーも含めて送信を止めてから再試行します。
+        max_retries 回再試行しても失敗した場合は、最後のエラーを送出します。
+        """
+        for attempt in range(self.max_retries + 1):
+            self._wait_if_paused()
+            try:
+                return request()
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = None
+                response = getattr(e, "response", None)
+                if response is not None:
+                    retry_after = response.headers.get("retry-after")
+                delay = float(retry_after) if retry_after else min(60, 2**attempt)
+                self._pause(delay * random.uniform(1.0, 1.5))
+
+    def _delete(self, object_id):
+        try:
+            self._call(lambda: self.resource.delete(object_id))
+        except openai.NotFoundError:
+            # すでに削除されている
+            pass
+        except Exception as e:
+            print(f"failed: {object_id}: {e}")
+            self._count("failed")
+            return
+        self.checkpoint.add(object_id)
+        self._count("deleted")
+
+    def run(
+        self,
+        ids: Optional[Iterable[str]] = None,
+        older_than_days: Optional[float] = None,
+        name_prefix: Optional[str] = None,
+        purpose: Optional[str] = None,
+    ) -> CleanupReport:
+        """
+        条件に一致するオブジェクトを削除します。
+
+        Parameters:
+        ids (Iterable[str]): 削除するIDのリスト。指定した場合は一覧を取得せずにこのIDを使用します。
+            オブジェクトの情報を取得しないため、ほかの条件と同時には指定できません。
+        older_than_days (float): 作成からこの日数を過ぎたオブジェクトのみを対象にします。
+        name_prefix (str): 名前（ファイルの場合はファイル名）がこの文字列で始まるものに限定します。
+        purpose (str): ファイルの用途（files のみ）。
+
+        Returns:
+        CleanupReport: クリーンアップの結果。
+
+        Raises:
+        ValueError: ids と older_than_days・name_prefix・purpose を同時に指定した場合や、
+            files 以外で purpose を指定した場合。
+        """
+        filters = (older_than_days, name_prefix, purpose)
+        if ids is not None and any(value is not None for value in filters):
+            raise ValueError("filters cannot be combined with explicit ids")
+        if purpose is not None and not self.resource.filters_purpose:
+            raise ValueError(f"{self.kind} cannot be filtered by purpose")
+        start = time.monotonic()
+        cutoff = time.time() - older_than_days * 86400 if older_than_days else None
+
+        def matches(obj):
+            if cutoff is not None and obj.created_at > cutoff:
+                return False
+            if name_prefix is not None:
+                name = self.resource.name(obj) or ""
+                if not name.startswith(name_prefix):
+                    return False
+            return True
+
+        if ids is not None:
+            source = ((object_id, None) for object_id in ids)
+        else:
+            source = (
+                (obj.id, obj) for obj in self.iter_objects(purpose=purpose) if matches(obj)
+            )
+
+        # 処理中の削除リクエスト数を制限し、一覧の取得が先行しすぎないようにする
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+        next_report = start + self.progress_interval
+
+        def release(_):
+            in_flight.release()
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="cleanup"
+            ) as executor:
+                for object_id, obj in source:
+                    self._count("matched")
+                    if object_id in self.checkpoint:
+                        self._count("skipped")
+                        continue
+                    if self.dry_run:
+                        name = self.resource.name(obj) if obj is not None else ""
+                        print(f"[dry-run] {self.kind} {object_id} {name or ''}")
+                        continue
+                    in_flight.acquire()
+                    executor.submit(self._delete, object_id).add_done_callback(release)
+                    if time.monotonic() >= next_report:
+                        print(self.report(start))
+                        next_report = time.monotonic() + self.progress_interval
+        finally:
+            self.checkpoint.close()
+        return self.report(start)
+
+    def report(self, start) -> CleanupReport:
+        with self._lock:
+            counts = dict(self._counts)
+        return CleanupReport(seconds=time.monotonic() - start, **counts)
@@ -0,0 +1,294 @@
+import os
+import threading
+import warnings
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class ClientSettings:
+    """
+    共有クライアントのHTTP接続の設定です。省略した値は環境変数から読み込みます。
+
+    環境変数:
+        OPENAI_MAX_CONNECTIONS     同時に開く接続数の上限（既定: 100）
+        OPENAI_MAX_KEEPALIVE       再利用のために保持するアイドル接続数の上限（既定: 20）
+        OPENAI_KEEPALIVE_EXPIRY    アイドル接続を保持する秒数（既定: 30）
+        OPENAI_HTTP2               1の場合はHTTP/2を使用する（h2 パッケージが必要、既定: 0）
+        OPENAI_TIMEOUT             リクエスト全体のタイムアウト秒数（既定: 600）
+        OPENAI_CONNECT_TIMEOUT     接続のタイムアウト秒数（既定: 5）
+        OPENAI_MAX_RETRIES         一時的なエラーを再試行する回数（既定: 2）
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.max_connections = (
+            max_connections
+            if max_connections is not None
+            else _env_int("OPENAI_MAX_CONNECTIONS", 100)
+        )
+        self.max_keepalive = (
+            max_keepalive
+            if max_keepalive is not None
+            else _env_int("OPENAI_MAX_KEEPALIVE", 20)
+        )
+        self.keepalive_expiry = (
+            keepalive_expiry
+            if keepalive_expiry is not None
+            else _env_float("OPENAI_KEEPALIVE_EXPIRY", 30.0)
+        )
+        self.http2 = http2 if http2 is not None else os.getenv("OPENAI_HTTP2") == "1"
+        self.timeout = timeout if timeout is not None else _env_float("OPENAI_TIMEOUT", 600.0)
+        self.connect_timeout = (
+            connect_timeout
+            if connect_timeout is not None
+            else _env_float("OPENAI_CONNECT_TIMEOUT", 5.0)
+        )
+        self.max_retries = (
+            max_retries if max_retries is not None else _env_int("OPENAI_MAX_RETRIES", 2)
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def http_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+    def use_http2(self) -> bool:
+        """HTTP/2が有効で、h2 パッケージがインストールされている場合にTrueを返します。"""
+        if not self.http2:
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            warnings.warn("OPENAI_HTTP2=1 requires the h2 package; falling back to HTTP/1.1")
+            return False
+        return True
+
+
+class PoolMetrics:
+    """
+    共有クライアントのリクエスト数と新規接続数を数えます。
+    httpcore の trace 拡張で、TCP接続とTLSハンドシェイクの完了を検知します。
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+    def _on_trace(self, name: str):
+        if name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+        elif name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def on_request(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = lambda name, info: self._on_trace(name)
+
+    async def on_request_async(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+
+        async def trace(name, info):
+            self._on_trace(name)
+
+        request.extensions["trace"] = trace
+
+    @property
+    def reuse_rate(self) -> float:
+        """既存の接続を再利用したリクエストの割合。"""
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1 - self.connections_opened / self.requests)
+
+    def snapshot(self, http_client=None, max_connections: Optional[int] = None) -> Dict[str, Any]:
+        """
+        現在の計測値を返します。http_client を指定した場合はコネクションプールの状態も含めます。
+
+        Parameters:
+        http_client (httpx.Client | httpx.AsyncClient): 状態を取得するHTTPクライアント。
+        max_connections (int): 利用率の計算に使う接続数の上限。
+
+        Returns:
+        dict: 計測値。
+        """
+        with self._lock:
+            result = {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "tls_handshakes": self.tls_handshakes,
+                "reuse_rate": self.reuse_rate,
+            }
+        pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+        if pool is not None:
+            connections = list(pool.connections)
+            active = sum(1 for connection in connections if not connection.is_idle())
+            result["pool_connections"] = len(connections)
+            result["pool_active"] = active
+            result["pool_idle"] = len(connections) - active
+            if max_connections:
+                result["pool_utilization"] = active / max_connections
+        return result
+
+
+class _Shared:
+    """プロセスごとに共有するクライアントです。fork した子プロセスでは作り直します。"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.settings: Optional[ClientSettings] = None
+        self.client: Optional[OpenAI] = None
+        self.async_client: Optional[AsyncOpenAI] = None
+        self.metrics = PoolMetrics()
+        self.async_metrics = PoolMetrics()
+
+
+_shared = _Shared()
+_lock = threading.Lock()
+
+
+def _current() -> _Shared:
+    global _shared
+    if _shared.pid != os.getpid():
+        # fork後の子プロセスでは親プロセスの接続を使わない
+        _shared = _Shared()
+    return _shared
+
+
+def _reset_after_fork():
+    global _shared, _lock
+    _lock = threading.Lock()
+    _shared = _Shared()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def configure(settings: Optional[ClientSettings] = None, **kwargs) -> ClientSettings:
+    """
+    共有クライアントの設定を変更します。作成済みのクライアントは次回の取得時に作り直します。
+
+    Parameters:
+    settings (ClientSettings): 設定。省略時は kwargs と環境変数から作成します。
+    **kwargs: ClientSettings の引数。
+
+    Returns:
+    ClientSettings: 適用した設定。
+    """
+    with _lock:
+        shared = _current()
+        shared.settings = settings or ClientSettings(**kwargs)
+        shared.client = None
+        shared.async_client = None
+        return shared.settings
+
+
+def get_client(**options) -> OpenAI:
+    """
+    プロセス内で共有する OpenAI クライアントを返します。初回呼び出し時に作成します。
+    httpx のコネクションプールはスレッドセーフなので、複数のスレッドから同時に使用できます。
+
+    Parameters:
+    **options: 指定した場合は with_options で上書きしたクライアントを返します
+        （コネクションプールは共有されます）。
+
+    Returns:
+    OpenAI: 共有のクライアント。
+    """
+    with _lock:
+        shared = _current()
+        if shared.client is None:
+            settings = shared.settings = shared.settings or ClientSettings()
+            http_client = DefaultHttpxClient(
+                limits=settings.limits(),
+                timeout=settings.http_timeout(),
+                http2=settings.use_http2(),
+                event_hooks={"request": [shared.metrics.on_request]},
+            )
+            shared.client = OpenAI(
+                http_client=http_client,
+                timeout=settings.http_timeout(),
+                max_retries=settings.max_retries,
+            )
+        client = shared.client
+    return client.with_options(**options) if options else client
+
+
+def get_async_client(**options) -> AsyncOpenAI:
+    """
+    プロセス内で共有する AsyncOpenAI クライアントを返します。初回呼び出し時に作成します。
+    非同期の接続はイベントループに結び付くため、1つのイベントループ（サーバーなど）から使用してください。
+
+    Parameters:
+    **options: 指定した場合は with_options で上書きしたクライアントを返します。
+
+    Returns:
+    AsyncOpenAI: 共有のクライアント。
+    """
+    with _lock:
+        shared = _current()
+        if shared.async_client is None:
+            settings = shared.settings = shared.settings or ClientSettings()
+            http_client = DefaultAsyncHttpxClient(
+                limits=settings.limits(),
+                timeout=settings.http_timeout(),
+                http2=settings.use_http2(),
+                event_hooks={"request": [shared.async_metrics.on_request_async]},
+            )
+            shared.async_client = AsyncOpenAI(
+                http_client=http_client,
+                timeout=settings.http_timeout(),
+                max_retries=settings.max_retries,
+            )
+        client = shared.async_client
+    return client.with_options(**options) if options else client
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    共有クライアントのリクエスト数・新規接続数・接続の再利用率・プールの利用率を返します。
+
+    Returns:
+    dict: {"sync": {...}, "async": {...}}
+    """
+    shared = _current()
+    max_connections = shared.settings.max_connections if shared.settings else None
+    return {
+        "sync": shared.metrics.snapshot(
+            shared.client._client if shared.client else None, max_connections
+        ),
+        "async": shared.async_metrics.snapshot(
+            shared.async_client._client if shared.async_client else None,
+            max_connections,
+        ),
+    }
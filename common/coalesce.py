@@ -0,0 +1,161 @@
+import asyncio
+import queue
+import time
+from typing import List, Optional
+
+
+class DeltaCoalescer:
+    """
+    ストリーミングで届くテキストの差分（delta）をまとめて、一定時間または一定サイズごとに
+    フラッシュするためのバッファです。
+    最初の差分だけは即座にフラッシュし、最初のトークンまでの遅延を増やさないようにします。
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: float = 50,
+        flush_bytes: int = 1024,
+        first_token_bypass: bool = True,
+    ):
+        """
+        Parameters:
+        flush_interval_ms (float): 最初の差分をバッファしてからフラッシュするまでの最大時間（ミリ秒）。
+            0以下の場合は差分をまとめずに毎回フラッシュします。
+        flush_bytes (int): バッファがこのバイト数（UTF-8）以上になったらフラッシュします。
+        first_token_bypass (bool): 最初の差分をバッファせずに即座にフラッシュするかどうか。
+        """
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_bytes = flush_bytes
+        self.first_token_bypass = first_token_bypass
+        self._buffer: List[str] = []
+        self._buffered_bytes = 0
+        self._deadline: Optional[float] = None
+        self._first = True
+
+    def push(self, text: str, now: Optional[float] = None) -> Optional[str]:
+        """
+        差分をバッファに追加し、フラッシュ条件を満たした場合はまとめた文字列を返します。
+
+        Parameters:
+        text (str): 追加する差分。
+        now (float): 現在時刻（time.monotonic()）。省略時は自動で取得します。
+
+        Returns:
+        Optional[str]: フラッシュした文字列。フラッシュしない場合はNone。
+        """
+        if now is None:
+            now = time.monotonic()
+        if self._first and text:
+            # 空文字は最初のトークンとして扱わない
+            self._first = False
+            if self.first_token_bypass:
+                return self._prepend_buffer(text)
+        if self.flush_interval <= 0:
+            return self._prepend_buffer(text)
+
+        self._buffer.append(text)
+        self._buffered_bytes += len(text.encode("utf-8"))
+        if self._deadline is None:
+            self._deadline = now + self.flush_interval
+        if self._buffered_bytes >= self.flush_bytes or now >= self._deadline:
+            return self.flush()
+        return None
+
+    def _prepend_buffer(self, text: str) -> str:
+        """バッファに残っている差分を先頭に付けて、即座にフラッシュする文字列を返します。"""
+        buffered = self.flush()
+        return buffered + text if buffered else text
+
+    def timeout(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        次に時間経過でフラッシュすべき時刻までの秒数を返します。
+
+        Returns:
+        Optional[float]: 残り秒数。バッファが空の場合はNone。
+        """
+        if self._deadline is None:
+            return None
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self._deadline - now)
+
+    def flush(self) -> Optional[str]:
+        """
+        バッファの内容をまとめて返し、バッファを空にします。
+
+        Returns:
+        Optional[str]: まとめた文字列。バッファが空の場合はNone。
+        """
+        if not self._buffer:
+            return None
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_bytes = 0
+        self._deadline = None
+        return text
+
+
+def iter_coalesced(q: queue.Queue, coalescer: DeltaCoalescer, stop):
+    """
+    queue.Queueから差分を取り出し、まとめた文字列を順に返すジェネレータです。
+
+    Parameters:
+    q (queue.Queue): 差分が格納されるキュー。
+    coalescer (DeltaCoalescer): 差分をまとめるバッファ。
+    stop: ストリームの終了を表すマーカー。
+
+    Yields:
+    str: まとめた文字列。
+    """
+    while True:
+        try:
+            data = q.get(timeout=coalescer.timeout())
+        except queue.Empty:
+            # 待機中に期限が来たらバッファをフラッシュする
+            text = coalescer.flush()
+            if text is not None:
+                yield text
+            continue
+        if data == stop:
+            break
+        text = coalescer.push(data)
+        if text is not None:
+            yield text
+    text = coalescer.flush()
+    if text is not None:
+        yield text
+
+
+async def aiter_coalesced(q: asyncio.Queue, coalescer: DeltaCoalescer, stop):
+    """
+    asyncio.Queueから差分を取り出し、まとめた文字列を順に返す非同期ジェネレータです。
+
+    Parameters:
+    q (asyncio.Queue): 差分が格納されるキュー。
+    coalescer (DeltaCoalescer): 差分をまとめるバッファ。
+    stop: ストリームの終了を表すマーカー。
+
+    Yields:
+    str: まとめた文字列。
+    """
+    while True:
+        timeout = coalescer.timeout()
+        if timeout is None:
+            data = await q.get()
+        else:
+            try:
+                data = await asyncio.wait_for(q.get(), timeout)
+            except asyncio.TimeoutError:
+                # 待機中に期限が来たらバッファをフラッシュする
+                text = coalescer.flush()
+                if text is not None:
+                    yield text
+                continue
+        if data == stop:
+            break
+        text = coalescer.push(data)
+        if text is not None:
+            yield text
+    text = coalescer.flush()
+    if text is not None:
+        yield text
@@ -0,0 +1,181 @@
+import contextlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from common.utils import file_lock, write_text_atomic
+
+# まだファイルを読み込んでいないことを表す値
+_UNREAD = object()
+
+
+def _parse_line(line: str) -> Optional[Tuple[str, str]]:
+    """
+    .envファイルの1行を (キー, 値) に変換します。空行・コメント・代入でない行はNoneを返します。
+    """
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#") or "=" not in stripped:
+        return None
+    key, value = stripped.split("=", 1)
+    key = key.strip()
+    if key.startswith("export "):
+        key = key[len("export ") :].strip()
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        value = value[1:-1]
+    return key, value
+
+
+class ConfigStore:
+    """
+    .envファイルに保存するリソースのID（ASSISTANT_ID・THREAD_ID・FILE_IDなど）を管理するストアです。
+
+    update は複数のキーをまとめて1回の書き込みで更新します。書き込みは fcntl のロックを取得したうえで
+    一時ファイルからの置き換え（write_text_atomic）で行うため、複数のプロセスが同時に更新しても
+    互いの変更を失わず、書き込みの途中の内容が読まれることもありません。
+    読み込んだ内容はメモリにキャッシュし、ファイルのinode・更新時刻・サイズが変わった場合だけ読み直します。
+    コメントや他のキーの行はそのまま残します。
+    """
+
+    def __init__(self, path: str = ".env"):
+        """
+        Parameters:
+        path (str): .envファイルのパス。存在しない場合は最初の update で作成します。
+        """
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._lock = threading.Lock()
+        self._stamp = _UNREAD
+        self._lines: List[str] = []
+        self._values: Dict[str, str] = {}
+        # ファイルを読み込んだ回数と書き込んだ回数
+        self.reads = 0
+        self.writes = 0
+
+    def _refresh(self):
+        """ファイルが変更されていれば読み直します。self._lock を保持して呼び出します。"""
+        try:
+            file = open(self.path, "r")
+        except FileNotFoundError:
+            self._stamp, self._lines, self._values = None, [], {}
+            return
+        with file:
+            stat = os.fstat(file.fileno())
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stamp == self._stamp:
+                return
+            lines = file.readlines()
+        self.reads += 1
+        values = {}
+        for line in lines:
+            parsed = _parse_line(line)
+            if parsed is not None:
+                values[parsed[0]] = parsed[1]
+        self._stamp, self._lines, self._values = stamp, lines, values
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        キーの値を返します。ファイルが変更されていない場合は読み込みません。
+
+        Parameters:
+        key (str): 環境変数のキー。
+        default (str): キーが存在しない場合の戻り値。
+
+        Returns:
+        Optional[str]: キーの値。
+        """
+        with self._lock:
+            self._refresh()
+            return self._values.get(key, default)
+
+    def values(self) -> Dict[str, str]:
+        """すべてのキーと値の辞書を返します。"""
+        with self._lock:
+            self._refresh()
+            return dict(self._values)
+
+    def update(self, values: Optional[Dict[str, str]] = None, **kwargs: str) -> bool:
+        """
+        複数のキーの値をまとめて更新し、1回の書き込みで保存します。
+        存在しないキーは末尾に追加します。すべての値が現在と同じ場合は書き込みません。
+
+        Parameters:
+        values (dict): 更新するキーと値の辞書。
+        **kwargs: 更新するキーと値（values と併用できます）。
+
+        Returns:
+        bool: ファイルに書き込んだ場合はTrue。
+        """
+        updates = {key: str(value) for key, value in {**(values or {}), **kwargs}.items()}
+        if not updates:
+            return False
+        with self._lock, file_lock(self.lock_path):
+            # ロック取得までの間に他のプロセスが更新した内容を読み直してから変更する
+            self._refresh()
+            if all(self._values.get(key) == value for key, value in updates.items()):
+                return False
+            lines = []
+            written = set()
+            for line in self._lines:
+                parsed = _parse_line(line)
+                if parsed is not None and parsed[0] in updates:
+                    key = parsed[0]
+                    lines.append(f"{key}={updates[key]}\n")
+                    written.add(key)
+                else:
+                    lines.append(line)
+            if lines and not lines[-1].endswith("\n"):
+                lines[-1] += "\n"
+            for key, value in updates.items():
+                if key not in written:
+                    lines.append(f"{key}={value}\n")
+            write_text_atomic(self.path, "".join(lines))
+            self.writes += 1
+            # ロックを保持しているため、書き込んだ内容をそのままキャッシュにする
+            stat = os.stat(self.path)
+            self._stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._lines = lines
+            self._values.update(updates)
+        return True
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        with の中で辞書に設定した値を、終了時に update でまとめて書き込みます。
+        リソースを作成した後に例外が発生した場合も、それまでに設定した値は書き込みます。
+
+        使用例:
+            with config.batch() as env:
+                env["FILE_ID"] = file.id
+                env["THREAD_ID"] = thread.id
+        """
+        pending: Dict[str, str] = {}
+        try:
+            yield pending
+        finally:
+            if pending:
+                self.update(pending)
+
+
+# ファイルごとに共有するConfigStore
+_shared_stores: Dict[str, ConfigStore] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_config(path: str = ".env") -> ConfigStore:
+    """
+    ファイルごとに共有するConfigStoreを返します。初回呼び出し時に作成します。
+
+    Parameters:
+    path (str): .envファイルのパス。
+
+    Returns:
+    ConfigStore: 共有のConfigStore。
+    """
+    key = os.path.abspath(path)
+    with _shared_lock:
+        store = _shared_stores.get(key)
+        if store is None:
+            store = ConfigStore(path)
+            _shared_stores[key] = store
+        return store
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from openai import OpenAI
+
+from common.client import get_client
+
+
+class DownloadResult(NamedTuple):
+    """1ファイル分のダウンロード結果です。"""
+
+    file_id: str
+    file_path: str
+    bytes: int
+    seconds: float
+    skipped: bool
+
+
+class DownloadSummary(NamedTuple):
+    """複数ファイルのダウンロード結果の集計です。"""
+
+    results: List[DownloadResult]
+    bytes: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """ダウンロードしたバイト数/秒。"""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        downloaded = sum(1 for r in self.results if not r.skipped)
+        skipped = len(self.results) - downloaded
+        return (
+            f"downloaded={downloaded} skipped={skipped} bytes={self.bytes} "
+            f"seconds={self.seconds:.2f} throughput={self.throughput / 1024:.1f}KiB/s"
+        )
+
+
+class DownloadManager:
+    """
+    OpenAIにアップロードされたファイルをローカルに保存するクラスです。
+
+    1つのクライアント（コネクションプール）を使い回し、ファイルの内容を一定サイズずつ
+    一時ファイルに書き込んでから、アトミックにリネームします。
+    保存先に同じサイズのファイルが既にある場合はダウンロードを省略します。
+    """
+
+    def __init__(
+        self,
+        client: Optional[OpenAI] = None,
+        max_workers: int = 4,
+        chunk_size: int = 1024 * 1024,
+    ):
+        """
+        Parameters:
+        client (OpenAI): OpenAIクライアント。省略時はプロセス内で共有するクライアントを使用します。
+        max_workers (int): 同時にダウンロードするファイル数の上限。
+        chunk_size (int): ファイルに書き込む単位（バイト）。
+        """
+        self.client = client or get_client()
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+
+    def download(self, file_id: str, file_path: str) -> DownloadResult:
+        """
+        ファイルを1つダウンロードします。
+
+        Parameters:
+        file_id (str): ファイルのID。
+        file_path (str): 保存先のパス。
+
+        Returns:
+        DownloadResult: ダウンロード結果。
+        """
+        start = time.perf_counter()
+        if os.path.exists(file_path):
+            # ファイルのメタデータだけを取得し、サイズが一致すればダウンロードしない
+            expected = self.client.files.retrieve(file_id=file_id).bytes
+            if os.path.getsize(file_path) == expected:
+                return DownloadResult(
+                    file_id, file_path, 0, time.perf_counter() - start, True
+                )
+
+        directory = os.path.dirname(file_path) or "."
+        # ディレクトリが存在しない場合は作成
+        os.makedirs(directory, exist_ok=True)
+        # 書き込み途中のファイルが保存先のパスに見えないよう、一時ファイルに書き込む
+        tmp_path = os.path.join(
+            directory, f".{os.path.basename(file_path)}.{uuid.uuid4().hex}.part"
+        )
+        size = 0
+        try:
+            with open(tmp_path, "xb") as file:
+                with self.client.files.with_streaming_response.content(
+                    file_id=file_id
+                ) as response:
+                    for chunk in response.iter_bytes(self.chunk_size):
+                        file.write(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return DownloadResult(file_id, file_path, size, time.perf_counter() - start, False)
+
+    def download_many(self, items: Iterable[Tuple[str, str]]) -> DownloadSummary:
+        """
+        複数のファイルを並行してダウンロードします。
+
+        Parameters:
+        items (Iterable[tuple]): (ファイルのID, 保存先のパス) の組。
+
+        Returns:
+        DownloadSummary: ダウンロード結果の集計。
+        """
+        items = list(items)
+        start = time.perf_counter()
+        if not items:
+            return DownloadSummary([], 0, 0.0)
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(items)),
+            thread_name_prefix="download",
+        ) as executor:
+            results = list(
+                executor.map(lambda item: self.download(*item), items)
+            )
+        return DownloadSummary(
+            results, sum(r.bytes for r in results), time.perf_counter() - start
+        )
+
+
+# file_download で使い回すダウンロードマネージャー
+_default_manager: Optional[DownloadManager] = None
+_default_manager_lock = threading.Lock()
+
+
+def default_manager() -> DownloadManager:
+    """file_download で共有するダウンロードマネージャーを返します。初回呼び出し時に作成します。"""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = DownloadManager()
+        return _default_manager
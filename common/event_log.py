@@ -0,0 +1,256 @@
+import asyncio
+import os
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# 1回のrunで保持するイベント（フレーム）の数の上限
+EVENT_LOG_SIZE = int(os.getenv("EVENT_LOG_SIZE", "2048"))
+# 終了したrunのイベントを再接続のために保持する秒数
+EVENT_LOG_TTL = float(os.getenv("EVENT_LOG_TTL", "300"))
+# 受信者がいなくなってから、再接続を待ってrunを中止するまでの秒数
+RESUME_GRACE_SECONDS = float(os.getenv("RESUME_GRACE_SECONDS", "30"))
+
+
+class EventGap(Exception):
+    """
+    受信者が必要とするイベントがリングバッファからすでに削除されており、続きを再生できないことを表す例外です。
+    """
+
+    def __init__(self, after_id: int, first_available: int):
+        super().__init__(
+            f"events after {after_id} are no longer retained (oldest is {first_available})"
+        )
+        self.after_id = after_id
+        self.first_available = first_available
+
+
+class EventLog:
+    """
+    1回のrunのイベントを連番のIDとともに保持するリングバッファです。
+    受信者は follow() で、指定したIDの次から再生し、その後は新しいイベントを受け取ります。
+    次のイベントがすでに削除されている場合は、欠けたまま続けずに EventGap を送出します。
+    イベントループ上でのみ操作してください（別スレッドからは call_soon_threadsafe を使用します）。
+    """
+
+    def __init__(
+        self,
+        first_id: int = 1,
+        maxlen: Optional[int] = None,
+        grace: Optional[float] = None,
+        on_abandon: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Parameters:
+        first_id (int): 最初のイベントのID。
+        maxlen (int): 保持するイベントの上限。省略時は環境変数 EVENT_LOG_SIZE（既定: 2048）。
+        grace (float): 受信者がいなくなってから on_abandon を呼び出すまでの秒数。
+            省略時は環境変数 RESUME_GRACE_SECONDS（既定: 30）。
+        on_abandon (Callable): 猶予時間内に再接続がなかったときに呼び出す関数（runの中止など）。
+        """
+        self.first_id = first_id
+        self.next_id = first_id
+        self.frames: deque = deque(maxlen=maxlen or EVENT_LOG_SIZE)
+        self.grace = RESUME_GRACE_SECONDS if grace is None else grace
+        self.on_abandon = on_abandon
+        self.finished = False
+        self.subscribers = 0
+        self._wakeup = asyncio.Event()
+        self._abandon_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def last_id(self) -> int:
+        """最後に追加したイベントのID（まだない場合は first_id - 1）。"""
+        return self.next_id - 1
+
+    def append(self, data) -> int:
+        """
+        イベントを追加し、待機中の受信者を起こします。
+
+        Returns:
+        int: 追加したイベントのID。
+        """
+        event_id = self.next_id
+        self.next_id += 1
+        self.frames.append((event_id, data))
+        self._notify()
+        return event_id
+
+    def close(self):
+        """runの終了を記録します。受信者は残りのイベントを受け取ってから終了します。"""
+        if self.finished:
+            return
+        self.finished = True
+        self._cancel_abandon()
+        self._notify()
+
+    def _notify(self):
+        # 待機中のすべての受信者を起こし、次の待機には新しいEventを使う
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def knows(self, event_id: int) -> bool:
+        """
+        event_id がこのrunのイベント（またはその直前）で、その次のイベントから欠けずに再生できる場合に
+        Trueを返します。次のイベントがリングバッファから削除されている場合はFalseを返します。
+        """
+        if not self.first_id - 1 <= event_id < self.next_id:
+            return False
+        return not self.frames or event_id + 1 >= self.frames[0][0]
+
+    def since(self, event_id: int) -> List[Tuple[int, object]]:
+        """event_id より後のイベントのうち、保持しているものを返します。"""
+        if not self.frames:
+            return []
+        start = max(0, event_id + 1 - self.frames[0][0])
+        # 受信者に渡している間に追加されても壊れないようにコピーする
+        return list(islice(self.frames, start, None))
+
+    async def follow(self, after_id: Optional[int] = None) -> AsyncIterator[Tuple[int, object]]:
+        """
+        after_id の次のイベントから順に返し、runが終了したら終了する非同期ジェネレーターです。
+
+        Parameters:
+        after_id (int): 最後に受け取ったイベントのID。省略時はrunの最初から。
+
+        Yields:
+        tuple: (イベントのID, データ)
+
+        Raises:
+        EventGap: 次のイベントがすでに削除されている場合（再接続が遅れた場合や、受信が追いつかない場合）。
+        """
+        cursor = self.first_id - 1 if after_id is None else after_id
+        self._subscribe()
+        try:
+            while True:
+                frames = self.since(cursor)
+                if frames and frames[0][0] > cursor + 1:
+                    raise EventGap(cursor, frames[0][0])
+                for event_id, data in frames:
+                    cursor = event_id
+                    yield event_id, data
+                if cursor >= self.last_id:
+                    if self.finished:
+                        return
+                    await self._wakeup.wait()
+        finally:
+            self._unsubscribe()
+
+    def _subscribe(self):
+        self.subscribers += 1
+        self._cancel_abandon()
+
+    def _unsubscribe(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.finished and self.on_abandon is not None:
+            if self.grace > 0:
+                loop = asyncio.get_running_loop()
+                self._abandon_handle = loop.call_later(self.grace, self._abandon)
+            else:
+                self._abandon()
+
+    def _cancel_abandon(self):
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+
+    def _abandon(self):
+        self._abandon_handle = None
+        if self.subscribers == 0 and not self.finished:
+            self.on_abandon()  # type: ignore
+            self.close()
+
+
+class EventLogRegistry:
+    """
+    threadごとに最新のrunの EventLog を保持します。
+    IDはthread内で単調増加するように、前のrunの続きから割り当てます。
+    終了したrunは EVENT_LOG_TTL 秒後に削除します。
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = EVENT_LOG_TTL if ttl is None else ttl
+        self.logs: Dict[str, EventLog] = {}
+
+    def get(self, key: str) -> Optional[EventLog]:
+        return self.logs.get(key)
+
+    def start(self, key: str, **kwargs) -> EventLog:
+        """
+        新しいrunの EventLog を作成して登録します。
+
+        Parameters:
+        key (str): threadのid。
+        **kwargs: EventLog の引数。
+
+        Returns:
+        EventLog: 作成したログ。
+        """
+        previous = self.logs.get(key)
+        first_id = previous.next_id if previous is not None else 1
+        log = EventLog(first_id=first_id, **kwargs)
+        self.logs[key] = log
+        return log
+
+    def finish(self, key: str, log: EventLog):
+        """runの終了を記録し、保持期間が過ぎたらログを削除します。"""
+        log.close()
+        asyncio.get_running_loop().call_later(self.ttl, self._expire, key, log)
+
+    def _expire(self, key: str, log: EventLog):
+        if self.logs.get(key) is log:
+            del self.logs[key]
+
+
+class RunHub(EventLogRegistry):
+    """
+    threadごとに1つのrunを複数の受信者で共有するためのハブです。
+
+    最初の受信者がrunを開始し、同じthreadの後続の受信者は実行中のrunに最初から追いついて参加します。
+    runは全員が離れてから猶予時間が過ぎるまで続きます（EventLog の on_abandon）。
+    runが終了した後の接続は、次のターンとして新しいrunを開始します。
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.runs_started = 0
+        self.attached = 0
+
+    def open(self, key: str, start_run: Callable[[], EventLog]) -> EventLog:
+        """
+        threadで実行中のrunの EventLog を返します。実行中のrunがない場合は start_run でrunを開始します。
+        イベントループ上で呼び出すため、同時に接続した受信者が別々のrunを開始することはありません。
+
+        Parameters:
+        key (str): threadのid。
+        start_run (Callable): runを開始し、その EventLog を返す関数。
+
+        Returns:
+        EventLog: 共有するrunのログ。
+        """
+        log = self.logs.get(key)
+        if log is not None and not log.finished:
+            self.attached += 1
+            return log
+        self.runs_started += 1
+        return start_run()
+
+    def render(self) -> str:
+        """ハブの状態を Prometheus のテキスト形式で返します。"""
+        active = [log for log in self.logs.values() if not log.finished]
+        return "\n".join(
+            [
+                "# HELP stream_hub_runs_started_total Runs started by the first subscriber.",
+                "# TYPE stream_hub_runs_started_total counter",
+                f"stream_hub_runs_started_total {self.runs_started}",
+                "# HELP stream_hub_attached_total Subscribers that joined an existing run.",
+                "# TYPE stream_hub_attached_total counter",
+                f"stream_hub_attached_total {self.attached}",
+                "# HELP stream_hub_active_runs Runs currently streaming.",
+                "# TYPE stream_hub_active_runs gauge",
+                f"stream_hub_active_runs {len(active)}",
+                "# HELP stream_hub_subscribers Subscribers currently connected.",
+                "# TYPE stream_hub_subscribers gauge",
+                f"stream_hub_subscribers {sum(log.subscribers for log in self.logs.values())}",
+            ]
+        ) + "\n"
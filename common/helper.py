@@ -1,27 +1,54 @@
-import os
-from openai import OpenAI
-from openai.types.beta.threads import (
-    ImageFile,
-    Text,
-    TextContentBlock,
-    ImageFileContentBlock,
-)
-import backoff
-import requests
+from openai.types.beta.threads import ImageFile, Text
 from typing_extensions import override
-from openai import AssistantEventHandler
 from typing import List
 
+from common.downloads import DownloadManager, default_manager
+from common.message_transform import DICTS, assistant_records, latest_assistant_records
+from common.run_metrics import TimedEventHandler
+from common.run_waiter import shared_waiter
+from common.sinks import StreamEvent, TerminalSink
 
-class StreamingEventHandler(AssistantEventHandler):
-    def __init__(self, assistant_pronpt="assistant >"):
-        super().__init__()  # 基底クラスのコンストラクタを呼び出す
+
+class StreamingEventHandler(TimedEventHandler):
+    """
+    ストリーミングのイベントを文字列に変換し、シンクに渡すイベントハンドラーです。
+    シンクを省略した場合は TerminalSink に出力します（出力内容は1トークンずつ print した場合と同じです）。
+    runの各段階の時間は self.timer（RunTimer）で計測し、ストリームの終了時に記録します。
+    """
+
+    def __init__(self, assistant_pronpt="assistant >", sinks=None, timer=None):
+        """
+        Parameters:
+        assistant_pronpt (str): テキストの出力前に表示するプロンプト。
+        sinks (list): イベントを受け取るシンクのリスト。省略時は [TerminalSink()]。
+        timer (RunTimer): 共有するタイマー。省略時は新しく作成します。
+        """
+        super().__init__(timer)  # 基底クラスのコンストラクタを呼び出す
         self.file_ids: List[str] = []  # ファイルIDを保持するためのリスト
         self.assistant_prompt = assistant_pronpt
         self.files_on_image_file_done: List[str] = (
             []
         )  # on_image_file_doneで取得できたファイルIDのリスト
         self.files_of_sitation: List[str] = []
+        self.sinks = sinks if sinks is not None else [TerminalSink()]
+
+    def emit(self, kind, text, data=None):
+        """
+        イベントをすべてのシンクに渡します。
+
+        Parameters:
+        kind (str): イベントの種類。
+        text (str): コンソールに出力する文字列。
+        data: SDKから受け取った元のオブジェクト。
+        """
+        event = StreamEvent(kind, text, data)
+        for sink in self.sinks:
+            sink.write(event)
+
+    def close(self):
+        """すべてのシンクをフラッシュして閉じます。"""
+        for sink in self.sinks:
+            sink.close()
 
     @override
     def on_text_created(self, text) -> None:
@@ -31,7 +58,7 @@ class StreamingEventHandler(AssistantEventHandler):
         Parameters:
         text (str): 作成されたテキスト。
         """
-        print(f"{self.assistant_prompt}", end="", flush=True)
+        self.emit("text_created", f"{self.assistant_prompt}", text)
 
     @override
     def on_text_delta(self, delta, snapshot):
@@ -42,7 +69,7 @@ class StreamingEventHandler(AssistantEventHandler):
         delta (Delta): テキストの変更内容を含むデルタオブジェクト。
         snapshot: 変更後のテキストのスナップショット。
         """
-        print(delta.value, end="", flush=True)
+        self.emit("text_delta", f"{delta.value}", delta)
 
     @override
     def on_text_done(self, text: Text) -> None:
@@ -51,7 +78,7 @@ class StreamingEventHandler(AssistantEventHandler):
         Parameters:
         text (str): 作成されたテキスト。
         """
-        print("", end="\n")
+        self.emit("text_done", "\n", text)
 
     @override
     def on_image_file_done(self, image_file: ImageFile):
@@ -63,8 +90,7 @@ class StreamingEventHandler(AssistantEventHandler):
     @override
     def on_message_done(self, message) -> None:
         # print a citation to the file searched
-        print("on_message_done.....")
-        print(message)
+        self.emit("message_done", f"on_message_done.....\n{message}\n", message)
 
         for m_content in message.content:
             if m_content.type == "text":
@@ -85,7 +111,11 @@ class StreamingEventHandler(AssistantEventHandler):
         Parameters:
         tool_call (ToolCall): 作成されたツールの呼び出しオブジェクト。
         """
-        print(f"{self.assistant_prompt} {tool_call.type}\n", flush=True)
+        self.emit(
+            "tool_call_created",
+            f"{self.assistant_prompt} {tool_call.type}\n\n",
+            tool_call,
+        )
 
     def on_tool_call_delta(self, delta, snapshot):
         """
@@ -97,86 +127,67 @@ class StreamingEventHandler(AssistantEventHandler):
         """
         if delta.type == "code_interpreter":
             if delta.code_interpreter.input:  # type: ignore
-                print(delta.code_interpreter.input, end="", flush=True)  # type: ignore
+                self.emit("tool_call_delta", delta.code_interpreter.input, delta)  # type: ignore
             if delta.code_interpreter.outputs:  # type: ignore
-                print(delta)
-                print(f"\n\noutput >", flush=True)
+                parts = [f"{delta}\n", "\n\noutput >\n"]
                 for output in delta.code_interpreter.outputs:  # type: ignore
-                    print("--output information--")
-                    print(f"\n{output}")  # type: ignore
+                    parts.append("--output information--\n")
+                    parts.append(f"\n{output}\n")  # type: ignore
                     if output.type == "logs":
-                        print(f"\n{output.logs}", flush=True)
+                        parts.append(f"\n{output.logs}\n")
                     elif output.type == "image":
                         self.file_ids.append(output.image.file_id)  # type: ignore
+                self.emit("tool_output", "".join(parts), delta)
 
-
-def file_download(file_id, file_path):
-    client = OpenAI()
-    data = client.files.content(file_id=file_id)
-    data_bytes = data.read()
-
-    directory = os.path.dirname(file_path)
-    # ディレクトリが存在しない場合は作成
-    if directory and not os.path.exists(directory):
-        os.makedirs(directory)
-    # ファイルをオープン
-    with open(file_path, "wb") as file:
-        file.write(data_bytes)
+    @override
+    def on_end(self) -> None:
+        """ストリームが終了したときに、シンクに残っている出力をフラッシュし、計測値を記録します。"""
+        self.emit("end", "")
+        super().on_end()
 
 
-def _retrieve_runs(client, thread_id, run_id):
+def file_download(file_id, file_path, client=None):
     """
-    指定されたrunの状態を取得し、完了しているかどうかをチェックします。
-    完了していない場合は例外を発生させ、リトライのトリガーとします。
+    ファイルをダウンロードして保存します。
+    クライアントを省略した場合は、共有のダウンロードマネージャーのクライアントを使い回します。
 
     Parameters:
+    file_id (str): ファイルのID。
+    file_path (str): 保存先のパス。
     client (OpenAI): OpenAIクライアント。
-    thread_id (str): スレッドのID。
-    run_id (str): runのID。
 
     Returns:
-    Run: 取得したrunのオブジェクト。
+    DownloadResult: ダウンロード結果。
     """
-    # runの状態を取得
-    run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-
-    print("running.....")
-
-    # runの状態に応じた処理
-    if run.status in ["completed", "requires_action"]:
-        return run
-    elif run.status == "failed":
-        print("Runが失敗しました。")
-        return run
-    elif run.status == "expired":
-        print("Runが期限切れになりました。")
-        return run
-
-    # runが完了していない場合は例外を発生
-    raise requests.exceptions.RequestException("Runはまだ完了していません。")
+    manager = DownloadManager(client) if client else default_manager()
+    return manager.download(file_id=file_id, file_path=file_path)
 
 
 def retrieve_runs(client, thread_id, run_id, max_time=30):
     """
-    指定されたrunの状態を取得し、必要に応じてリトライを行います。
+    指定されたrunが完了・失敗・requires_action などのステータスになるまで待機します。
+    ポーリングはクライアントごとに共有する RunWaiter がまとめて行います。
 
     Parameters:
     client (OpenAI): OpenAIクライアント。
     thread_id (str): スレッドのID。
     run_id (str): runのID。
-    max_time (int): リトライの最大時間（秒）。デフォルトは30秒。
+    max_time (int): 待機の最大時間（秒）。デフォルトは30秒。
 
     Returns:
     Run: 取得したrunのオブジェクト。
+
+    Raises:
+    TimeoutError: max_time 以内にrunが終了しなかった場合。
     """
-    # backoffデコレータを動的に適用してリトライ処理を行う
-    backoff_decorator = backoff.on_exception(
-        backoff.expo, requests.exceptions.RequestException, max_time=max_time
-    )
-    # デコレータを適用した関数をラップ
-    wrapped_function = backoff_decorator(_retrieve_runs)
-    # ラップされた関数を実行
-    return wrapped_function(client, thread_id, run_id)
+    run = shared_waiter(client).wait(thread_id, run_id, timeout=max_time)
+
+    # runの状態に応じた処理
+    if run.status == "failed":
+        print("Runが失敗しました。")
+    elif run.status == "expired":
+        print("Runが期限切れになりました。")
+    return run
 
 
 def latest_messages_from_assistant(messages):
@@ -207,6 +218,7 @@ def latest_messages_from_assistant(messages):
 def transform_latest_assistant_messages(messages):
     """
     アシスタントからのメッセージを変換し、テキストと画像の情報を含む辞書に整理します。
+    メッセージは1回の走査で変換します。辞書が不要な場合は latest_assistant_records を使用してください。
 
     Parameters:
     messages (Messages): スレッド内のメッセージリスト。
@@ -214,54 +226,17 @@ def transform_latest_assistant_messages(messages):
     Returns:
     list: 変換されたメッセージのリスト。
     """
-    latest_assistant_data = latest_messages_from_assistant(messages=messages)
-    transformed_data = []
-    for item in latest_assistant_data:
-        text_content = None
-        image_file_ids = []
-        id = item.id
-
-        # contentを走査し、インスタンスによって異なる辞書を定義する
-        for content in item.content:
-            # print(content.__class__.__name__)
-            if isinstance(content, TextContentBlock):
-                # MessageContentText の場合
-                text_info = content.text.value
-                file_paths = []
-                if hasattr(content.text, "annotations"):
-                    file_paths = [
-                        {
-                            "file_id": annotation.file_path.file_id,  # type: ignore
-                            "ext": os.path.splitext(annotation.text)[1][
-                                1:
-                            ],  # 拡張子を抽出
-                        }
-                        for annotation in content.text.annotations
-                        if annotation.__class__.__name__ == "TextAnnotationFilePath"
-                    ]
-                text_content = {
-                    "type": "text",
-                    "value": text_info,
-                    "file_ids": file_paths,
-                }
-            elif isinstance(content, ImageFileContentBlock):
-                # MessageContentImageFile の場合
-                image_file_ids.append(content.image_file.file_id)
-
-        ## textとimageを同じ辞書に設定する
-        if text_content:
-            text_content["image_file_ids"] = image_file_ids
-            transformed_data.append({"id": id, "content": text_content})
-        else:
-            # TextContentがない場合（通常はないが、念のため）
-            for image_file_id in image_file_ids:
-                transformed_data.append(
-                    {
-                        "id": id,
-                        "content": {
-                            "type": "image",
-                            "image_file_ids": [image_file_id],
-                        },
-                    }
-                )
-    return transformed_data[::-1]
+    return latest_assistant_records(messages, DICTS)
+
+
+def transform_assistant_messages(latest_assistant_data):
+    """
+    新しい順に並んだアシスタントのメッセージを変換し、テキストと画像の情報を含む辞書に整理します。
+
+    Parameters:
+    latest_assistant_data (list): 新しい順に並んだアシスタントのメッセージ。
+
+    Returns:
+    list: 変換されたメッセージのリスト（古い順）。
+    """
+    return assistant_records(latest_assistant_data, DICTS)
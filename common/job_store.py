@@ -0,0 +1,183 @@
+import glob
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from common.utils import file_lock, read_json, write_json_atomic
+
+# ジョブの状態のデフォルトの保存先
+DEFAULT_JOB_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".cache",
+    "jobs",
+)
+
+# 終了したジョブのステータス（これ以外のジョブは resume で再開されます）
+FINISHED_JOB_STATUSES = frozenset(["completed", "incomplete", "failed"])
+
+
+class Job:
+    """
+    長時間かかる処理（ジョブ）の状態です。
+
+    tasks にはシャードや1つのrunなどの作業単位ごとの状態を、data にはジョブ全体の状態を
+    JSONに変換できる値で保持します。変更した内容は JobStore.checkpoint で保存します。
+    """
+
+    def __init__(
+        self,
+        id: str,
+        key: str,
+        kind: str,
+        params: Optional[Dict[str, Any]] = None,
+        status: str = "running",
+        data: Optional[Dict[str, Any]] = None,
+        tasks: Optional[Dict[str, Dict[str, Any]]] = None,
+        created_at: Optional[float] = None,
+        updated_at: Optional[float] = None,
+    ):
+        self.id = id
+        self.key = key
+        self.kind = kind
+        self.params = params or {}
+        self.status = status
+        self.data = data or {}
+        self.tasks = tasks or {}
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        # resume で以前の実行から再開したジョブかどうか（保存しません）
+        self.resumed = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_JOB_STATUSES
+
+    def task(self, name: str) -> Dict[str, Any]:
+        """作業単位の状態を返します。存在しない場合は空の状態を追加して返します。"""
+        return self.tasks.setdefault(str(name), {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "key": self.key,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "data": self.data,
+            "tasks": self.tasks,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "Job":
+        return cls(**record)
+
+
+class JobStore:
+    """
+    ジョブの状態をファイルに保存し、中断されたジョブを再開するためのストアです。
+
+    ジョブごとに path のディレクトリへ <ジョブID>.json として保存します。書き込みは
+    write_json_atomic で一時ファイルからの置き換えになるため、処理の途中でプロセスが終了しても
+    直前の checkpoint の状態が残ります。作成パラメータから計算したキー（registry.content_key など）が
+    同じで、まだ終了していないジョブは resume で再開できるため、タイムアウトやプロセスの終了で
+    中断された処理は、実行中のrunに再接続して続きから実行できます。
+    書き込みは file_lock で保護されますが、1つのジョブを同時に再開するプロセスは1つにしてください。
+    """
+
+    def __init__(self, path=None):
+        """
+        Parameters:
+        path (str): ジョブの状態を保存するディレクトリ。省略時は環境変数 JOB_STORE_PATH、
+            それもない場合はプロジェクトルートの .cache/jobs を使用します。
+        """
+        self.path = path or os.getenv("JOB_STORE_PATH", DEFAULT_JOB_STORE_PATH)
+        self.lock_path = os.path.join(self.path, ".lock")
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.path, f"{job_id}.json")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        ジョブIDに対応するジョブを返します。
+
+        Parameters:
+        job_id (str): ジョブのID。
+
+        Returns:
+        Optional[Job]: 保存されたジョブ。存在しない場合はNone。
+        """
+        record = read_json(self._job_path(job_id))
+        return None if record is None else Job.from_dict(record)
+
+    def jobs(self, key: Optional[str] = None) -> List[Job]:
+        """
+        保存されたジョブを作成日時の順に返します。
+
+        Parameters:
+        key (str): 指定した場合は、キーが一致するジョブだけを返します。
+
+        Returns:
+        list: ジョブのリスト。
+        """
+        jobs = []
+        for job_path in glob.glob(os.path.join(self.path, "*.json")):
+            record = read_json(job_path)
+            if record is not None and (key is None or record.get("key") == key):
+                jobs.append(Job.from_dict(record))
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def resume(self, key: str, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        キーが同じで終了していないジョブを返し、ない場合は新しいジョブを作成して保存します。
+
+        Parameters:
+        key (str): 作成パラメータから計算したジョブのキー。
+        kind (str): "qa_batch" などのジョブの種類。
+        params (dict): ジョブの作成パラメータ（確認用に保存します）。
+
+        Returns:
+        Job: 再開するジョブ（job.resumed がTrue）、または新しいジョブ。
+        """
+        with file_lock(self.lock_path):
+            for job in reversed(self.jobs(key)):
+                if not job.finished:
+                    job.resumed = True
+                    return job
+            job = Job(f"{kind}-{uuid.uuid4().hex[:12]}", key, kind, params)
+            write_json_atomic(self._job_path(job.id), job.to_dict())
+        return job
+
+    def checkpoint(self, job: Job):
+        """
+        ジョブの現在の状態を保存します。
+
+        Parameters:
+        job (Job): 保存するジョブ。
+        """
+        job.updated_at = time.time()
+        with file_lock(self.lock_path):
+            write_json_atomic(self._job_path(job.id), job.to_dict())
+
+    def finish(self, job: Job, status: str = "completed"):
+        """
+        ジョブを終了したものとして保存します。終了したジョブは resume で再開されません。
+
+        Parameters:
+        job (Job): 終了したジョブ。
+        status (str): "completed"・"incomplete"・"failed" のいずれか。
+        """
+        if status not in FINISHED_JOB_STATUSES:
+            raise ValueError(f"unknown job status: {status}")
+        job.status = status
+        self.checkpoint(job)
+
+    def forget(self, job: Job):
+        """ジョブの状態のファイルを削除します。リモートのスレッドやrunは削除しません。"""
+        with file_lock(self.lock_path):
+            try:
+                os.remove(self._job_path(job.id))
+            except FileNotFoundError:
+                pass
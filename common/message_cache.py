@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from common.helper import transform_assistant_messages
+
+
+class ThreadMessageCache:
+    """
+    スレッドのメッセージを、最後に取得したメッセージIDをカーソルにして差分だけ取得するクラスです。
+
+    初回は新しい順に最新の user メッセージまでを取得し、2回目以降は
+    order="asc" と after=<最後に取得したID> で新しいメッセージだけを取得します。
+    保持するのは最新のターン（最後の user メッセージより後の assistant メッセージ）だけです。
+    生成中（status="in_progress"）のメッセージは内容が変わるため、カーソルを進めずに次回取得し直します。
+    """
+
+    def __init__(self, client, thread_id: str, page_size: int = 100):
+        """
+        Parameters:
+        client (OpenAI): OpenAIクライアント。
+        thread_id (str): スレッドのID。
+        page_size (int): 1回のリクエストで取得するメッセージ数。
+        """
+        self.client = client
+        self.thread_id = thread_id
+        self.page_size = page_size
+        self.last_id: Optional[str] = None
+        self._seen_user = False
+        self._turn: List = []
+        self._pending: List = []
+        self._lock = threading.Lock()
+
+    def _fetch_initial(self):
+        """最新の user メッセージまでを新しい順に取得し、古い順にして返します。"""
+        fetched = []
+        for message in self.client.beta.threads.messages.list(
+            thread_id=self.thread_id, order="desc", limit=self.page_size
+        ):
+            fetched.append(message)
+            if message.role == "user":
+                break
+        return fetched[::-1]
+
+    def _fetch_new(self):
+        """最後に取得したメッセージより新しいメッセージを古い順に取得します。"""
+        return list(
+            self.client.beta.threads.messages.list(
+                thread_id=self.thread_id,
+                order="asc",
+                after=self.last_id,
+                limit=self.page_size,
+            )
+        )
+
+    def refresh(self) -> int:
+        """
+        新しいメッセージを取得してキャッシュに反映します。
+
+        Returns:
+        int: 取得したメッセージ数。
+        """
+        with self._lock:
+            fetched = self._fetch_new() if self.last_id else self._fetch_initial()
+            self._pending = []
+            for i, message in enumerate(fetched):
+                if message.status == "in_progress":
+                    # 生成中のメッセージ以降は確定させず、次回取得し直す
+                    self._pending = fetched[i:]
+                    break
+                if message.role == "user":
+                    self._seen_user = True
+                    self._turn = []
+                else:
+                    self._turn.append(message)
+                self.last_id = message.id
+            return len(fetched)
+
+    def latest_assistant_messages(self, refresh: bool = True) -> List:
+        """
+        最新の user メッセージより後の assistant メッセージを古い順に返します。
+
+        Parameters:
+        refresh (bool): 返す前に新しいメッセージを取得するかどうか。
+
+        Returns:
+        list: assistant メッセージのリスト。user メッセージがない場合は空のリスト。
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            if not self._seen_user:
+                return []
+            return self._turn + [m for m in self._pending if m.role == "assistant"]
+
+    def transform_latest(self, refresh: bool = True) -> List[dict]:
+        """
+        最新のターンの assistant メッセージを transform_latest_assistant_messages と同じ形式に変換します。
+
+        Parameters:
+        refresh (bool): 変換する前に新しいメッセージを取得するかどうか。
+
+        Returns:
+        list: 変換されたメッセージのリスト。
+        """
+        return transform_assistant_messages(
+            self.latest_assistant_messages(refresh=refresh)[::-1]
+        )
+
+
+# スレッドごとに共有するキャッシュ（古く使われたものから破棄する）
+_shared_caches: "OrderedDict" = OrderedDict()
+_shared_lock = threading.Lock()
+MAX_SHARED_CACHES = 1024
+
+
+def shared_message_cache(client, thread_id: str) -> ThreadMessageCache:
+    """
+    クライアントとスレッドの組ごとに共有するThreadMessageCacheを返します。初回呼び出し時に作成します。
+
+    Parameters:
+    client (OpenAI): OpenAIクライアント。
+    thread_id (str): スレッドのID。
+
+    Returns:
+    ThreadMessageCache: 共有のキャッシュ。
+    """
+    key = (id(client), thread_id)
+    with _shared_lock:
+        cache = _shared_caches.get(key)
+        if cache is None or cache.client is not client:
+            cache = ThreadMessageCache(client, thread_id)
+            _shared_caches[key] = cache
+        _shared_caches.move_to_end(key)
+        while len(_shared_caches) > MAX_SHARED_CACHES:
+            _shared_caches.popitem(last=False)
+        return cache
@@ -0,0 +1,220 @@
+from typing import Iterable, Iterator, List, Optional
+
+
+class FileRef:
+    """メッセージのテキストに注釈として付いたファイル（code_interpreter が生成したファイルなど）です。"""
+
+    __slots__ = ("file_id", "ext")
+
+    def __init__(self, file_id: str, ext: str):
+        self.file_id = file_id
+        self.ext = ext
+
+    def as_dict(self):
+        return {"file_id": self.file_id, "ext": self.ext}
+
+
+class MessageContent:
+    """
+    1つのメッセージの内容です。type は "text" または "image" です。
+    "image" の場合、value と file_ids は使用しません。
+    """
+
+    __slots__ = ("type", "value", "file_ids", "image_file_ids")
+
+    def __init__(
+        self,
+        type: str,
+        value: Optional[str] = None,
+        file_ids: Optional[List[FileRef]] = None,
+        image_file_ids: Optional[List[str]] = None,
+    ):
+        self.type = type
+        self.value = value
+        self.file_ids = file_ids
+        self.image_file_ids = image_file_ids
+
+    def as_dict(self):
+        if self.type == "text":
+            return {
+                "type": "text",
+                "value": self.value,
+                "file_ids": [ref.as_dict() for ref in self.file_ids],  # type: ignore
+                "image_file_ids": self.image_file_ids,
+            }
+        return {"type": "image", "image_file_ids": self.image_file_ids}
+
+
+class TransformedMessage:
+    """変換したアシスタントのメッセージです。"""
+
+    __slots__ = ("id", "content")
+
+    def __init__(self, id: str, content: MessageContent):
+        self.id = id
+        self.content = content
+
+    def as_dict(self):
+        return {"id": self.id, "content": self.content.as_dict()}
+
+    def __repr__(self):
+        return f"TransformedMessage(id={self.id!r}, type={self.content.type!r})"
+
+
+def extension(text: str) -> str:
+    """
+    パスの拡張子をドットなしで返します（os.path.splitext と同じ規則）。
+
+    Parameters:
+    text (str): "sandbox:/mnt/data/result.csv" のようなパス。
+
+    Returns:
+    str: 拡張子。ない場合は空文字列。
+    """
+    head, dot, ext = text.rpartition(".")
+    if not dot or "/" in ext:
+        return ""
+    # ファイル名が先頭のドットだけの場合（.bashrc など）は拡張子とみなさない
+    if not head[head.rfind("/") + 1 :].strip("."):
+        return ""
+    return ext
+
+
+def _text_record(message_id, value, file_refs, image_file_ids):
+    return TransformedMessage(
+        message_id, MessageContent("text", value, file_refs, image_file_ids)
+    )
+
+
+def _image_record(message_id, image_file_id):
+    return TransformedMessage(
+        message_id, MessageContent("image", image_file_ids=[image_file_id])
+    )
+
+
+def _text_dict(message_id, value, file_refs, image_file_ids):
+    return {
+        "id": message_id,
+        "content": {
+            "type": "text",
+            "value": value,
+            "file_ids": file_refs,
+            "image_file_ids": image_file_ids,
+        },
+    }
+
+
+def _image_dict(message_id, image_file_id):
+    return {"id": message_id, "content": {"type": "image", "image_file_ids": [image_file_id]}}
+
+
+def _ref_dict(file_id, ext):
+    return {"file_id": file_id, "ext": ext}
+
+
+# (ファイル参照, テキスト, 画像) の生成関数
+RECORDS = (FileRef, _text_record, _image_record)
+DICTS = (_ref_dict, _text_dict, _image_dict)
+
+
+def _append(out: list, message, factories=RECORDS) -> None:
+    """
+    1つのメッセージを変換して out に追加します。
+    テキストがない場合は、画像ごとに1件ずつ追加します。
+    """
+    make_ref, make_text, make_image = factories
+    text = None
+    image_file_ids = []
+    for content in message.content:
+        kind = content.type
+        if kind == "text":
+            # 複数のテキストがある場合は最後のものを使用する
+            text = content.text
+        elif kind == "image_file":
+            image_file_ids.append(content.image_file.file_id)
+
+    if text is not None:
+        file_refs = [
+            make_ref(annotation.file_path.file_id, extension(annotation.text))
+            for annotation in text.annotations or ()
+            if annotation.type == "file_path"
+        ]
+        out.append(make_text(message.id, text.value, file_refs, image_file_ids))
+    else:
+        # テキストがない場合（通常はないが、念のため）
+        for image_file_id in image_file_ids:
+            out.append(make_image(message.id, image_file_id))
+
+
+def _messages(messages) -> Iterable:
+    """messages.list の戻り値（ページ）またはメッセージのリストを受け付けます。"""
+    return getattr(messages, "data", messages)
+
+
+def iter_latest_assistant_records(
+    messages, factories=RECORDS
+) -> Iterator[TransformedMessage]:
+    """
+    新しい順に並んだメッセージを先頭から読み、最初の user メッセージまでの
+    アシスタントのメッセージを変換しながら順に返します（新しい順）。
+
+    メッセージを読みながら返すため、user メッセージが見つからない場合でも
+    それまでのメッセージを返します。
+
+    Parameters:
+    messages: messages.list の戻り値、または新しい順のメッセージのリスト。
+    factories: RECORDS（レコードを返す）または DICTS（辞書を返す）。
+
+    Yields:
+    TransformedMessage: 変換したメッセージ。
+    """
+    buffer: list = []
+    for message in _messages(messages):
+        role = message.role
+        if role == "user":
+            return
+        if role == "assistant":
+            _append(buffer, message, factories)
+            yield from buffer
+            buffer.clear()
+
+
+def latest_assistant_records(messages, factories=RECORDS) -> List:
+    """
+    最初の user メッセージより新しいアシスタントのメッセージを1回の走査で変換し、古い順に返します。
+    factories=DICTS の場合は transform_latest_assistant_messages と同じ辞書を返します。
+
+    Parameters:
+    messages: messages.list の戻り値、または新しい順のメッセージのリスト。
+    factories: RECORDS（レコードを返す）または DICTS（辞書を返す）。
+
+    Returns:
+    list: 変換したメッセージのリスト。user メッセージがない場合は空のリスト。
+    """
+    records: list = []
+    for message in _messages(messages):
+        role = message.role
+        if role == "user":
+            records.reverse()
+            return records
+        if role == "assistant":
+            _append(records, message, factories)
+    return []
+
+
+def assistant_records(messages, factories=RECORDS) -> List:
+    """
+    新しい順に並んだアシスタントのメッセージをすべて変換し、古い順に返します。
+
+    Parameters:
+    messages (list): 新しい順に並んだアシスタントのメッセージ。
+    factories: RECORDS（レコードを返す）または DICTS（辞書を返す）。
+
+    Returns:
+    list: 変換したメッセージのリスト。
+    """
+    records: list = []
+    for message in messages:
+        _append(records, message, factories)
+    records.reverse()
+    return records
@@ -0,0 +1,484 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# 書き込み待ちのレコード数の上限と、満杯のときの方針（block: 空くまで待つ / drop: 捨てる）
+PAYLOAD_BUFFER_SIZE = int(os.getenv("PAYLOAD_BUFFER_SIZE", "10000"))
+PAYLOAD_BUFFER_POLICY = os.getenv("PAYLOAD_BUFFER_POLICY", "block")
+# fsync の方針（always: コミットごと / interval: PAYLOAD_FSYNC_INTERVAL 秒ごと / never: OSに任せる）
+PAYLOAD_FSYNC = os.getenv("PAYLOAD_FSYNC", "interval")
+PAYLOAD_FSYNC_INTERVAL = float(os.getenv("PAYLOAD_FSYNC_INTERVAL", "1.0"))
+
+POLICIES = ("block", "drop")
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def _check(value: str, choices: Sequence[str], name: str) -> str:
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {tuple(choices)}: {value!r}")
+    return value
+
+
+class PayloadSink:
+    """
+    ツールの出力（QAなど）を永続化する出力先の基底クラスです。
+
+    write() はレコードを上限付きのバッファに追加するだけで、ファイルへの書き込みは
+    バックグラウンドのスレッドがまとめて行います（グループコミット）。そのため、ツールの実行中に
+    ディスクの書き込みや fsync を待つことはありません。バッファが満杯の場合は policy に従い、
+    空くまで待つか、レコードを捨てて dropped に数えます。
+
+    サブクラスは _open()・_write_batch()・_sync()・_close() を実装します。
+    これらはすべて書き込み用のスレッドから呼び出され、_write_batch() から戻ったレコードは
+    出力先に書き込まれたものとして flush() の完了に数えます。
+    """
+
+    # 前回の実行の出力に追記できるかどうか（中断したジョブの再開に使用できるかどうか）
+    appendable = True
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        commit_interval_ms: float = 100,
+        buffer_size: Optional[int] = None,
+        policy: Optional[str] = None,
+        fsync: Optional[str] = None,
+        fsync_interval: Optional[float] = None,
+    ):
+        """
+        Parameters:
+        batch_size (int): 1回のコミットで書き込む最大のレコード数。
+        commit_interval_ms (float): 最初のレコードが届いてから、ほかのレコードを待ってまとめる最大時間（ミリ秒）。
+        buffer_size (int): 書き込み待ちのレコード数の上限。省略時は環境変数 PAYLOAD_BUFFER_SIZE（既定: 10000）。
+        policy (str): バッファが満杯のときの方針。"block" は空くまで待ち、"drop" はレコードを捨てます。
+            省略時は環境変数 PAYLOAD_BUFFER_POLICY（既定: block）。
+        fsync (str): "always" はコミットごと、"interval" は fsync_interval 秒ごと、
+            "never" は fsync しません（close() 時も含む）。省略時は環境変数 PAYLOAD_FSYNC（既定: interval）。
+        fsync_interval (float): fsync="interval" の間隔（秒）。省略時は環境変数 PAYLOAD_FSYNC_INTERVAL（既定: 1.0）。
+        """
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval_ms / 1000
+        self.buffer_size = PAYLOAD_BUFFER_SIZE if buffer_size is None else buffer_size
+        self.policy = _check(policy or PAYLOAD_BUFFER_POLICY, POLICIES, "policy")
+        self.fsync = _check(fsync or PAYLOAD_FSYNC, FSYNC_POLICIES, "fsync")
+        self.fsync_interval = (
+            PAYLOAD_FSYNC_INTERVAL if fsync_interval is None else fsync_interval
+        )
+        # 統計情報
+        self.records = 0
+        self.dropped = 0
+        self.commits = 0
+        self.fsyncs = 0
+
+        self._buffer: List[Any] = []
+        self._cond = threading.Condition()
+        # 受け付けたレコードと書き込んだレコードの通し番号（flush() の待機に使う）
+        self._accepted = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._last_sync = time.monotonic()
+        self._unsynced = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"{type(self).__name__}-writer", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, record: Dict[str, Any]):
+        """レコードを1件追加します。"""
+        self.write_many((record,))
+
+    def write_many(self, records: Iterable[Dict[str, Any]]):
+        """
+        レコードをまとめて追加します。バッファに空きがあればすぐに戻ります。
+
+        Parameters:
+        records (Iterable[dict]): 追加するレコード。
+        """
+        records = list(records)
+        with self._cond:
+            self._raise_if_failed()
+            if self._closed:
+                raise ValueError("sink is closed")
+            if self.policy == "drop":
+                room = max(0, self.buffer_size - len(self._buffer))
+                if room < len(records):
+                    self.dropped += len(records) - room
+                    records = records[:room]
+            else:
+                # 上限より大きなまとまりは、バッファが空になってから受け付ける
+                while (
+                    self._buffer
+                    and len(self._buffer) + len(records) > self.buffer_size
+                    and self._error is None
+                ):
+                    self._cond.wait()
+                self._raise_if_failed()
+            if not records:
+                return
+            self._buffer.extend(records)
+            self._accepted += len(records)
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None):
+        """
+        それまでに追加したレコードの書き込みが完了するまで待ちます。
+
+        Parameters:
+        timeout (float): 待機の最大時間（秒）。
+
+        Raises:
+        TimeoutError: timeout 内に書き込みが完了しなかった場合。
+        """
+        with self._cond:
+            target = self._accepted
+            self._flush_requested = True
+            self._cond.notify_all()
+            if not self._cond.wait_for(
+                lambda: self._written >= target or self._error is not None, timeout
+            ):
+                raise TimeoutError("payload sink flush timed out")
+            self._raise_if_failed()
+
+    def close(self):
+        """残りのレコードを書き込み、出力先を閉じます。"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._cond:
+            self._raise_if_failed()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "records": self.records,
+                "dropped": self.dropped,
+                "commits": self.commits,
+                "fsyncs": self.fsyncs,
+                "buffered": len(self._buffer),
+            }
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError(f"{type(self).__name__} failed") from self._error
+
+    def _next_batch(self) -> Optional[List[Any]]:
+        """次にコミットするレコードを取り出します。閉じられて空の場合はNoneを返します。"""
+        with self._cond:
+            while not self._buffer and not self._closed:
+                self._flush_requested = False
+                timeout = None
+                if self._unsynced and self.fsync == "interval":
+                    timeout = max(0.0, self._last_sync + self.fsync_interval - time.monotonic())
+                if not self._cond.wait(timeout) and not self._buffer:
+                    # 新しいレコードがないまま fsync の時刻になった
+                    return []
+            if not self._buffer:
+                return None
+            # グループコミット: batch_size に達するか、一定時間が経つまで後続のレコードを待つ
+            deadline = time.monotonic() + self.commit_interval
+            while (
+                len(self._buffer) < self.batch_size
+                and not self._closed
+                and not self._flush_requested
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._buffer[: self.batch_size]
+            del self._buffer[: self.batch_size]
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        try:
+            self._open()
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                if batch:
+                    self._write_batch(batch)
+                    self._unsynced = True
+                self._maybe_sync(force=self.fsync == "always")
+                with self._cond:
+                    if batch:
+                        self.records += len(batch)
+                        self.commits += 1
+                        self._written += len(batch)
+                    self._cond.notify_all()
+            self._maybe_sync(force=self.fsync != "never")
+        except BaseException as e:
+            with self._cond:
+                self._error = e
+                self._buffer.clear()
+                self._cond.notify_all()
+        finally:
+            try:
+                self._close()
+            except BaseException as e:
+                with self._cond:
+                    self._error = self._error or e
+                    self._cond.notify_all()
+
+    def _maybe_sync(self, force: bool = False):
+        if not self._unsynced or self.fsync == "never":
+            return
+        now = time.monotonic()
+        if force or now - self._last_sync >= self.fsync_interval:
+            self._sync()
+            self._last_sync = now
+            self._unsynced = False
+            self.fsyncs += 1
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, records: List[Any]):
+        raise NotImplementedError
+
+    def _sync(self):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class JsonlPayloadSink(PayloadSink):
+    """レコードを1行ずつJSONでファイルに追記する出力先です。"""
+
+    def __init__(self, path: str, **kwargs):
+        """
+        Parameters:
+        path (str): 追記するファイルのパス。
+        **kwargs: PayloadSink の引数。
+        """
+        self.path = path
+        self._file = None
+        super().__init__(**kwargs)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _write_batch(self, records):
+        self._file.write(  # type: ignore
+            "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        )
+        # 書き込み用のスレッドが止まってもOSには渡っているようにする
+        self._file.flush()  # type: ignore
+
+    def _sync(self):
+        os.fsync(self._file.fileno())  # type: ignore
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class SqlitePayloadSink(PayloadSink):
+    """
+    レコードをSQLiteのテーブルに追加する出力先です。コミットごとに1つのトランザクションで
+    executemany します。レコード全体はJSONとして payload 列に保存し、columns に指定したキーは
+    検索用に同じ名前の列にも保存します。
+
+    fsync の方針はWALモードの synchronous に対応させます（always: FULL / interval: NORMAL と
+    定期的なチェックポイント / never: OFF）。
+    """
+
+    _SYNCHRONOUS = {"always": "FULL", "interval": "NORMAL", "never": "OFF"}
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "payloads",
+        columns: Sequence[str] = (),
+        **kwargs,
+    ):
+        """
+        Parameters:
+        path (str): データベースファイルのパス。
+        table (str): テーブル名。
+        columns (list): payload とは別の列に保存するレコードのキー（例: ["question", "answer"]）。
+        **kwargs: PayloadSink の引数。
+        """
+        for name in (table, *columns):
+            if not name.isidentifier():
+                raise ValueError(f"invalid SQL identifier: {name!r}")
+        self.path = path
+        self.table = table
+        self.columns = list(columns)
+        self._connection: Optional[sqlite3.Connection] = None
+        super().__init__(**kwargs)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 接続は書き込み用のスレッドで作成し、そのスレッドだけで使用する
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={self._SYNCHRONOUS[self.fsync]}")
+        columns = "".join(f", {name} TEXT" for name in self.columns)
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL{columns}, "
+            "payload TEXT NOT NULL)"
+        )
+        connection.commit()
+        self._connection = connection
+        names = ", ".join(["created_at", *self.columns, "payload"])
+        marks = ", ".join("?" * (len(self.columns) + 2))
+        self._insert = f"INSERT INTO {self.table} ({names}) VALUES ({marks})"
+
+    def _write_batch(self, records):
+        now = time.time()
+        rows = [
+            (
+                now,
+                *(_column_value(record.get(name)) for name in self.columns),
+                json.dumps(record, ensure_ascii=False),
+            )
+            for record in records
+        ]
+        with self._connection:  # type: ignore
+            self._connection.executemany(self._insert, rows)  # type: ignore
+
+    def _sync(self):
+        if self.fsync == "interval":
+            # NORMAL ではWALへのコミットを同期しないため、チェックポイントで同期する
+            self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")  # type: ignore
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+def _column_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+class ParquetPayloadSink(PayloadSink):
+    """
+    レコードをParquetファイルに書き込む出力先です（pyarrow が必要です）。
+
+    1回のコミットを1つの行グループとして書き込みます。行グループを大きくするため、
+    コミットまでレコードを待つ時間は長め（既定: 5秒）ですが、flush() を呼び出すとすぐに書き込みます。
+    スキーマは最初の行グループから推測し、以降のレコードで足りないキーは null になります。
+
+    Parquetのファイルは close() でフッターを書き込むまで読み込めず、既存のファイルに追記もできないため、
+    既存のファイルは上書きせずにエラーにします。中断したジョブの再開（JobStore）には使用できません。
+    """
+
+    appendable = False
+
+    def __init__(self, path: str, row_group_size: int = 10000, **kwargs):
+        """
+        Parameters:
+        path (str): 書き込むファイルのパス。存在しないパスを指定します。
+        row_group_size (int): 1つの行グループの最大のレコード数。
+        **kwargs: PayloadSink の引数。
+
+        Raises:
+        FileExistsError: path のファイルがすでに存在する場合。
+        """
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "ParquetPayloadSink requires the pyarrow package (pip install pyarrow)"
+            ) from None
+        if os.path.exists(path):
+            raise FileExistsError(f"parquet output already exists: {path}")
+        self.path = path
+        self.row_group_size = row_group_size
+        self._file = None
+        self._writer = None
+        self._schema = None
+        kwargs.setdefault("batch_size", row_group_size)
+        kwargs.setdefault("commit_interval_ms", 5000)
+        super().__init__(**kwargs)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # __init__ の確認の後に作成された場合も上書きしない
+        self._file = open(self.path, "xb")
+
+    def _write_batch(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            table = pa.Table.from_pylist(rows)
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(self._file, self._schema)
+        else:
+            table = pa.Table.from_pylist(rows, schema=self._schema)
+        self._writer.write_table(table, row_group_size=len(rows))
+
+    def _sync(self):
+        self._file.flush()  # type: ignore
+        os.fsync(self._file.fileno())  # type: ignore
+
+    def _close(self):
+        if self._file is None:
+            return
+        try:
+            if self._writer is not None:
+                self._writer.close()
+            if self.fsync != "never":
+                self._sync()
+        finally:
+            self._file.close()
+
+
+def open_payload_sink(path: str, resumable: bool = False, **kwargs) -> PayloadSink:
+    """
+    ファイルの拡張子から出力先を選んで作成します。
+
+    Parameters:
+    path (str): 出力先のパス。.jsonl / .sqlite・.db / .parquet に対応しています。
+    resumable (bool): 中断したジョブの再開で前回の出力に追記する場合はTrue。
+        追記できない出力先（Parquet）はエラーにします。
+    **kwargs: 出力先のクラスの引数。
+
+    Returns:
+    PayloadSink: 作成した出力先。
+
+    Raises:
+    ValueError: 対応していない拡張子、または resumable で追記できない出力先の場合。
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".sqlite", ".sqlite3", ".db"):
+        return SqlitePayloadSink(path, **kwargs)
+    if extension == ".parquet":
+        if resumable:
+            raise ValueError(
+                f"parquet output cannot be appended to when resuming jobs: {path} "
+                "(use .jsonl or .sqlite)"
+            )
+        return ParquetPayloadSink(path, **kwargs)
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return JsonlPayloadSink(path, **kwargs)
+    raise ValueError(f"unsupported payload sink: {path}")
@@ -0,0 +1,600 @@
+import math
+import queue
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import openai
+
+from common.job_store import Job, JobStore
+from common.registry import content_key
+from common.relay import cancel_run
+from common.run_waiter import shared_waiter
+from common.tool_executor import ToolExecutor
+
+# シャードごとに送信する依頼文のデフォルト
+DEFAULT_PROMPT = (
+    "資料「{source}」から新規に{count}件のQAを作成し、外部システムに転送しなさい。"
+    "（作業番号: {shard}。他の作業番号とは異なる箇所・観点から質問を作成してください）"
+)
+
+# 再試行するrunのステータス
+RETRY_STATUSES = frozenset(["failed", "expired", "incomplete", "cancelled"])
+
+
+class CorpusItem(NamedTuple):
+    """QAを作成する資料です。"""
+
+    # 依頼文に埋め込む資料の名前
+    source: str
+    # スレッドの tool_resources（資料のvector storeなど）。省略時はアシスタントの設定を使用します
+    tool_resources: Optional[Dict[str, Any]] = None
+
+
+class Shard:
+    """1つのスレッドとrunで作成するQAの単位です。"""
+
+    __slots__ = ("index", "item", "count", "collected", "attempts", "run", "status", "tool_outputs")
+
+    def __init__(self, index: int, item: CorpusItem, count: int):
+        self.index = index
+        self.item = item
+        self.count = count
+        self.collected = 0
+        self.attempts = 0
+        # 最後に取得したrun
+        self.run = None
+        # "pending"（runの作成待ち）・"running"・"completed"・"failed"
+        self.status = "pending"
+        # 現在のrunで実行済みのツールの出力（tool_call_id -> output）
+        self.tool_outputs: Dict[str, str] = {}
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.count - self.collected)
+
+    def to_record(self) -> Dict[str, Any]:
+        """JobStore に保存するシャードの状態を返します。"""
+        return {
+            "source": self.item.source,
+            "count": self.count,
+            "collected": self.collected,
+            "attempts": self.attempts,
+            "status": self.status,
+            "thread_id": self.run.thread_id if self.run is not None else None,
+            "run_id": self.run.id if self.run is not None else None,
+            "tool_outputs": self.tool_outputs,
+        }
+
+
+class BatchStats:
+    """バッチ全体の進捗と結果です。"""
+
+    def __init__(self, target: int):
+        self.target = target
+        self.qa = 0
+        self.duplicates = 0
+        self.shards_started = 0
+        self.shards_completed = 0
+        self.shards_failed = 0
+        self.runs = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.resumed = 0
+        self.peak_in_flight = 0
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def qa_per_minute(self) -> float:
+        """1分あたりに作成したQAの件数。"""
+        return self.qa / self.elapsed * 60 if self.elapsed > 0 else 0.0
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "target": self.target,
+            "qa": self.qa,
+            "duplicates": self.duplicates,
+            "shards_started": self.shards_started,
+            "shards_completed": self.shards_completed,
+            "shards_failed": self.shards_failed,
+            "runs": self.runs,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "resumed": self.resumed,
+            "peak_in_flight": self.peak_in_flight,
+            "elapsed_s": self.elapsed,
+            "qa_per_minute": self.qa_per_minute,
+        }
+
+
+def is_transient(error: Exception) -> bool:
+    """接続エラーやサーバーエラー（5xx）など、時間をおいて再試行すればよいエラーかどうかを返します。"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """RateLimitError の応答ヘッダーから、再試行までの秒数を取り出します。"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class QABatchGenerator:
+    """
+    目標件数のQAを、複数のスレッドとrunに分割して並行に作成するクラスです。
+
+    目標件数を per_run 件ずつのシャードに分け、資料（corpus）を順番に割り当てて
+    create_and_run で同時に最大 concurrency 個のrunを実行します。
+    runの完了は共有の RunWaiter がまとめて待機し、requires_action になったrunは
+    ToolExecutor でツールを実行して出力を送信します。collect_tool のツール呼び出しの引数は
+    検証したうえで、届いた順に sink へ書き込みます。dedup を指定した場合は、ほぼ重複するQAを除外し、
+    重複しなかったQAだけを目標件数に数えます。
+
+    RateLimitError を受けた場合は、応答の retry-after の間すべてのシャードの新規リクエストを止め、
+    同時実行数を半分に減らします（シャードが完了するごとに1つずつ元の上限まで戻します）。
+    接続エラーやサーバーエラー（5xx）の場合は、指数バックオフで待機してから同じリクエストを再試行します。
+    作成されたQAが依頼した件数に満たない場合は、目標件数に達するまで追加のシャードを実行します。
+
+    jobs を指定した場合は、シャードのスレッド・run・実行済みのツールの出力・作成した件数を
+    状態が変わるたびに JobStore に保存します。タイムアウトやプロセスの終了で中断された後に
+    同じ条件で generate を呼び出すと、実行中だったrunに再接続し、作成済みのQAを目標件数に数えて
+    続きから実行します（新しいrunを作成し直さないため、トークンを再び消費しません）。
+    """
+
+    def __init__(
+        self,
+        client,
+        assistant_id: str,
+        registry,
+        sink,
+        collect_tool: str = "transport_qa_data",
+        payload_key: str = "qa_data",
+        per_run: int = 10,
+        concurrency: int = 8,
+        prompt: str = DEFAULT_PROMPT,
+        run_timeout: float = 600.0,
+        max_attempts: int = 3,
+        submit_attempts: int = 5,
+        max_shards: Optional[int] = None,
+        dedup=None,
+        jobs: Optional[JobStore] = None,
+        waiter=None,
+        executor: Optional[ToolExecutor] = None,
+        on_progress: Optional[Callable[[Shard, BatchStats], None]] = None,
+    ):
+        """
+        Parameters:
+        client (OpenAI): OpenAIクライアント。
+        assistant_id (str): QAを作成するアシスタントのID。
+        registry (ToolRegistry): アシスタントの function ツールのレジストリ。
+        sink (PayloadSink): QAを書き込む出力先（common.payload_sink）。
+        collect_tool (str): QAのデータを受け取るツールの名前。
+        payload_key (str): collect_tool の引数のうち、QAのリストを持つ引数の名前。
+        per_run (int): 1つのrunに依頼するQAの件数。
+        concurrency (int): 同時に実行するrunの最大数。
+        prompt (str): 依頼文のテンプレート。{source}・{count}・{shard} を置き換えます。
+        run_timeout (float): 1つのrunを待機する最大時間（秒）。
+        max_attempts (int): 失敗したシャードを実行する最大回数。
+        submit_attempts (int): ツールの出力の送信を一時的なエラーで再試行する最大回数。
+            この回数に達するか、runの期限（expires_at）までに送信できない場合は、シャードを再試行します。
+        max_shards (int): 実行するシャード数の上限。QAが依頼した件数に満たないrunが続いても
+            終了するための上限で、省略時は目標件数に必要なシャード数の2倍（と資料の数）です。
+        dedup (QADedupIndex): ほぼ重複するQAを除外するインデックス。
+        jobs (JobStore): シャードの状態を保存し、中断されたバッチを再開するためのストア。
+        waiter (RunWaiter): runの完了を待機する RunWaiter。省略時はクライアントごとの共有の RunWaiter。
+        executor (ToolExecutor): ツールを実行するエグゼキューター。省略時は registry から作成します。
+        on_progress (Callable): シャードが完了または失敗するたびに (シャード, 統計) で呼び出す関数。
+        """
+        self.client = client
+        # リトライは待機時間をシャード間で共有するためにこのクラスで行う
+        self.api = client.with_options(max_retries=0)
+        self.assistant_id = assistant_id
+        self.registry = registry
+        self.sink = sink
+        self.collect_tool = collect_tool
+        self.payload_key = payload_key
+        self.per_run = per_run
+        self.concurrency = concurrency
+        self.prompt = prompt
+        self.run_timeout = run_timeout
+        self.max_attempts = max_attempts
+        self.submit_attempts = submit_attempts
+        self.max_shards = max_shards
+        self.dedup = dedup
+        self.jobs = jobs
+        self.waiter = waiter or shared_waiter(client)
+        self.executor = executor
+        self.on_progress = on_progress
+
+    def generate(
+        self,
+        target: int,
+        corpus: Sequence[Union[str, CorpusItem]] = (),
+        job: Optional[Job] = None,
+    ) -> BatchStats:
+        """
+        目標件数のQAを作成するまで、シャードを並行に実行します。
+
+        Parameters:
+        target (int): 作成するQAの件数。
+        corpus (list): 資料のリスト。文字列の場合は資料の名前として扱います。
+        job (Job): シャードの状態を保存するジョブ（jobs から取得したもの）。省略時に jobs を指定している場合は、
+            アシスタント・目標件数・資料・依頼文が同じで終了していないジョブを再開します。
+
+        Returns:
+        BatchStats: 実行結果。
+        """
+        items = [
+            item if isinstance(item, CorpusItem) else CorpusItem(item) for item in corpus
+        ] or [CorpusItem("添付資料")]
+        if job is None and self.jobs is not None:
+            params = {
+                "assistant_id": self.assistant_id,
+                "target": target,
+                "per_run": self.per_run,
+                "sources": [item.source for item in items],
+                "prompt": self.prompt,
+            }
+            job = self.jobs.resume(content_key("qa_batch", **params), "qa_batch", params)
+        if job is not None and not getattr(self.sink, "appendable", True):
+            # 再開時に数える作成済みのQAが、前回の出力に残っていることを保証できない
+            raise ValueError(
+                f"{type(self.sink).__name__} cannot be used with resumable jobs"
+            )
+        owns_executor = self.executor is None
+        executor = self.executor or ToolExecutor.from_registry(self.registry)
+        try:
+            return _Batch(self, executor, items, target, job).run()
+        finally:
+            if owns_executor:
+                executor.close()
+
+
+class _Batch:
+    """generate() の1回の実行状態です。状態はメインスレッドだけが変更します。"""
+
+    def __init__(
+        self,
+        owner: QABatchGenerator,
+        executor,
+        items: List[CorpusItem],
+        target: int,
+        job: Optional[Job] = None,
+    ):
+        self.owner = owner
+        self.executor = executor
+        self.items = items
+        self.target = target
+        self.stats = BatchStats(target)
+        self.max_shards = owner.max_shards or (
+            2 * math.ceil(target / owner.per_run) + len(items)
+        )
+        self.next_index = 0
+        self.pending: deque = deque()
+        self.in_flight: Dict[int, Shard] = {}
+        # 同時実行数の現在の上限（RateLimitError で減らし、完了ごとに戻す）
+        self.limit = owner.concurrency
+        self.paused_until = 0.0
+        self.backoff = 0
+        # RunWaiter のコールバックから届く (シャード, run または例外)
+        self.events: queue.Queue = queue.Queue()
+        self.job = job
+        if job is not None:
+            self.restore()
+
+    def restore(self):
+        """ジョブに保存されたシャードの状態を復元し、実行中だったrunに再接続します。"""
+        for name, record in sorted(self.job.tasks.items(), key=lambda task: int(task[0])):
+            index = int(name)
+            shard = Shard(index, self.items[index % len(self.items)], record["count"])
+            shard.collected = record["collected"]
+            shard.attempts = record["attempts"]
+            shard.status = record["status"]
+            shard.tool_outputs = record.get("tool_outputs") or {}
+            self.next_index = max(self.next_index, index + 1)
+            self.stats.qa += shard.collected
+            if shard.attempts:
+                self.stats.shards_started += 1
+            if shard.status == "completed":
+                self.stats.shards_completed += 1
+            elif shard.status == "failed":
+                self.stats.shards_failed += 1
+            elif shard.status == "running":
+                self.reattach(shard, record["thread_id"], record["run_id"])
+            else:
+                self.pending.append(shard)
+
+    def reattach(self, shard: Shard, thread_id: str, run_id: str):
+        try:
+            shard.run = self.owner.client.beta.threads.runs.retrieve(
+                thread_id=thread_id, run_id=run_id
+            )
+        except openai.NotFoundError:
+            # スレッドが削除されたなど。新しいrunで作成し直す
+            shard.status = "pending"
+            shard.tool_outputs = {}
+            self.pending.append(shard)
+            return
+        self.stats.resumed += 1
+        self.in_flight[shard.index] = shard
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, len(self.in_flight))
+        self.wait(shard)
+
+    def flush_dedup(self):
+        """
+        重複判定のインデックスに登録したQAを保存します。出力先への書き込みとジョブの保存の後に呼び出し、
+        中断された場合に、再開後に同じツール呼び出しのQAがすべて重複として除外されないようにします。
+        """
+        if self.owner.dedup is not None:
+            self.owner.dedup.flush()
+
+    def checkpoint(self, shard: Shard):
+        """シャードの状態をジョブに保存します。"""
+        if self.job is None:
+            return
+        self.job.tasks[str(shard.index)] = shard.to_record()
+        self.owner.jobs.checkpoint(self.job)
+
+    def expected(self) -> int:
+        """作成済みのQAと、実行中・待機中のシャードで作成される見込みの件数の合計。"""
+        queued = sum(shard.remaining for shard in self.pending)
+        running = sum(shard.remaining for shard in self.in_flight.values())
+        return self.stats.qa + queued + running
+
+    def top_up(self):
+        """目標件数に届かない分のシャードを追加します。"""
+        per_run = self.owner.per_run
+        while self.next_index < self.max_shards and self.expected() < self.target:
+            count = min(per_run, self.target - self.expected())
+            item = self.items[self.next_index % len(self.items)]
+            self.pending.append(Shard(self.next_index, item, count))
+            self.next_index += 1
+
+    def run(self) -> BatchStats:
+        self.top_up()
+        try:
+            while self.pending or self.in_flight:
+                self.launch_ready()
+                timeout = None
+                if self.pending and len(self.in_flight) < self.limit:
+                    timeout = max(0.0, self.paused_until - time.monotonic())
+                try:
+                    shard, outcome = self.events.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                self.handle(shard, outcome)
+            if self.job is not None:
+                status = "completed" if self.stats.qa >= self.target else "incomplete"
+                self.owner.jobs.finish(self.job, status)
+        finally:
+            # 中断された場合は実行中のrunを中止する（出力先への書き込みは最後にまとめて待つ）。
+            # ジョブに保存している場合は、再開時に再接続できるようにrunを残す
+            if self.job is None:
+                for shard in self.in_flight.values():
+                    cancel_run(self.owner.client, shard.run)
+            self.owner.sink.flush()
+            if self.job is None:
+                # ジョブに保存している場合は、保存済みのツール呼び出しの分だけをその都度保存している
+                self.flush_dedup()
+            self.stats.finished_at = time.monotonic()
+        return self.stats
+
+    def launch_ready(self):
+        while (
+            self.pending
+            and len(self.in_flight) < self.limit
+            and time.monotonic() >= self.paused_until
+        ):
+            shard = self.pending.popleft()
+            if not self.launch(shard):
+                self.pending.appendleft(shard)
+                return
+
+    def launch(self, shard: Shard) -> bool:
+        owner = self.owner
+        content = owner.prompt.format(
+            source=shard.item.source, count=shard.remaining, shard=shard.index
+        )
+        thread: Dict[str, Any] = {"messages": [{"role": "user", "content": content}]}
+        if shard.item.tool_resources:
+            thread["tool_resources"] = shard.item.tool_resources
+        try:
+            run = owner.api.beta.threads.create_and_run(
+                assistant_id=owner.assistant_id,
+                thread=thread,  # type: ignore
+                metadata={"qa_shard": str(shard.index)},
+            )
+        except openai.RateLimitError as e:
+            self.rate_limited(e)
+            return False
+        except (openai.APIConnectionError, openai.APIStatusError) as e:
+            if not is_transient(e):
+                raise
+            self.pause(None)
+            return False
+        if shard.attempts == 0:
+            self.stats.shards_started += 1
+        shard.attempts += 1
+        shard.run = run
+        shard.status = "running"
+        shard.tool_outputs = {}
+        self.stats.runs += 1
+        self.in_flight[shard.index] = shard
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, len(self.in_flight))
+        self.checkpoint(shard)
+        self.wait(shard)
+        return True
+
+    def wait(self, shard: Shard):
+        future = self.owner.waiter.submit(
+            shard.run.thread_id, shard.run.id, timeout=self.owner.run_timeout
+        )
+        future.add_done_callback(lambda f: self.events.put((shard, _outcome(f))))
+
+    def handle(self, shard: Shard, outcome):
+        if isinstance(outcome, BaseException):
+            # タイムアウトなど。runを中止して再試行する
+            cancel_run(self.owner.client, shard.run)
+            self.retry(shard)
+            return
+        run = shard.run = outcome
+        if run.status == "requires_action":
+            self.submit_tool_outputs(shard, run)
+            return
+        if run.status == "completed":
+            self.done(shard)
+            return
+        if run.status in RETRY_STATUSES:
+            last_error = getattr(run, "last_error", None)
+            if last_error is not None and last_error.code == "rate_limit_exceeded":
+                self.rate_limited(None)
+            self.retry(shard)
+            return
+        # 想定外のステータスは待機を続ける
+        self.wait(shard)
+
+    def submit_tool_outputs(self, shard: Shard, run):
+        tool_calls = run.required_action.submit_tool_outputs.tool_calls
+        # 再開前に実行済みのツール呼び出しは、QAを書き込み直さずに保存した出力を送信する
+        new_calls = [call for call in tool_calls if call.id not in shard.tool_outputs]
+        if new_calls:
+            self.collect(shard, new_calls)
+            for output in self.executor.run(new_calls):
+                shard.tool_outputs[output["tool_call_id"]] = output["output"]
+            if self.job is not None:
+                # 保存した件数が出力先に書き込まれていることを保証してから保存する
+                self.owner.sink.flush()
+                self.checkpoint(shard)
+                self.flush_dedup()
+        tool_outputs = [
+            {"tool_call_id": call.id, "output": shard.tool_outputs[call.id]}
+            for call in tool_calls
+        ]
+        expires_at = getattr(run, "expires_at", None)
+        for attempt in range(1, self.owner.submit_attempts + 1):
+            try:
+                self.owner.api.beta.threads.runs.submit_tool_outputs(
+                    thread_id=run.thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs,
+                )
+                break
+            except openai.BadRequestError:
+                # runが期限切れなどで requires_action ではなくなった
+                self.retry(shard)
+                return
+            except (openai.APIConnectionError, openai.APIStatusError) as e:
+                if not (isinstance(e, openai.RateLimitError) or is_transient(e)):
+                    raise
+                # requires_action のrunは期限があるため、待機してすぐに再送する
+                if isinstance(e, openai.RateLimitError):
+                    self.rate_limited(e)
+                else:
+                    self.pause(None)
+                delay = max(0.0, self.paused_until - time.monotonic())
+                if attempt == self.owner.submit_attempts or (
+                    expires_at is not None and time.time() + delay >= expires_at
+                ):
+                    # 送信できないまま期限を迎えるrunは諦め、シャードを新しいrunで再試行する
+                    self.retry(shard)
+                    return
+                time.sleep(delay)
+        self.wait(shard)
+
+    def collect(self, shard: Shard, tool_calls):
+        """collect_tool の呼び出しから、検証済みのQAを取り出して書き込みます。"""
+        owner = self.owner
+        for tool_call in tool_calls:
+            if tool_call.function.name != owner.collect_tool:
+                continue
+            try:
+                _, args = owner.registry.prepare(
+                    tool_call.function.name, tool_call.function.arguments
+                )
+            except Exception:
+                # 不正な引数はツールの実行時にエラーとしてアシスタントに返される
+                continue
+            payload = args.get(owner.payload_key) or []
+            if isinstance(payload, dict):
+                payload = [payload]
+            if owner.dedup is not None:
+                # インデックスの保存は、QAを出力先に書き込んでジョブを保存した後で行う
+                payload, duplicates = owner.dedup.filter(payload, flush=False)
+                self.stats.duplicates += duplicates
+            owner.sink.write_many(
+                {
+                    **qa,
+                    "source": shard.item.source,
+                    "shard": shard.index,
+                    "thread_id": shard.run.thread_id,
+                    "run_id": shard.run.id,
+                }
+                for qa in payload
+            )
+            shard.collected += len(payload)
+            self.stats.qa += len(payload)
+
+    def done(self, shard: Shard):
+        del self.in_flight[shard.index]
+        shard.status = "completed"
+        self.checkpoint(shard)
+        self.stats.shards_completed += 1
+        self.backoff = 0
+        self.limit = min(self.owner.concurrency, self.limit + 1)
+        self.top_up()
+        self.progress(shard)
+
+    def retry(self, shard: Shard):
+        self.in_flight.pop(shard.index, None)
+        if shard.remaining and shard.attempts < self.owner.max_attempts:
+            shard.status = "pending"
+            shard.tool_outputs = {}
+            self.checkpoint(shard)
+            self.stats.retries += 1
+            self.pending.append(shard)
+            return
+        shard.status = "failed" if shard.remaining else "completed"
+        self.checkpoint(shard)
+        if shard.remaining:
+            self.stats.shards_failed += 1
+        else:
+            self.stats.shards_completed += 1
+        self.top_up()
+        self.progress(shard)
+
+    def rate_limited(self, error: Optional[Exception]):
+        self.stats.rate_limited += 1
+        self.limit = max(1, self.limit // 2)
+        self.pause(retry_after(error) if error is not None else None)
+
+    def pause(self, delay: Optional[float]):
+        if delay is None:
+            delay = min(60.0, 2.0**self.backoff)
+            self.backoff += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def progress(self, shard: Shard):
+        if self.owner.on_progress is not None:
+            self.owner.on_progress(shard, self.stats)
+
+
+def _outcome(future):
+    if future.cancelled():
+        return RuntimeError("wait cancelled")
+    return future.exception() or future.result()
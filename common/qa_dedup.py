@@ -0,0 +1,384 @@
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from common.utils import file_lock, read_json, write_json_atomic
+
+# 重複判定のインデックスのデフォルトの保存先
+DEFAULT_DEDUP_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".cache",
+    "qa_dedup",
+)
+
+# インデックスの形式のバージョン（正規化やハッシュの方法を変えたら上げる）
+INDEX_VERSION = 1
+
+_MASK32 = 0xFFFFFFFF
+# n-gramが入らなかったビンを表す値（署名の値の範囲外）
+_EMPTY = 1 << 40
+# densification で距離ごとに加える値（奇数の定数）
+_ROTATION = 0x9E3779B1
+
+# 正規化で取り除く文字の種類（句読点・記号・空白・制御文字）
+_DROP_CATEGORIES = ("P", "S", "Z", "C")
+
+
+def normalize_ja(text: str) -> str:
+    """
+    日本語のテキストを重複判定用に正規化します。
+
+    NFKCで全角英数字・半角カナなどの表記を揃え、大文字と小文字を区別しないようにしたうえで、
+    句読点・記号・空白を取り除きます（「？」と「?」、「ログイン」と「ﾛｸﾞｲﾝ」などが同じになります）。
+
+    Parameters:
+    text (str): 正規化するテキスト。
+
+    Returns:
+    str: 正規化したテキスト。
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return "".join(
+        char for char in text if not unicodedata.category(char).startswith(_DROP_CATEGORIES)
+    )
+
+
+def shingles(text: str, ngram: int = 3) -> Set[str]:
+    """
+    正規化したテキストを文字n-gramの集合に変換します。
+
+    Parameters:
+    text (str): 正規化したテキスト。
+    ngram (int): n-gramの文字数。
+
+    Returns:
+    set: 文字n-gramの集合。テキストが ngram より短い（空の場合を含む）場合は空の集合。
+    """
+    return {text[i : i + ngram] for i in range(len(text) - ngram + 1)}
+
+
+class QADedupIndex:
+    """
+    MinHashとLSHで、似た質問（ほぼ重複するQA）を検出するインデックスです。
+
+    質問を normalize_ja で正規化し、文字n-gramの集合のMinHash署名を計算します。
+    署名を bands 個の帯に分けてバケットに登録し、いずれかの帯が一致したQAだけを候補として
+    署名から推定したJaccard類似度を threshold と比較するため、登録済みの件数に比例せずに判定できます。
+
+    正規化したテキストが ngram より短いQA（記号だけの質問など）は類似度を判定できないため、
+    登録も比較もせずに重複していないものとして扱い、skipped に件数を数えます。
+
+    登録したQAの署名は path のディレクトリに追記で保存し、次回はMinHashを再計算せずに読み込みます。
+    そのため、大量のQAも前回までの結果に対して増分で重複を除外できます。
+    書き込みは file_lock で保護されますが、1つのインデックスに追記するプロセスは1つにしてください。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        num_perm: int = 64,
+        bands: int = 16,
+        ngram: int = 3,
+        threshold: float = 0.7,
+        seed: int = 1,
+        field: str = "question",
+    ):
+        """
+        Parameters:
+        path (str): インデックスを保存するディレクトリ。省略時は環境変数 QA_DEDUP_PATH、
+            それもない場合はプロジェクトルートの .cache/qa_dedup を使用します。
+            空文字列の場合は保存しません（メモリ上のみ）。
+        num_perm (int): MinHash署名の長さ。bands で割り切れる必要があります。
+        bands (int): LSHの帯の数。帯が多いほど低い類似度でも候補になります
+            （候補になる類似度の目安は (1 / bands) ** (bands / num_perm)）。
+        ngram (int): 文字n-gramの文字数。
+        threshold (float): 重複とみなす推定Jaccard類似度。
+        seed (int): MinHashのハッシュ関数を生成する乱数のシード。
+        field (str): filter() で比較するQAのキー。
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = os.getenv("QA_DEDUP_PATH", DEFAULT_DEDUP_PATH) if path is None else path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.threshold = threshold
+        self.seed = seed
+        self.field = field
+        self._key = f"qa-dedup:{seed}".encode("utf-8")
+        # 登録済みのすべての署名を1つの配列に連結して保持する
+        self.signatures = array("I")
+        self.keys: List[str] = []
+        # 帯のハッシュ値 -> 登録番号（1件の場合はint、複数の場合はlist）
+        self._buckets: Dict[int, Any] = {}
+        # まだ保存していない登録の開始位置
+        self._saved = 0
+        # 正規化したテキストが短すぎるため、判定せずに通したQAの件数
+        self.skipped = 0
+        self._lock = threading.Lock()
+        if self.path:
+            self._load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # MinHash / LSH
+
+    def signature(self, text: str) -> array:
+        """
+        テキストを正規化し、MinHash署名を計算します。
+
+        n-gramごとに num_perm 個のハッシュ値を計算する代わりに、1回のハッシュ値で署名の位置（ビン）を選び、
+        ビンごとの最小値を取る one permutation hashing を使用します。
+        n-gramが入らなかったビンは、右隣（循環）の空でないビンの値に距離に応じた値を足して埋めます
+        （rotation による densification）。2つの署名の同じ位置の値が一致する確率は
+        Jaccard類似度の推定値になるため、通常のMinHashと同じように比較できます。
+        正規化したテキストが ngram より短い場合は ValueError を送出します。
+        """
+        return self._signature(normalize_ja(text))
+
+    def _indexable(self, normalized: str) -> bool:
+        return len(normalized) >= self.ngram
+
+    def _signature(self, normalized: str) -> array:
+        grams = shingles(normalized, self.ngram)
+        if not grams:
+            raise ValueError(f"text is shorter than {self.ngram} characters after normalization")
+        size = self.num_perm
+        key = self._key
+        signature = [_EMPTY] * size
+        for gram in grams:
+            value = int.from_bytes(
+                hashlib.blake2b(gram.encode("utf-8"), digest_size=8, key=key).digest(),
+                "little",
+            )
+            position = value % size
+            value >>= 32
+            if value < signature[position]:
+                signature[position] = value
+        if _EMPTY in signature:
+            # 右から左へ2周たどり、右側で最も近い空でないビンとの距離を求める（1周目は循環の準備）
+            original = signature[:]
+            nearest, distance = 0, 0
+            for index in range(2 * size - 1, -1, -1):
+                position = index % size
+                if original[position] != _EMPTY:
+                    nearest, distance = original[position], 0
+                else:
+                    distance += 1
+                    if index < size:
+                        signature[position] = (nearest + distance * _ROTATION) & _MASK32
+        return array("I", signature)
+
+    def _band_keys(self, signature) -> List[int]:
+        rows = self.rows
+        return [
+            hash((band, *signature[band * rows : (band + 1) * rows]))
+            for band in range(self.bands)
+        ]
+
+    def similarity(self, signature, index: int) -> float:
+        """署名と登録済みのQAの推定Jaccard類似度を返します。"""
+        start = index * self.num_perm
+        other = self.signatures[start : start + self.num_perm]
+        return sum(1 for x, y in zip(signature, other) if x == y) / self.num_perm
+
+    def _match(self, signature, band_keys) -> Optional[int]:
+        seen = set()
+        for key in band_keys:
+            entry = self._buckets.get(key)
+            if entry is None:
+                continue
+            for index in entry if isinstance(entry, list) else (entry,):
+                if index in seen:
+                    continue
+                seen.add(index)
+                if self.similarity(signature, index) >= self.threshold:
+                    return index
+        return None
+
+    def _insert(self, signature, band_keys, key: str):
+        index = len(self.keys)
+        self.signatures.extend(signature)
+        self.keys.append(key)
+        buckets = self._buckets
+        for band_key in band_keys:
+            entry = buckets.get(band_key)
+            if entry is None:
+                buckets[band_key] = index
+            elif isinstance(entry, list):
+                entry.append(index)
+            else:
+                buckets[band_key] = [entry, index]
+
+    def find(self, text: str) -> Optional[str]:
+        """
+        テキストとほぼ重複する登録済みのQAを探します。
+
+        Parameters:
+        text (str): 比較するテキスト。
+
+        Returns:
+        Optional[str]: 重複する登録済みのQAのキー（テキスト）。見つからない場合や、
+            正規化したテキストが短すぎて判定できない場合はNone。
+        """
+        normalized = normalize_ja(text)
+        if not self._indexable(normalized):
+            return None
+        signature = self._signature(normalized)
+        with self._lock:
+            index = self._match(signature, self._band_keys(signature))
+            return None if index is None else self.keys[index]
+
+    def add(self, text: str) -> bool:
+        """
+        テキストがほぼ重複するQAでなければ登録します。
+        正規化したテキストが短すぎて判定できない場合は、登録せずにTrueを返します（skipped に数えます）。
+
+        Parameters:
+        text (str): 登録するテキスト。
+
+        Returns:
+        bool: 登録した場合（または判定できない場合）はTrue、重複していた場合はFalse。
+        """
+        normalized = normalize_ja(text)
+        if not self._indexable(normalized):
+            with self._lock:
+                self.skipped += 1
+            return True
+        signature = self._signature(normalized)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            if self._match(signature, band_keys) is not None:
+                return False
+            self._insert(signature, band_keys, text)
+            return True
+
+    def filter(
+        self, qa_data: Iterable[Dict[str, Any]], flush: bool = True
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        QAのリストから、登録済みのQAや同じリスト内の前のQAとほぼ重複するものを除外し、残りを登録します。
+        field の値が空や短すぎるQAは判定できないため、除外も登録もせずに残します（skipped に数えます）。
+
+        Parameters:
+        qa_data (list): QAの辞書のリスト。field のキーの値を比較します。
+        flush (bool): 登録したQAをすぐに保存する場合はTrue。Falseの場合は、重複しなかったQAを
+            出力先に書き込んだ後で flush() を呼び出してください（書き込む前に中断された場合に、
+            再実行したQAが保存済みの登録と重複して失われないようにするため）。
+
+        Returns:
+        tuple: (重複していないQAのリスト, 除外した件数)
+        """
+        unique = []
+        duplicates = 0
+        for qa in qa_data:
+            if self.add(str(qa.get(self.field, ""))):
+                unique.append(qa)
+            else:
+                duplicates += 1
+        if flush:
+            self.flush()
+        return unique, duplicates
+
+    # ------------------------------------------------------------------
+    # 保存と読み込み
+
+    def _files(self) -> Tuple[str, str, str]:
+        return (
+            os.path.join(self.path, "meta.json"),
+            os.path.join(self.path, "signatures.bin"),
+            os.path.join(self.path, "keys.jsonl"),
+        )
+
+    def _meta(self) -> Dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "ngram": self.ngram,
+            "seed": self.seed,
+        }
+
+    def _load(self):
+        meta_path, signatures_path, keys_path = self._files()
+        with file_lock(os.path.join(self.path, ".lock"), shared=True):
+            meta = read_json(meta_path)
+            if meta is None:
+                return
+            if meta != self._meta():
+                raise ValueError(
+                    f"dedup index at {self.path} was built with different parameters: {meta}"
+                )
+            signatures = array("I")
+            data = b""
+            if os.path.exists(signatures_path):
+                with open(signatures_path, "rb") as file:
+                    data = file.read()
+            keys = []
+            if os.path.exists(keys_path):
+                with open(keys_path, "r", encoding="utf-8") as file:
+                    for line in file:
+                        if not line.endswith("\n"):
+                            # 書き込みの途中で中断された行
+                            break
+                        keys.append(json.loads(line))
+        # 署名とキーの両方が揃っている件数だけを読み込む
+        count = min(len(keys), len(data) // (self.num_perm * signatures.itemsize))
+        signatures.frombytes(data[: count * self.num_perm * signatures.itemsize])
+        for index in range(count):
+            signature = signatures[index * self.num_perm : (index + 1) * self.num_perm]
+            self._insert(signature, self._band_keys(signature), keys[index])
+        self._saved = count
+        if count < len(keys) or len(data) != count * self.num_perm * signatures.itemsize:
+            self._truncate(count)
+
+    def _truncate(self, count: int):
+        """中断された書き込みで余分になった末尾を取り除きます。"""
+        _, signatures_path, keys_path = self._files()
+        with file_lock(os.path.join(self.path, ".lock")):
+            if os.path.exists(signatures_path):
+                with open(signatures_path, "r+b") as file:
+                    file.truncate(count * self.num_perm * self.signatures.itemsize)
+            if os.path.exists(keys_path):
+                with open(keys_path, "r+b") as file:
+                    offset = 0
+                    for _ in range(count):
+                        offset += len(file.readline())
+                    file.truncate(offset)
+
+    def flush(self):
+        """まだ保存していない登録をファイルに追記します。"""
+        if not self.path:
+            return
+        with self._lock:
+            start = self._saved
+            end = len(self.keys)
+            if start == end:
+                return
+            signatures = self.signatures[start * self.num_perm : end * self.num_perm]
+            lines = "".join(
+                json.dumps(key, ensure_ascii=False) + "\n" for key in self.keys[start:end]
+            )
+            meta_path, signatures_path, keys_path = self._files()
+            with file_lock(os.path.join(self.path, ".lock")):
+                if not os.path.exists(meta_path):
+                    write_json_atomic(meta_path, self._meta())
+                # 署名を先に書き込む（読み込み時は両方が揃った件数だけを使う）
+                with open(signatures_path, "ab") as file:
+                    signatures.tofile(file)
+                with open(keys_path, "a", encoding="utf-8") as file:
+                    file.write(lines)
+            self._saved = end
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import time
+from typing import NamedTuple
+
+import openai
+
+from common.utils import file_lock, read_json, write_json_atomic
+
+# レジストリファイルのデフォルトの保存先
+DEFAULT_REGISTRY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".cache",
+    "assistant_registry.json",
+)
+
+
+class RegistryEntry(NamedTuple):
+    """レジストリに登録されたアシスタントまたはスレッドのエントリです。"""
+
+    id: str
+    key: str
+    created_at: float
+
+
+def content_key(kind, **params):
+    """
+    作成パラメータの内容からハッシュキーを計算します。
+    パラメータが同じであれば、プロセスやマシンが異なっても同じキーになります。
+
+    Parameters:
+    kind (str): "assistant" や "thread" などの種類。
+    **params: 作成時のパラメータ。
+
+    Returns:
+    str: SHA-256のハッシュ値（16進数文字列）。
+    """
+    payload = json.dumps(
+        {"kind": kind, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AssistantRegistry:
+    """
+    アシスタントとスレッドのIDを作成パラメータのハッシュで管理するレジストリです。
+    複数のサーバーワーカーや再起動をまたいで同じアシスタントを再利用し、
+    登録済みであればネットワーク通信なしでIDを返します。
+    ファイルへの書き込みはfcntlのロックで保護されるため、複数プロセスから同時に使用できます。
+    """
+
+    def __init__(self, path=None):
+        """
+        Parameters:
+        path (str): レジストリファイルのパス。省略時は環境変数 ASSISTANT_REGISTRY_PATH、
+            それもない場合はプロジェクトルートの .cache/assistant_registry.json を使用します。
+        """
+        self.path = path or os.getenv("ASSISTANT_REGISTRY_PATH", DEFAULT_REGISTRY_PATH)
+        self.lock_path = self.path + ".lock"
+
+    def _load(self):
+        return read_json(self.path, default={})
+
+    def lookup(self, key):
+        """
+        キーに対応するエントリを返します。ネットワーク通信は行いません。
+
+        Parameters:
+        key (str): content_key で計算したキー。
+
+        Returns:
+        Optional[RegistryEntry]: 登録済みのエントリ。未登録の場合はNone。
+        """
+        record = self._load().get(key)
+        if record is None:
+            return None
+        return RegistryEntry(id=record["id"], key=key, created_at=record["created_at"])
+
+    def get_or_create(self, key, create, verify=None):
+        """
+        キーに対応するエントリを返し、未登録の場合は create を呼び出して登録します。
+        作成はロックを保持したまま行うため、同時に起動した複数のワーカーが
+        重複してリソースを作成することはありません。
+        verify を指定した場合は登録済みのIDが存在するか確認し、削除されていた（NotFoundError）場合は
+        エントリを破棄して作成し直します。
+
+        Parameters:
+        key (str): content_key で計算したキー。
+        create (Callable[[], str]): リソースを作成してIDを返す関数。
+        verify (Callable[[str], object]): IDのリソースを取得する関数（retrieve など）。
+            省略時は確認せず、登録済みのIDをネットワーク通信なしで返します。
+
+        Returns:
+        RegistryEntry: 登録済みまたは新規作成したエントリ。
+        """
+        # ロックなしで確認し、登録済みであればそのまま返す
+        entry = self.lookup(key)
+        stale_id = None
+        if entry is not None:
+            if verify is None or self._exists(verify, entry.id):
+                return entry
+            print(f"登録済みのID {entry.id} が見つからないため、作成し直します。")
+            stale_id = entry.id
+
+        with file_lock(self.lock_path):
+            # ロック取得までの間に他のプロセスが登録（作成し直し）した可能性があるため再確認する
+            records = self._load()
+            record = records.get(key)
+            if record is None or record["id"] == stale_id:
+                record = {"id": create(), "created_at": time.time()}
+                records[key] = record
+                write_json_atomic(self.path, records)
+        return RegistryEntry(id=record["id"], key=key, created_at=record["created_at"])
+
+    @staticmethod
+    def _exists(verify, resource_id):
+        try:
+            verify(resource_id)
+        except openai.NotFoundError:
+            return False
+        return True
+
+    def forget(self, key):
+        """
+        キーに対応するエントリを削除します。リモートのリソースは削除しません。
+
+        Parameters:
+        key (str): 削除するエントリのキー。
+
+        Returns:
+        Optional[RegistryEntry]: 削除したエントリ。未登録の場合はNone。
+        """
+        with file_lock(self.lock_path):
+            records = self._load()
+            record = records.pop(key, None)
+            if record is not None:
+                write_json_atomic(self.path, records)
+        if record is None:
+            return None
+        return RegistryEntry(id=record["id"], key=key, created_at=record["created_at"])
+
+    def assistant(self, client, verify=False, **params):
+        """
+        作成パラメータが同じアシスタントを再利用し、未登録の場合は作成します。
+
+        Parameters:
+        client (OpenAI): OpenAIクライアント。
+        verify (bool): Trueの場合は登録済みのアシスタントを取得して存在を確認し、
+            削除されていた場合は作成し直します。
+        **params: client.beta.assistants.create に渡すパラメータ（name, instructions, tools, modelなど）。
+
+        Returns:
+        RegistryEntry: アシスタントのエントリ。IDは entry.id で参照できます。
+        """
+        return self.get_or_create(
+            content_key("assistant", **params),
+            lambda: client.beta.assistants.create(**params).id,
+            verify=client.beta.assistants.retrieve if verify else None,
+        )
+
+    def thread(self, client, name, verify=False, **params):
+        """
+        名前と作成パラメータが同じスレッドを再利用し、未登録の場合は作成します。
+
+        Parameters:
+        client (OpenAI): OpenAIクライアント。
+        name (str): スレッドを識別する名前。
+        verify (bool): Trueの場合は登録済みのスレッドを取得して存在を確認し、
+            削除されていた場合は作成し直します。
+        **params: client.beta.threads.create に渡すパラメータ。
+
+        Returns:
+        RegistryEntry: スレッドのエントリ。IDは entry.id で参照できます。
+        """
+        return self.get_or_create(
+            content_key("thread", name=name, **params),
+            lambda: client.beta.threads.create(**params).id,
+            verify=client.beta.threads.retrieve if verify else None,
+        )
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+import anyio
+from openai import OpenAIError
+
+# キューの上限と、満杯のときの方針（block: 空くまで待つ / drop: 差分を捨てる）
+RELAY_QUEUE_SIZE = int(os.getenv("RELAY_QUEUE_SIZE", "256"))
+RELAY_QUEUE_POLICY = os.getenv("RELAY_QUEUE_POLICY", "block")
+
+POLICIES = ("block", "drop")
+
+# キャンセルする必要のないrunのステータス
+FINAL_RUN_STATUSES = {"cancelling", "cancelled", "completed", "failed", "expired", "incomplete"}
+
+
+class RelayClosed(Exception):
+    """受信側（クライアント）が切断され、キューが閉じられたことを表す例外です。"""
+
+
+def _check_policy(policy: str) -> str:
+    if policy not in POLICIES:
+        raise ValueError(f"policy must be one of {POLICIES}: {policy!r}")
+    return policy
+
+
+class RelayQueue(queue.Queue):
+    """
+    ストリームのイベントをスレッド間で受け渡す、上限付きで閉じることのできるキューです。
+
+    受信側が切断したら close() を呼び出します。閉じた後の publish() と、
+    待機中の put()・get() は RelayClosed を送出するため、送信側のスレッドはすぐに終了できます。
+    """
+
+    def __init__(self, maxsize: Optional[int] = None, policy: Optional[str] = None):
+        """
+        Parameters:
+        maxsize (int): キューの上限。省略時は環境変数 RELAY_QUEUE_SIZE（既定: 256）。
+        policy (str): 満杯のときの方針。"block" は空くまで待ち、"drop" は差分を捨てます。
+            省略時は環境変数 RELAY_QUEUE_POLICY（既定: block）。
+        """
+        super().__init__(RELAY_QUEUE_SIZE if maxsize is None else maxsize)
+        self.policy = _check_policy(policy or RELAY_QUEUE_POLICY)
+        self.closed = False
+        self.dropped = 0
+
+    def close(self):
+        """キューを閉じ、待機中の送信側と受信側を起こします。"""
+        with self.mutex:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    def publish(self, item):
+        """
+        方針に従って差分をキューに追加します。
+
+        Raises:
+        RelayClosed: キューが閉じられている場合。
+        """
+        if self.closed:
+            raise RelayClosed()
+        if self.policy == "drop":
+            try:
+                self.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self.put(item)
+
+    def finish(self, item):
+        """
+        終了を表すマーカーを追加します。受信側が残りを読むまで待ちますが、閉じられている場合は何もしません。
+        """
+        try:
+            self.put(item)
+        except RelayClosed:
+            pass
+
+    def put(self, item, block=True, timeout=None):
+        with self.not_full:
+            if self.maxsize > 0:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._qsize() >= self.maxsize:
+                    if self.closed:
+                        raise RelayClosed()
+                    if not block:
+                        raise queue.Full
+                    if deadline is None:
+                        self.not_full.wait()
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise queue.Full
+                        self.not_full.wait(remaining)
+            if self.closed:
+                raise RelayClosed()
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        with self.not_empty:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._qsize():
+                if self.closed:
+                    raise RelayClosed()
+                if not block:
+                    raise queue.Empty
+                if deadline is None:
+                    self.not_empty.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.not_empty.wait(remaining)
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+
+class AsyncRelayQueue(asyncio.Queue):
+    """
+    RelayQueue の asyncio 版です。イベントループ上の送信側と受信側で使用します。
+    閉じた後の publish() と、待機中の put()・get() は RelayClosed を送出します。
+    """
+
+    def __init__(self, maxsize: Optional[int] = None, policy: Optional[str] = None):
+        super().__init__(RELAY_QUEUE_SIZE if maxsize is None else maxsize)
+        self.policy = _check_policy(policy or RELAY_QUEUE_POLICY)
+        self.closed = False
+        self.dropped = 0
+
+    def close(self):
+        """キューを閉じ、待機中の送信側と受信側を起こします。"""
+        if self.closed:
+            return
+        self.closed = True
+        # asyncio.Queue は待機中の put()・get() を _putters・_getters のFutureで管理している
+        for waiter in (*self._putters, *self._getters):
+            if not waiter.done():
+                waiter.set_exception(RelayClosed())
+
+    async def put(self, item):
+        if self.closed:
+            raise RelayClosed()
+        await super().put(item)
+
+    async def get(self):
+        if self.closed and self.empty():
+            raise RelayClosed()
+        return await super().get()
+
+    async def publish(self, item):
+        """
+        方針に従って差分をキューに追加します。
+
+        Raises:
+        RelayClosed: キューが閉じられている場合。
+        """
+        if self.closed:
+            raise RelayClosed()
+        if self.policy == "drop":
+            try:
+                self.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+        else:
+            await self.put(item)
+
+    async def finish(self, item):
+        """終了を表すマーカーを追加します。閉じられている場合（待機中に閉じられた場合を含む）は何もしません。"""
+        try:
+            await self.put(item)
+        except RelayClosed:
+            pass
+
+
+async def aiter_in_thread(iterator: Iterator[Any], on_close: Callable[[], None]) -> AsyncIterator[Any]:
+    """
+    ブロッキングするイテレーターをスレッドプールで1件ずつ読み出す非同期ジェネレーターです。
+    クライアントの切断でキャンセルされた場合も、ワーカースレッドの終了を待たずに on_close を呼び出し、
+    イテレーターが close() を持つ場合（ジェネレーターなど）は読み出し中の next() が終わってから閉じます。
+
+    Parameters:
+    iterator (Iterator): 読み出すイテレーター。
+    on_close (Callable): 読み出しが終了・中断したときに呼び出す関数。
+
+    Yields:
+    イテレーターの要素。
+    """
+    done = object()
+    # ワーカースレッドで実行中の next() と close() が重ならないようにするロック
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            return next(iterator, done)
+
+    try:
+        while True:
+            item = await anyio.to_thread.run_sync(step, cancellable=True)
+            if item is done:
+                break
+            yield item
+    finally:
+        on_close()
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            # ジェネレーターを閉じて、with で開いたストリームなどを解放する。
+            # 中断された next() がまだ実行中の場合は、別スレッドでその終了を待ってから閉じる
+            if lock.acquire(blocking=False):
+                try:
+                    _close_iterator(close)
+                finally:
+                    lock.release()
+            else:
+                threading.Thread(target=_close_when_idle, args=(close, lock), daemon=True).start()
+
+
+def _close_iterator(close: Callable[[], None]):
+    try:
+        close()
+    except Exception as e:
+        print(f"イテレーターの終了処理に失敗しました: {e}")
+
+
+def _close_when_idle(close: Callable[[], None], lock: threading.Lock):
+    with lock:
+        _close_iterator(close)
+
+
+def cancel_run(client, run) -> bool:
+    """
+    runが終了していなければキャンセルします。すでに終了している場合のエラーは無視します。
+
+    Parameters:
+    client (OpenAI): OpenAIクライアント。
+    run (Run): キャンセルするrun。Noneの場合は何もしません。
+
+    Returns:
+    bool: キャンセルを要求した場合はTrue。
+    """
+    if run is None or run.status in FINAL_RUN_STATUSES:
+        return False
+    try:
+        client.beta.threads.runs.cancel(thread_id=run.thread_id, run_id=run.id)
+    except OpenAIError as e:
+        print(f"runのキャンセルに失敗しました: {e}")
+        return False
+    return True
+
+
+def cancel_run_in_background(client, run):
+    """
+    cancel_run を別スレッドで実行します。イベントループやキャンセル処理中の finally から呼び出せます。
+
+    Parameters:
+    client (OpenAI): OpenAIクライアント。
+    run (Run): キャンセルするrun。
+    """
+    if run is None or run.status in FINAL_RUN_STATUSES:
+        return
+    threading.Thread(target=cancel_run, args=(client, run), daemon=True).start()
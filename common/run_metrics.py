@@ -0,0 +1,435 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from openai import AssistantEventHandler, AsyncAssistantEventHandler
+
+# 1回のrunの計測値をJSON Linesで追記するファイル（未設定の場合は書き込まない）
+RUN_METRICS_PATH_ENV = "RUN_METRICS_PATH"
+
+# Prometheus のテキスト形式のContent-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+GAP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+FINAL_STATUSES = {
+    "thread.run.completed": "completed",
+    "thread.run.failed": "failed",
+    "thread.run.cancelled": "cancelled",
+    "thread.run.expired": "expired",
+    "thread.run.incomplete": "incomplete",
+}
+_FINAL_STATUS_VALUES = frozenset(FINAL_STATUSES.values())
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Histogram:
+    """Prometheus 形式で出力できる累積ヒストグラムです。"""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class Counter:
+    """ラベルごとに値を持つ Prometheus 形式のカウンターです。"""
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, label_value: str = ""):
+        with self._lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self.values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_value, value in values:
+            if self.label:
+                lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+            else:
+                lines.append(f"{self.name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """runの計測値を集計し、Prometheus のテキスト形式で出力します。"""
+
+    def __init__(self, prefix: str = "assistant_run"):
+        self.runs = Counter(f"{prefix}s_total", "Finished runs by status.", "status")
+        self.tokens = Counter(f"{prefix}_tokens_total", "Streamed text deltas.")
+        self.run_created = Histogram(
+            f"{prefix}_created_seconds",
+            "Time from starting the stream to thread.run.created.",
+            LATENCY_BUCKETS,
+        )
+        self.ttft = Histogram(
+            f"{prefix}_first_token_seconds",
+            "Time from starting the stream to the first text delta.",
+            LATENCY_BUCKETS,
+        )
+        self.gap = Histogram(
+            f"{prefix}_inter_token_gap_seconds",
+            "Time between consecutive text deltas.",
+            GAP_BUCKETS,
+        )
+        self.tool_round_trip = Histogram(
+            f"{prefix}_tool_round_trip_seconds",
+            "Time from a function tool call being created to its output being submitted.",
+            LATENCY_BUCKETS,
+        )
+        self.code_interpreter = Histogram(
+            f"{prefix}_code_interpreter_seconds",
+            "Time from the last code_interpreter input to its output.",
+            LATENCY_BUCKETS,
+        )
+        self.duration = Histogram(
+            f"{prefix}_duration_seconds", "Total duration of a streamed run.", LATENCY_BUCKETS
+        )
+        self.tokens_per_second = Histogram(
+            f"{prefix}_tokens_per_second", "Text deltas per second over the run.", RATE_BUCKETS
+        )
+
+    def observe(self, timer: "RunTimer", result: dict):
+        """1回のrunの計測値を集計に加えます。"""
+        self.runs.inc(label_value=result["status"])
+        self.tokens.inc(result["tokens"])
+        for histogram, key in (
+            (self.run_created, "time_to_run_created"),
+            (self.ttft, "ttft"),
+            (self.duration, "duration"),
+            (self.tokens_per_second, "tokens_per_second"),
+        ):
+            if result[key] is not None:
+                histogram.observe(result[key])
+        for gap in timer.gaps:
+            self.gap.observe(gap)
+        for seconds in result["tool_round_trips"]:
+            self.tool_round_trip.observe(seconds)
+        for seconds in result["code_interpreter_seconds"]:
+            self.code_interpreter.observe(seconds)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (
+            self.runs,
+            self.tokens,
+            self.run_created,
+            self.ttft,
+            self.gap,
+            self.tool_round_trip,
+            self.code_interpreter,
+            self.duration,
+            self.tokens_per_second,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+_log_lock = threading.Lock()
+
+
+def render_metrics() -> str:
+    """プロセス内で集計したrunの計測値を Prometheus のテキスト形式で返します。"""
+    return registry.render()
+
+
+def write_jsonl(result: dict, path: Optional[str] = None):
+    """
+    1回のrunの計測値をJSON Linesのファイルに追記します。
+
+    Parameters:
+    result (dict): RunTimer.result() の戻り値。
+    path (str): 追記するファイル。省略時は環境変数 RUN_METRICS_PATH。未設定の場合は何もしません。
+    """
+    path = path or os.getenv(RUN_METRICS_PATH_ENV)
+    if not path:
+        return
+    line = json.dumps(result, ensure_ascii=False)
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+class RunTimer:
+    """
+    ストリーミングのイベントから、1回のrunの各段階にかかった時間を計測します。
+    時間はすべてタイマーの作成（ストリームの開始）からの経過秒数で記録します。
+
+    テキストの差分（thread.message.delta）1件を1トークンとして数えます。
+    ツール出力の送信は tool_outputs_submitted() で記録します。submit_tool_outputs_stream の
+    ハンドラーに同じタイマーを渡すと、ツールの実行後の応答も同じrunとして計測されます。
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started_at = clock()
+        self.started_wall = time.time()
+        self.run_id: Optional[str] = None
+        self.thread_id: Optional[str] = None
+        self.status: Optional[str] = None
+        self.run_created_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        self.tokens = 0
+        self.gaps: List[float] = []
+        self.tool_round_trips: List[float] = []
+        self.code_interpreter_seconds: List[float] = []
+        self._pending_tools: Dict[str, float] = {}
+        self._code_inputs: Dict[Tuple[str, int], float] = {}
+        # 最終ステータスを受け取る前にストリームが終了した理由（"error"・"timeout"・"cancelled"）
+        self.aborted: Optional[str] = None
+        self._finished: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def on_event(self, event):
+        """
+        イベントハンドラーの on_event から呼び出します。
+
+        Parameters:
+        event (AssistantStreamEvent): SDKから受け取ったイベント。
+        """
+        now = self.clock()
+        name = event.event
+        if name == "thread.message.delta":
+            for content in event.data.delta.content or ():
+                if content.type == "text" and content.text and content.text.value:
+                    self._on_token(now)
+        elif name == "thread.run.step.delta":
+            details = event.data.delta.step_details
+            if details is not None and details.type == "tool_calls":
+                for tool_call in details.tool_calls or ():
+                    self._on_tool_call_delta(event.data.id, tool_call, now)
+        elif name == "thread.run.step.completed":
+            details = event.data.step_details
+            if details.type == "tool_calls":
+                for index, tool_call in enumerate(details.tool_calls):
+                    if tool_call.type == "code_interpreter":
+                        self._on_code_output(event.data.id, index, now)
+        elif name == "thread.run.created":
+            if self.run_created_at is None:
+                self.run_created_at = now
+            self.run_id = event.data.id
+            self.thread_id = event.data.thread_id
+        elif name == "thread.run.requires_action":
+            self.status = "requires_action"
+            action = event.data.required_action
+            for tool_call in action.submit_tool_outputs.tool_calls:
+                self._pending_tools.setdefault(tool_call.id, now)
+        elif name in FINAL_STATUSES:
+            self.status = FINAL_STATUSES[name]
+
+    def _on_token(self, now: float):
+        if self.first_token_at is None:
+            self.first_token_at = now
+        else:
+            self.gaps.append(now - self.last_token_at)  # type: ignore
+        self.last_token_at = now
+        self.tokens += 1
+
+    def _on_tool_call_delta(self, step_id: str, tool_call, now: float):
+        if tool_call.type == "code_interpreter":
+            code = tool_call.code_interpreter
+            if code is None:
+                return
+            if code.input:
+                # 入力の最後の差分から出力までを実行時間とする
+                self._code_inputs[(step_id, tool_call.index)] = now
+            if code.outputs:
+                self._on_code_output(step_id, tool_call.index, now)
+        elif tool_call.type == "function" and tool_call.id:
+            self._pending_tools.setdefault(tool_call.id, now)
+
+    def _on_code_output(self, step_id: str, index: int, now: float):
+        started = self._code_inputs.pop((step_id, index), None)
+        if started is not None:
+            self.code_interpreter_seconds.append(now - started)
+
+    def tool_outputs_submitted(self):
+        """ツールの出力を送信する直前に呼び出し、ツール呼び出しの作成からの時間を記録します。"""
+        now = self.clock()
+        for created in self._pending_tools.values():
+            self.tool_round_trips.append(now - created)
+        self._pending_tools.clear()
+
+    def abort(self, reason: str):
+        """
+        ストリームが例外やキャンセルで終了したことを記録します。
+        runの最終ステータスを受け取っていない場合は、reason をステータスとして記録します。
+
+        Parameters:
+        reason (str): "error"・"timeout"・"cancelled" のいずれか。最初に記録した理由を優先します。
+        """
+        if self.aborted is None:
+            self.aborted = reason
+
+    def _status(self) -> str:
+        if self.status in _FINAL_STATUS_VALUES:
+            return self.status  # type: ignore
+        return self.aborted or self.status or "incomplete"
+
+    def _since_start(self, at: Optional[float]) -> Optional[float]:
+        return None if at is None else at - self.started_at
+
+    def result(self) -> dict:
+        """現在までの計測値を辞書で返します。"""
+        duration = self.clock() - self.started_at
+        gaps = sorted(self.gaps)
+        gap_summary = None
+        if gaps:
+            counts = [0] * (len(GAP_BUCKETS) + 1)
+            for gap in gaps:
+                counts[bisect_left(GAP_BUCKETS, gap)] += 1
+            gap_summary = {
+                "count": len(gaps),
+                "p50": _percentile(gaps, 0.50),
+                "p90": _percentile(gaps, 0.90),
+                "p99": _percentile(gaps, 0.99),
+                "max": gaps[-1],
+                "histogram": [
+                    [str(bound), n] for bound, n in zip(GAP_BUCKETS + ("+Inf",), counts)
+                ],
+            }
+        return {
+            "started_at": self.started_wall,
+            "run_id": self.run_id,
+            "thread_id": self.thread_id,
+            "status": self._status(),
+            "time_to_run_created": self._since_start(self.run_created_at),
+            "ttft": self._since_start(self.first_token_at),
+            "duration": duration,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens / duration if self.tokens and duration > 0 else None,
+            "inter_token_gap": gap_summary,
+            "tool_round_trips": list(self.tool_round_trips),
+            "code_interpreter_seconds": list(self.code_interpreter_seconds),
+        }
+
+    def finish(self, log_path: Optional[str] = None) -> dict:
+        """
+        計測を終了し、プロセス内の集計（/metrics）とJSON Linesのファイルに記録します。
+        2回目以降の呼び出しでは記録せずに最初の結果を返します。
+
+        Parameters:
+        log_path (str): 追記するファイル。省略時は環境変数 RUN_METRICS_PATH。
+
+        Returns:
+        dict: 計測値。
+        """
+        with self._lock:
+            if self._finished is not None:
+                return self._finished
+            self._finished = self.result()
+        registry.observe(self, self._finished)
+        write_jsonl(self._finished, log_path)
+        return self._finished
+
+
+def _interrupted() -> bool:
+    """
+    finally の中で呼び出し、処理中の例外がキャンセル（CancelledError）やジェネレーターの終了
+    （クライアントの切断で閉じられた場合の GeneratorExit）など、Exception 以外で終了しているかを返します。
+    """
+    error = sys.exc_info()[1]
+    return error is not None and not isinstance(error, Exception)
+
+
+class TimedEventHandler(AssistantEventHandler):
+    """
+    すべてのイベントを RunTimer に渡すイベントハンドラーです。
+    ストリームが例外・タイムアウト・キャンセルで終了した場合は、タイマーに "error"・"timeout"・
+    "cancelled" を記録してから終了します。
+    on_event・on_exception・on_timeout・on_end をオーバーライドする場合は super() を呼び出してください。
+    """
+
+    def __init__(self, timer: Optional[RunTimer] = None):
+        """
+        Parameters:
+        timer (RunTimer): 共有するタイマー。省略時は新しく作成し、ストリームの終了時に記録します。
+            指定した場合は、タイマーを作成した側が finish() を呼び出します。
+        """
+        super().__init__()
+        self.timer = timer or RunTimer()
+        self._owns_timer = timer is None
+
+    def on_event(self, event) -> None:
+        self.timer.on_event(event)
+
+    def on_timeout(self) -> None:
+        self.timer.abort("timeout")
+
+    def on_exception(self, exception: Exception) -> None:
+        self.timer.abort("error")
+
+    def on_end(self) -> None:
+        # SDKはストリームの finally から on_end を呼び出す
+        if _interrupted():
+            self.timer.abort("cancelled")
+        if self._owns_timer:
+            self.timer.finish()
+
+
+class AsyncTimedEventHandler(AsyncAssistantEventHandler):
+    """TimedEventHandler の非同期版です。"""
+
+    def __init__(self, timer: Optional[RunTimer] = None):
+        super().__init__()
+        self.timer = timer or RunTimer()
+        self._owns_timer = timer is None
+
+    async def on_event(self, event) -> None:
+        self.timer.on_event(event)
+
+    async def on_timeout(self) -> None:
+        self.timer.abort("timeout")
+
+    async def on_exception(self, exception: Exception) -> None:
+        self.timer.abort("error")
+
+    async def on_end(self) -> None:
+        if _interrupted():
+            self.timer.abort("cancelled")
+        if self._owns_timer:
+            self.timer.finish()
@@ -0,0 +1,270 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import openai
+
+# 待機を終了するrunのステータス
+RESOLVED_STATUSES = frozenset(
+    ["completed", "requires_action", "failed", "expired", "cancelled", "incomplete"]
+)
+
+# リトライしてポーリングを続けるエラー
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class _Entry:
+    __slots__ = ("thread_id", "run_id", "future", "started_at", "deadline", "errors")
+
+    def __init__(self, thread_id, run_id, future, started_at, deadline):
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.future = future
+        self.started_at = started_at
+        self.deadline = deadline
+        self.errors = 0
+
+
+class RunWaiter:
+    """
+    複数のrunの完了を1つのスケジュールでまとめて待機するクラスです。
+
+    バックグラウンドのスレッドが各runの次回ポーリング時刻をヒープで管理し、
+    期限が来たrunだけをまとめて取得します。ポーリング間隔はrunの経過時間に応じて伸び、
+    上限で頭打ちになります。また、ジッターを加えて多数のrunのリクエストが同時に集中しないようにします。
+    runが完了・失敗・requires_action などのステータスになると、Futureを解決してコールバックを呼び出します。
+    """
+
+    def __init__(
+        self,
+        client,
+        min_interval: float = 1.0,
+        max_interval: float = 8.0,
+        growth: float = 0.5,
+        jitter: float = 0.2,
+        max_workers: int = 8,
+    ):
+        """
+        Parameters:
+        client (OpenAI): OpenAIクライアント。
+        min_interval (float): ポーリング間隔の最小値（秒）。
+        max_interval (float): ポーリング間隔の最大値（秒）。
+        growth (float): runの経過時間に対するポーリング間隔の比率。
+            例えば0.5の場合、開始から8秒経過したrunは約4秒間隔でポーリングします。
+        jitter (float): ポーリング間隔に加える揺らぎの割合（0〜1）。
+        max_workers (int): 同時に実行するrunの取得リクエストの最大数。
+        """
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.growth = growth
+        self.jitter = jitter
+        # 統計情報（runの取得リクエスト数と解決したrun数）
+        self.api_calls = 0
+        self.resolved = 0
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="run-waiter"
+        )
+        self._thread = threading.Thread(
+            target=self._loop, name="run-waiter-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(
+        self,
+        thread_id: str,
+        run_id: str,
+        callback: Optional[Callable] = None,
+        timeout: Optional[float] = None,
+    ) -> Future:
+        """
+        runを待機対象に追加します。
+
+        Parameters:
+        thread_id (str): スレッドのID。
+        run_id (str): runのID。
+        callback (Callable): runが解決したときに、Runオブジェクトを引数として呼び出す関数。
+        timeout (float): 待機の最大時間（秒）。超過した場合、FutureはTimeoutErrorで失敗します。
+
+        Returns:
+        Future: 解決したRunオブジェクトを結果とするFuture。
+        """
+        future: Future = Future()
+        if callback is not None:
+
+            def on_done(f):
+                if not f.cancelled() and f.exception() is None:
+                    callback(f.result())
+
+            future.add_done_callback(on_done)
+        now = time.monotonic()
+        deadline = now + timeout if timeout is not None else None
+        entry = _Entry(thread_id, run_id, future, now, deadline)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("RunWaiter is closed")
+            # 最初のポーリングは最小間隔の後に行う
+            self._schedule(entry, now + self.min_interval)
+        return future
+
+    def wait(self, thread_id: str, run_id: str, timeout: Optional[float] = None):
+        """
+        runが解決するまでブロックして待機します。
+
+        Parameters:
+        thread_id (str): スレッドのID。
+        run_id (str): runのID。
+        timeout (float): 待機の最大時間（秒）。
+
+        Returns:
+        Run: 解決したRunオブジェクト。
+        """
+        return self.submit(thread_id, run_id, timeout=timeout).result()
+
+    def close(self):
+        """待機中のrunをすべてキャンセルし、バックグラウンドのスレッドを停止します。"""
+        with self._cond:
+            self._closed = True
+            entries = [entry for _, _, entry in self._heap]
+            self._heap.clear()
+            self._cond.notify()
+        for entry in entries:
+            entry.future.cancel()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def interval(self, age: float) -> float:
+        """
+        runの経過時間から次のポーリングまでの間隔を計算します。
+
+        Parameters:
+        age (float): runの待機を開始してからの経過時間（秒）。
+
+        Returns:
+        float: ジッターを加えたポーリング間隔（秒）。
+        """
+        base = min(self.max_interval, max(self.min_interval, age * self.growth))
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule(self, entry, at):
+        heapq.heappush(self._heap, (at, next(self._seq), entry))
+        self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                # 期限が来たrunをまとめて取り出す
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+            for entry in due:
+                self._executor.submit(self._poll, entry)
+
+    def _poll(self, entry):
+        if entry.future.done():
+            return
+        now = time.monotonic()
+        with self._cond:
+            self.api_calls += 1
+        try:
+            run = self.client.beta.threads.runs.retrieve(
+                thread_id=entry.thread_id, run_id=entry.run_id
+            )
+        except TRANSIENT_ERRORS:
+            # 一時的なエラーは間隔を伸ばして再試行する
+            entry.errors += 1
+            delay = min(self.max_interval, self.min_interval * 2**entry.errors)
+            self._reschedule(entry, now + delay)
+            return
+        except Exception as e:
+            _set_exception(entry.future, e)
+            return
+
+        entry.errors = 0
+        if run.status in RESOLVED_STATUSES:
+            with self._cond:
+                self.resolved += 1
+            _set_result(entry.future, run)
+            return
+        self._reschedule(entry, now + self.interval(now - entry.started_at))
+
+    def _reschedule(self, entry, at):
+        if entry.deadline is not None:
+            if time.monotonic() >= entry.deadline:
+                _set_exception(
+                    entry.future,
+                    TimeoutError(f"run {entry.run_id} did not finish in time"),
+                )
+                return
+            # 期限の直前に最後の確認を行う
+            at = min(at, entry.deadline)
+        with self._cond:
+            if self._closed:
+                entry.future.cancel()
+                return
+            self._schedule(entry, at)
+
+
+def _set_result(future, result):
+    try:
+        future.set_result(result)
+    except InvalidStateError:
+        # close() によってキャンセル済みの場合
+        pass
+
+
+def _set_exception(future, exception):
+    try:
+        future.set_exception(exception)
+    except InvalidStateError:
+        pass
+
+
+# クライアントごとに共有するRunWaiter
+_shared_waiters = {}
+_shared_lock = threading.Lock()
+
+
+def shared_waiter(client) -> RunWaiter:
+    """
+    クライアントごとに共有するRunWaiterを返します。初回呼び出し時に作成します。
+
+    Parameters:
+    client (OpenAI): OpenAIクライアント。
+
+    Returns:
+    RunWaiter: 共有のRunWaiter。
+    """
+    with _shared_lock:
+        waiter = _shared_waiters.get(client)
+        if waiter is None:
+            waiter = RunWaiter(client)
+            _shared_waiters[client] = waiter
+        return waiter
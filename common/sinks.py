@@ -0,0 +1,309 @@
+import asyncio
+import json
+import queue
+import sys
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+from common.coalesce import DeltaCoalescer
+
+# 新しいブロック（テキストやツール呼び出し）の開始を表すイベント。
+# それまでのバッファをフラッシュしてから即座に書き込みます。
+OPENING_KINDS = frozenset({"text_created", "tool_call_created"})
+# 区切りとなるイベント。書き込んだ後にバッファをフラッシュします。
+CLOSING_KINDS = frozenset({"text_done", "tool_output", "message_done", "end"})
+# 時間経過でフラッシュするスレッドが、バッファが空のまま待機してから終了するまでの秒数
+_FLUSHER_IDLE_SECONDS = 1.0
+
+
+class StreamEvent:
+    """
+    StreamingEventHandler がシンクに渡すイベントです。
+
+    kind は "text_created", "text_delta", "text_done", "tool_call_created",
+    "tool_call_delta", "tool_output", "message_done", "end" のいずれかです。
+    text はコンソールに出力する文字列、data はSDKから受け取った元のオブジェクトです。
+    """
+
+    __slots__ = ("kind", "text", "data")
+
+    def __init__(self, kind: str, text: str, data: Any = None):
+        self.kind = kind
+        self.text = text
+        self.data = data
+
+    def __repr__(self):
+        return f"StreamEvent(kind={self.kind!r}, text={self.text!r})"
+
+
+class _CoalescingSink:
+    """
+    DeltaCoalescer で差分をまとめるシンクの共通部分です。
+
+    差分が途切れた場合（ツールの実行中など）も、バッファした差分はフラッシュ用のスレッドが
+    DeltaCoalescer.timeout() の期限に書き出すため、flush_interval_ms 以上遅れることはありません。
+    フラッシュ用のスレッドはバッファに差分が入ったときに起動し、しばらく差分が届かないか close() で終了します。
+    サブクラスは _emit でまとめた文字列を書き出し、バッファの操作は self._cond を保持して行います。
+    """
+
+    def __init__(self, flush_interval_ms: float, flush_bytes: int):
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_bytes = flush_bytes
+        self._coalescer = self._new_coalescer()
+        # write と時間経過によるフラッシュは別スレッドで行われるため、バッファと書き出しをこのロックで保護する
+        self._cond = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _new_coalescer(self):
+        return DeltaCoalescer(self.flush_interval_ms, self.flush_bytes)
+
+    def _emit(self, text: str):
+        raise NotImplementedError
+
+    def _push(self, text: str):
+        """差分をバッファに追加し、フラッシュ条件を満たした場合は書き出します。self._cond を保持して呼び出します。"""
+        idle = self._coalescer.timeout() is None
+        chunk = self._coalescer.push(text)
+        if chunk:
+            self._emit(chunk)
+        if idle:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """バッファに差分が入った場合に、期限にフラッシュするようフラッシュ用のスレッドに知らせます。"""
+        if self._closed or self._coalescer.timeout() is None:
+            return
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+        else:
+            self._cond.notify()
+
+    def _flush_loop(self):
+        with self._cond:
+            while not self._closed:
+                timeout = self._coalescer.timeout()
+                if timeout is None:
+                    # しばらく差分が届かなければ終了し、次に差分が入ったときに起動し直す
+                    notified = self._cond.wait(_FLUSHER_IDLE_SECONDS)
+                    if not notified and self._coalescer.timeout() is None:
+                        break
+                elif timeout > 0:
+                    self._cond.wait(timeout)
+                else:
+                    self._flush_locked()
+            self._flusher = None
+
+    def _flush_locked(self):
+        chunk = self._coalescer.flush()
+        if chunk:
+            self._emit(chunk)
+
+    def flush(self):
+        with self._cond:
+            self._flush_locked()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            self._flush_locked()
+
+
+class TextSink(_CoalescingSink):
+    """
+    イベントの文字列をテキストストリームにまとめて書き込むシンクです。
+    トークンごとに書き込む代わりに、DeltaCoalescer で一定時間または一定サイズごとにまとめます。
+    ブロックの開始・終了では即座にフラッシュするため、出力される内容は1文字ずつ出力した場合と同じです。
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        flush_interval_ms: float = 50,
+        flush_bytes: int = 1024,
+    ):
+        """
+        Parameters:
+        stream: 書き込み先のテキストストリーム。省略時は書き込む時点の sys.stdout。
+        flush_interval_ms (float): 差分をまとめる最大時間（ミリ秒）。0以下の場合はトークンごとに書き込みます。
+        flush_bytes (int): バッファがこのバイト数以上になったら書き込みます。
+        """
+        self.stream = stream
+        super().__init__(flush_interval_ms, flush_bytes)
+
+    def _write(self, text: str):
+        stream = self.stream or sys.stdout
+        stream.write(text)
+        stream.flush()
+
+    def _emit(self, text: str):
+        self._write(text)
+
+    def write(self, event: StreamEvent):
+        kind = event.kind
+        with self._cond:
+            if kind in OPENING_KINDS:
+                self._flush_locked()
+                if event.text:
+                    self._write(event.text)
+                # 次のブロックの最初の差分はバッファせずに書き込む
+                self._coalescer = self._new_coalescer()
+                return
+            if event.text:
+                self._push(event.text)
+            if kind in CLOSING_KINDS:
+                self._flush_locked()
+
+
+class TerminalSink(TextSink):
+    """標準出力に書き込むシンクです。StreamingEventHandler のデフォルトです。"""
+
+
+class FileSink(TextSink):
+    """
+    ファイルに書き込むシンクです。大きめのバッファでまとめて書き込み、
+    区切りとなるイベントと close() でディスクに書き出します。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "a",
+        flush_interval_ms: float = 1000,
+        flush_bytes: int = 64 * 1024,
+        encoding: str = "utf-8",
+    ):
+        """
+        Parameters:
+        path (str): 書き込むファイルのパス。
+        mode (str): ファイルを開くモード。
+        flush_interval_ms (float): 差分をまとめる最大時間（ミリ秒）。
+        flush_bytes (int): バッファがこのバイト数以上になったら書き込みます。
+        encoding (str): ファイルのエンコーディング。
+        """
+        super().__init__(
+            open(path, mode, encoding=encoding, buffering=flush_bytes),
+            flush_interval_ms,
+            flush_bytes,
+        )
+
+    def _write(self, text: str):
+        # ファイルオブジェクトのバッファに任せ、書き込みごとのフラッシュはしない
+        self.stream.write(text)  # type: ignore
+
+    def write(self, event: StreamEvent):
+        super().write(event)
+        if event.kind == "end":
+            with self._cond:
+                self.stream.flush()  # type: ignore
+
+    def close(self):
+        super().close()
+        self.stream.close()  # type: ignore
+
+
+class QueueSink:
+    """イベントを queue.Queue に入れるシンクです。別のスレッドで受け取る場合に使用します。"""
+
+    def __init__(self, q: Optional[queue.Queue] = None, kinds: Optional[Iterable[str]] = None):
+        """
+        Parameters:
+        q (queue.Queue): イベントを入れるキュー。省略時は新しく作成します。
+        kinds (Iterable[str]): キューに入れるイベントの種類。省略時はすべて。
+        """
+        self.queue = q if q is not None else queue.Queue()
+        self.kinds = frozenset(kinds) if kinds is not None else None
+
+    def write(self, event: StreamEvent):
+        if self.kinds is None or event.kind in self.kinds:
+            self.queue.put(event)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncQueueSink:
+    """
+    イベントを asyncio.Queue に入れるシンクです。
+    ハンドラーを別スレッドで実行し、イベントループ側で受け取る場合に使用します。
+    """
+
+    def __init__(
+        self,
+        q: asyncio.Queue,
+        loop: asyncio.AbstractEventLoop,
+        kinds: Optional[Iterable[str]] = None,
+    ):
+        """
+        Parameters:
+        q (asyncio.Queue): イベントを入れるキュー。
+        loop (asyncio.AbstractEventLoop): キューを所有するイベントループ。
+        kinds (Iterable[str]): キューに入れるイベントの種類。省略時はすべて。
+        """
+        self.queue = q
+        self.loop = loop
+        self.kinds = frozenset(kinds) if kinds is not None else None
+
+    def write(self, event: StreamEvent):
+        if self.kinds is None or event.kind in self.kinds:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def sse_frame(data) -> str:
+    """JSONでエンコードしてからSSEフォーマットの1フレームを生成します。"""
+    return f'data: {json.dumps({"message": data})}\n\n'
+
+
+class SSESink(_CoalescingSink):
+    """
+    テキストの差分をまとめてSSEのフレームに変換し、put に渡すシンクです。
+    put には queue.Queue.put や、イベントループへ転送する関数などを指定します
+    （時間経過によるフラッシュではフラッシュ用のスレッドから呼び出されるため、スレッドセーフな関数にしてください）。
+    """
+
+    def __init__(
+        self,
+        put: Callable[[Any], None],
+        kinds: Iterable[str] = ("text_delta", "tool_call_delta"),
+        flush_interval_ms: float = 50,
+        flush_bytes: int = 1024,
+        end: Any = None,
+        frame: Callable[[str], Any] = sse_frame,
+    ):
+        """
+        Parameters:
+        put (Callable): フレームを受け取る関数。
+        kinds (Iterable[str]): フレームに含めるイベントの種類。
+        flush_interval_ms (float): 差分をまとめる最大時間（ミリ秒）。
+        flush_bytes (int): バッファがこのバイト数以上になったらフレームにします。
+        end: ストリームの終了時に put に渡す値。Noneの場合は何も渡しません。
+        frame (Callable): まとめた文字列をフレームに変換する関数。
+        """
+        self.put = put
+        self.kinds = frozenset(kinds)
+        self.end = end
+        self.frame = frame
+        super().__init__(flush_interval_ms, flush_bytes)
+
+    def _emit(self, text: str):
+        self.put(self.frame(text))
+
+    def write(self, event: StreamEvent):
+        with self._cond:
+            if event.kind in self.kinds and event.text:
+                self._push(event.text)
+            elif event.kind == "end":
+                self._flush_locked()
+                if self.end is not None:
+                    self.put(self.end)
@@ -0,0 +1,249 @@
+import codecs
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import requests
+
+# 1回の読み込みの最大バイト数
+# チャンク転送のレスポンスでは、届いたHTTPチャンクごとに（この大きさまで）すぐに返されます。
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+# 再接続できる通信エラー
+RECONNECT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class SSEEvent(NamedTuple):
+    """Server-Sent Events の1つのイベントです。"""
+
+    event: str
+    data: str
+    id: str
+    retry: Optional[int] = None
+
+
+class SSEParser:
+    """
+    Server-Sent Events のテキストを逐次解析するパーサーです（WHATWG の仕様に準拠）。
+    改行は CRLF・LF・CR のいずれにも対応し、複数行の data はLFで連結します。
+    チャンクの境界で行やイベントが分割されていても、続きを受け取ってから返します。
+    """
+
+    def __init__(self, last_event_id: str = ""):
+        """
+        Parameters:
+        last_event_id (str): 最後に受け取ったイベントのID（再接続時に引き継ぐ値）。
+        """
+        self.last_event_id = last_event_id
+        self.retry: Optional[int] = None
+        self._id = last_event_id
+        self._pending = ""
+        self._event = ""
+        self._data: List[str] = []
+
+    def feed(self, text: str) -> List[SSEEvent]:
+        """
+        受信したテキストを追加し、完成したイベントを返します。
+
+        Parameters:
+        text (str): デコード済みのテキスト。
+
+        Returns:
+        list: 完成したイベントのリスト。
+        """
+        text = self._pending + text
+        if "\r" in text:
+            # 次のチャンクがLFで始まる可能性があるため、末尾のCRは保留する
+            hold = text.endswith("\r")
+            if hold:
+                text = text[:-1]
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+            if hold:
+                text += "\r"
+        lines = text.split("\n")
+        self._pending = lines.pop()
+        events = []
+        for line in lines:
+            if not line:
+                event = self._dispatch()
+                if event is not None:
+                    events.append(event)
+            elif line[0] != ":":
+                self._field(line)
+        return events
+
+    def _field(self, line: str):
+        name, sep, value = line.partition(":")
+        if sep and value[:1] == " ":
+            value = value[1:]
+        if name == "data":
+            self._data.append(value)
+        elif name == "event":
+            self._event = value
+        elif name == "id":
+            if "\0" not in value:
+                self._id = value
+        elif name == "retry":
+            if value.isdigit():
+                self.retry = int(value)
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        # IDは空行（イベントの区切り）まで受信してから確定する
+        self.last_event_id = self._id
+        data, event = self._data, self._event
+        self._data = []
+        self._event = ""
+        if not data:
+            return None
+        return SSEEvent(event or "message", "\n".join(data), self.last_event_id, self.retry)
+
+
+def iter_decoded(chunks: Iterator[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """
+    バイト列のチャンクをインクリメンタルデコーダーで文字列に変換します。
+    マルチバイト文字がチャンクの境界で分割されていても、次のチャンクと合わせてデコードします。
+
+    Parameters:
+    chunks (Iterator[bytes]): 受信したチャンク。
+    encoding (str): 文字コード。
+
+    Yields:
+    str: デコードした文字列（空文字は返しません）。
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+class StreamClient:
+    """
+    ストリーミングのレスポンスを読み込むHTTPクライアントです。
+    1つのセッションで接続を再利用するため、会話のターンごとに接続を作り直しません。
+    """
+
+    def __init__(
+        self,
+        base_url: str = "",
+        session: Optional[requests.Session] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        timeout=(5, 300),
+        max_reconnects: int = 5,
+        reconnect_delay: float = 1.0,
+    ):
+        """
+        Parameters:
+        base_url (str): パスの前に付けるURL。
+        session (requests.Session): 使用するセッション。省略時は新しく作成します。
+        chunk_size (int): 1回の読み込みの最大バイト数。
+        timeout: 接続と読み込みのタイムアウト（秒）。
+        max_reconnects (int): SSEのストリームが切断されたときに、続けて再接続する最大回数。
+        reconnect_delay (float): 再接続までの待機秒数。サーバーが retry を指定した場合はその値を使います。
+        """
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_reconnects = max_reconnects
+        self.reconnect_delay = reconnect_delay
+
+    def _url(self, path: str) -> str:
+        return path if "://" in path else f"{self.base_url}/{path.lstrip('/')}"
+
+    def _open(self, method: str, path: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        response = self.session.request(
+            method,
+            self._url(path),
+            headers=headers,
+            stream=True,
+            timeout=kwargs.pop("timeout", self.timeout),
+            **kwargs,
+        )
+        response.raise_for_status()
+        return response
+
+    def iter_text(self, method: str, path: str, **kwargs) -> Iterator[str]:
+        """
+        text/plain などのレスポンスを受信した順に文字列で返します。
+
+        Parameters:
+        method (str): HTTPメソッド。
+        path (str): パスまたはURL。
+        **kwargs: requests に渡す引数（json, data, headers など）。
+
+        Yields:
+        str: デコードした文字列。
+        """
+        with self._open(method, path, **kwargs) as response:
+            # charset の指定がない text/* を requests は ISO-8859-1 とみなすため、明示された場合のみ使う
+            content_type = response.headers.get("content-type", "").lower()
+            encoding = response.encoding if "charset=" in content_type else "utf-8"
+            yield from iter_decoded(response.iter_content(self.chunk_size), encoding)
+
+    def iter_events(
+        self,
+        method: str,
+        path: str,
+        last_event_id: str = "",
+        reconnect: Optional[bool] = None,
+        **kwargs,
+    ) -> Iterator[SSEEvent]:
+        """
+        Server-Sent Events のレスポンスを解析して、イベントを順に返します。
+        通信エラーで切断された場合は Last-Event-ID を付けて再接続し、続きから受信します。
+
+        Parameters:
+        method (str): HTTPメソッド。
+        path (str): パスまたはURL。
+        last_event_id (str): 最初の接続で送る Last-Event-ID。
+        reconnect (bool): 切断時に再接続するかどうか。省略時はGETの場合のみ再接続します
+            （POSTを再送すると、メッセージが重複して投稿されるため）。
+        **kwargs: requests に渡す引数。
+
+        Yields:
+        SSEEvent: 受信したイベント。
+
+        Raises:
+        requests.exceptions.RequestException: 再接続の回数を超えた場合など。
+        """
+        if reconnect is None:
+            reconnect = method.upper() == "GET"
+        parser = SSEParser(last_event_id)
+        base_headers = dict(kwargs.pop("headers", None) or {})
+        base_headers.setdefault("Accept", "text/event-stream")
+        failures = 0
+        while True:
+            headers = dict(base_headers)
+            if parser.last_event_id:
+                headers["Last-Event-ID"] = parser.last_event_id
+            try:
+                with self._open(method, path, headers=headers, **kwargs) as response:
+                    for text in iter_decoded(response.iter_content(self.chunk_size)):
+                        for event in parser.feed(text):
+                            failures = 0
+                            yield event
+                return
+            except RECONNECT_ERRORS:
+                failures += 1
+                if not reconnect or failures > self.max_reconnects:
+                    raise
+            # 途中まで受信した行やイベントは破棄して、最後のイベントの続きから受け取る
+            retry = parser.retry
+            parser = SSEParser(parser.last_event_id)
+            parser.retry = retry
+            time.sleep(self.reconnect_delay if retry is None else retry / 1000)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
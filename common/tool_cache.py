@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# キャッシュに値が存在しないことを表すマーカー
+MISS = object()
+
+
+def canonical_key(tool_name: str, kwargs: Dict[str, Any]) -> str:
+    """
+    ツール名と引数から、キーの順序や空白に依存しないキャッシュキーを生成します。
+
+    Parameters:
+    tool_name (str): ツール名。
+    kwargs (dict): 検証済みの引数。
+
+    Returns:
+    str: キャッシュキー。
+    """
+    return json.dumps(
+        [tool_name, kwargs],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+
+
+class CacheStats:
+    """キャッシュのヒット・ミス・追い出しの回数です。"""
+
+    __slots__ = ("hits", "misses", "evictions", "expirations")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hit_rate,
+        }
+
+    def __repr__(self):
+        return f"CacheStats({self.as_dict()})"
+
+
+class MemoryCacheBackend:
+    """プロセス内のメモリにLRUで値を保持するバックエンドです。"""
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Parameters:
+        max_entries (int): 保持するエントリの最大数。超えた場合は最も古く使われたものから削除します。
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+
+    def get(self, key: str, now: float, stats: CacheStats):
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISS
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= now:
+            del self._entries[key]
+            stats.expirations += 1
+            return MISS
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expires_at: Optional[float], stats: CacheStats):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            stats.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def close(self):
+        pass
+
+
+class DiskCacheBackend:
+    """
+    SQLiteのファイルに値を保持するバックエンドです。プロセスの再起動後もキャッシュが残ります。
+    値はJSONに変換して保存するため、JSONに変換できる戻り値のツールにのみ使用できます。
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        """
+        Parameters:
+        path (str): SQLiteファイルのパス。
+        max_entries (int): 保持するエントリの最大数。超えた場合は最も古く使われたものから削除します。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tool_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS tool_cache_accessed ON tool_cache (accessed_at)"
+        )
+
+    def get(self, key: str, now: float, stats: CacheStats):
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return MISS
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            self._conn.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+            stats.expirations += 1
+            return MISS
+        self._conn.execute(
+            "UPDATE tool_cache SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, expires_at: Optional[float], stats: CacheStats):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), expires_at, time.time()),
+        )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM tool_cache").fetchone()
+        if count > self.max_entries:
+            excess = count - self.max_entries
+            self._conn.execute(
+                "DELETE FROM tool_cache WHERE key IN "
+                "(SELECT key FROM tool_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            stats.evictions += excess
+
+    def clear(self):
+        self._conn.execute("DELETE FROM tool_cache")
+
+    def close(self):
+        self._conn.close()
+
+
+class ToolResultCache:
+    """
+    決定的なツールの戻り値を (ツール名, 正規化した引数) をキーとしてキャッシュします。
+    ToolRegistry(cache=...) に指定し、@tools.tool(cache_ttl=...) でキャッシュを有効にしたツールに適用されます。
+    """
+
+    def __init__(self, backend=None):
+        """
+        Parameters:
+        backend: MemoryCacheBackend または DiskCacheBackend。省略時は MemoryCacheBackend()。
+        """
+        self.backend = backend or MemoryCacheBackend()
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, tool_name: str, kwargs: Dict[str, Any]):
+        """
+        キャッシュされた値を返します。
+
+        Returns:
+        キャッシュされた値。存在しないか期限切れの場合は MISS。
+        """
+        key = canonical_key(tool_name, kwargs)
+        with self._lock:
+            value = self.backend.get(key, time.time(), self.stats)
+            if value is MISS:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+            return value
+
+    def set(
+        self,
+        tool_name: str,
+        kwargs: Dict[str, Any],
+        value: Any,
+        ttl: Optional[float] = None,
+    ):
+        """
+        値をキャッシュに保存します。
+
+        Parameters:
+        tool_name (str): ツール名。
+        kwargs (dict): 検証済みの引数。
+        value: ツールの戻り値。
+        ttl (float): 有効期間（秒）。Noneの場合は期限なし。
+        """
+        key = canonical_key(tool_name, kwargs)
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self.backend.set(key, value, expires_at, self.stats)
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+
+    def close(self):
+        with self._lock:
+            self.backend.close()
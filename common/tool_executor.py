@@ -0,0 +1,172 @@
+import asyncio
+import inspect
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def format_output(result: Any) -> str:
+    """
+    ツールの戻り値を submit_tool_outputs に渡せる文字列に変換します。
+
+    Parameters:
+    result: ツールの戻り値。
+
+    Returns:
+    str: 文字列の場合はそのまま、それ以外はJSONに変換した文字列。
+    """
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, ensure_ascii=False)
+
+
+def format_error(error: BaseException) -> str:
+    """ツールの実行に失敗したことをアシスタントに伝えるための出力を生成します。"""
+    message = str(error) or error.__class__.__name__
+    return json.dumps(
+        {"error": message, "type": error.__class__.__name__}, ensure_ascii=False
+    )
+
+
+async def _cancel_pending_tasks():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ToolExecutor:
+    """
+    requires_action で要求された複数のツール呼び出しを並行して実行するクラスです。
+
+    同期関数のツールはスレッドプールで、非同期関数（async def）のツールは
+    専用のイベントループ上のタスクとして実行します。ツールごとにタイムアウトを設定でき、
+    失敗やタイムアウトしたツールはエラー内容を出力として返すため、
+    他のツールの結果と合わせて1回の submit_tool_outputs で送信できます。
+    """
+
+    def __init__(
+        self,
+        prepare: Callable[[str, str], Tuple[Callable, Dict[str, Any]]],
+        max_workers: int = 8,
+        default_timeout: float = 30.0,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Parameters:
+        prepare (Callable[[str, str], tuple]): ツール名と引数（JSON文字列）から、
+            実行する関数と引数の辞書を返す関数。通常は ToolRegistry.prepare を指定します。
+        max_workers (int): 同期関数のツールを実行するスレッドの最大数。
+        default_timeout (float): ツールのタイムアウト（秒）のデフォルト値。
+        timeouts (dict): ツール名ごとのタイムアウト（秒）。
+        """
+        self.prepare = prepare
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tool-executor"
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+
+    @classmethod
+    def from_registry(cls, registry, **kwargs):
+        """
+        ToolRegistry に登録されたツールを実行するエグゼキューターを生成します。
+        ツールの登録時に指定したタイムアウトが適用されます。
+
+        Parameters:
+        registry (ToolRegistry): ツールのレジストリ。
+        **kwargs: ToolExecutor のその他の引数。
+
+        Returns:
+        ToolExecutor: 生成したエグゼキューター。
+        """
+        timeouts = {**registry.timeouts(), **kwargs.pop("timeouts", {})}
+        return cls(registry.prepare, timeouts=timeouts, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        # 非同期関数のツールが初めて呼ばれたときにイベントループのスレッドを起動する
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="tool-executor-loop",
+                    daemon=True,
+                )
+                self._loop_thread.start()
+            return self._loop
+
+    def _start(self, name: str, arguments: str):
+        function, args = self.prepare(name, arguments)
+        if inspect.iscoroutinefunction(function):
+            return asyncio.run_coroutine_threadsafe(
+                function(**args), self._event_loop()
+            )
+        return self._pool.submit(function, **args)
+
+    def run(self, tool_calls) -> List[Dict[str, str]]:
+        """
+        ツール呼び出しをすべて並行して実行し、tool_outputs の形式で結果を返します。
+
+        Parameters:
+        tool_calls (list): required_action.submit_tool_outputs.tool_calls。
+
+        Returns:
+        list: {"tool_call_id": ..., "output": ...} のリスト（tool_callsと同じ順序）。
+        """
+        started = time.monotonic()
+        pending = []
+        for tool_call in tool_calls:
+            name = tool_call.function.name
+            try:
+                future = self._start(name, tool_call.function.arguments)
+            except Exception as e:
+                # ツールが見つからない、引数が不正などの場合
+                future = e
+            timeout = self.timeouts.get(name, self.default_timeout)
+            pending.append((tool_call, future, started + timeout))
+
+        tool_outputs = []
+        for tool_call, future, deadline in pending:
+            if isinstance(future, Exception):
+                output = format_error(future)
+            else:
+                try:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    output = format_output(future.result(timeout=remaining))
+                except FutureTimeoutError:
+                    # 非同期関数のタスクはキャンセルされる。同期関数は結果を待たずに打ち切る
+                    future.cancel()
+                    output = format_error(
+                        TimeoutError(f"{tool_call.function.name} timed out")
+                    )
+                except Exception as e:
+                    output = format_error(e)
+            tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
+        return tool_outputs
+
+    def close(self):
+        """スレッドプールとイベントループを停止します。"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._loop_lock:
+            if self._loop is not None:
+                # 実行中のタスクをキャンセルしてからイベントループを止める
+                asyncio.run_coroutine_threadsafe(
+                    _cancel_pending_tasks(), self._loop
+                ).result()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop_thread.join()  # type: ignore
+                self._loop.close()
+                self._loop = None
@@ -0,0 +1,471 @@
+import functools
+import inspect
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from typing_extensions import (
+    Annotated,
+    Literal,
+    NotRequired,
+    Required,
+    get_args,
+    get_origin,
+    get_type_hints,
+    is_typeddict,
+)
+
+from common.tool_cache import MISS
+
+
+class ToolArgumentError(ValueError):
+    """ツールの引数が定義と一致しない場合に発生する例外です。"""
+
+
+# Python の型と JSON Schema の型の対応
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+# docstring の Parameters: セクションの1行（例: "location (str): 天気を取得する場所。"）
+_DOC_PARAM = re.compile(r"^\s*(\w+)\s*(?:\([^)]*\))?\s*:\s*(.+?)\s*$")
+
+
+def _parse_docstring(function) -> Tuple[str, Dict[str, str]]:
+    """
+    docstring から関数の説明と、Parameters: セクションの引数の説明を取り出します。
+
+    Returns:
+    tuple: (関数の説明, {引数名: 説明})
+    """
+    doc = inspect.getdoc(function) or ""
+    summary_lines: List[str] = []
+    params: Dict[str, str] = {}
+    section = "summary"
+    for line in doc.splitlines():
+        stripped = line.strip()
+        if stripped in ("Parameters:", "Args:"):
+            section = "params"
+            continue
+        if stripped.endswith(":") and stripped[:-1] in ("Returns", "Raises", "Yields"):
+            section = "other"
+            continue
+        if section == "summary":
+            if not stripped and summary_lines:
+                section = "other"
+            elif stripped:
+                summary_lines.append(stripped)
+        elif section == "params":
+            match = _DOC_PARAM.match(line)
+            if match:
+                params[match.group(1)] = match.group(2)
+    return "".join(summary_lines), params
+
+
+def _unwrap(annotation) -> Tuple[Any, Optional[str], bool]:
+    """
+    Annotated / Optional / Required / NotRequired を外し、型・説明・省略可能かどうかを返します。
+    """
+    description = None
+    optional = False
+    while True:
+        origin = get_origin(annotation)
+        if origin is Annotated:
+            args = get_args(annotation)
+            annotation = args[0]
+            description = next(
+                (m for m in args[1:] if isinstance(m, str)), description
+            )
+        elif origin in (Required, NotRequired):
+            annotation = get_args(annotation)[0]
+        elif origin is Union and type(None) in get_args(annotation):
+            args = [a for a in get_args(annotation) if a is not type(None)]
+            annotation = args[0] if len(args) == 1 else Union[tuple(args)]  # type: ignore
+            optional = True
+        else:
+            return annotation, description, optional
+
+
+def _compile(annotation) -> Tuple[Dict[str, Any], Callable[[Any, str], Any]]:
+    """
+    型アノテーションから JSON Schema と、値を検証・変換する関数を生成します。
+    変換関数はツールの登録時に一度だけ生成し、呼び出しごとに再利用します。
+
+    Returns:
+    tuple: (JSON Schema, 変換関数)
+    """
+    annotation, description, _ = _unwrap(annotation)
+    origin = get_origin(annotation)
+
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        schema: Dict[str, Any] = {}
+        convert = _identity
+    elif origin is Literal:
+        choices = get_args(annotation)
+        schema = {"enum": list(choices)}
+        json_type = _JSON_TYPES.get(type(choices[0]))
+        if json_type and all(type(c) is type(choices[0]) for c in choices):
+            schema = {"type": json_type, "enum": list(choices)}
+        convert = _enum_converter(frozenset(choices))
+    elif annotation in _JSON_TYPES:
+        schema = {"type": _JSON_TYPES[annotation]}
+        convert = _SCALAR_CONVERTERS[annotation]
+    elif annotation in (list, List) or origin in (list, List):
+        args = get_args(annotation)
+        item_schema, item_convert = _compile(args[0] if args else Any)
+        schema = {"type": "array", "items": item_schema}
+        convert = _array_converter(item_convert)
+    elif is_typeddict(annotation):
+        schema, convert = _compile_typeddict(annotation)
+    elif annotation in (dict, Dict) or origin in (dict, Dict):
+        schema = {"type": "object"}
+        convert = _dict_converter
+    else:
+        raise TypeError(f"unsupported tool parameter type: {annotation!r}")
+
+    if description:
+        schema = {**schema, "description": description}
+    return schema, convert
+
+
+def _compile_typeddict(typeddict):
+    hints = get_type_hints(typeddict, include_extras=True)
+    required_keys = getattr(typeddict, "__required_keys__", frozenset(hints))
+    properties = {}
+    fields = []
+    for key, annotation in hints.items():
+        schema, convert = _compile(annotation)
+        properties[key] = schema
+        fields.append((key, convert, key in required_keys))
+    schema = {
+        "type": "object",
+        "properties": properties,
+        "required": [key for key, _, required in fields if required],
+    }
+
+    def convert(value, path):
+        if not isinstance(value, dict):
+            raise ToolArgumentError(f"{path}: expected object")
+        result = {}
+        for key, convert_field, required in fields:
+            if key in value:
+                result[key] = convert_field(value[key], f"{path}.{key}")
+            elif required:
+                raise ToolArgumentError(f"{path}.{key}: required")
+        return result
+
+    return schema, convert
+
+
+def _identity(value, path):
+    return value
+
+
+def _to_str(value, path):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ToolArgumentError(f"{path}: expected string")
+
+
+def _to_int(value, path):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise ToolArgumentError(f"{path}: expected integer")
+
+
+def _to_float(value, path):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise ToolArgumentError(f"{path}: expected number")
+
+
+def _to_bool(value, path):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ToolArgumentError(f"{path}: expected boolean")
+
+
+_SCALAR_CONVERTERS = {str: _to_str, int: _to_int, float: _to_float, bool: _to_bool}
+
+
+def _enum_converter(choices):
+    def convert(value, path):
+        if value not in choices:
+            raise ToolArgumentError(f"{path}: must be one of {sorted(choices)}")
+        return value
+
+    return convert
+
+
+def _array_converter(item_convert):
+    def convert(value, path):
+        if not isinstance(value, list):
+            raise ToolArgumentError(f"{path}: expected array")
+        return [item_convert(item, f"{path}[{i}]") for i, item in enumerate(value)]
+
+    return convert
+
+
+def _dict_converter(value, path):
+    if not isinstance(value, dict):
+        raise ToolArgumentError(f"{path}: expected object")
+    return value
+
+
+class Tool:
+    """ToolRegistry に登録されたツールです。スキーマと引数の変換関数を保持します。"""
+
+    __slots__ = ("name", "function", "schema", "timeout", "cache_ttl", "call", "_fields")
+
+    def __init__(
+        self, function, name=None, description=None, timeout=None, cache_ttl=None
+    ):
+        self.name = name or function.__name__
+        self.function = function
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        # 実際に呼び出す関数（キャッシュを有効にした場合はラップした関数）
+        self.call = function
+
+        summary, doc_params = _parse_docstring(function)
+        hints = get_type_hints(function, include_extras=True)
+        properties = {}
+        required = []
+        fields = []
+        for param in inspect.signature(function).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            annotation = hints.get(param.name, param.annotation)
+            schema, convert = _compile(annotation)
+            if "description" not in schema and param.name in doc_params:
+                schema["description"] = doc_params[param.name]
+            properties[param.name] = schema
+            is_required = param.default is param.empty and not _unwrap(annotation)[2]
+            if is_required:
+                required.append(param.name)
+            fields.append((param.name, convert, is_required))
+        self._fields = tuple(fields)
+
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": description or summary,
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required,
+                },
+            },
+        }
+
+    def parse(self, arguments: Union[str, Dict[str, Any], None]) -> Dict[str, Any]:
+        """
+        ツールの引数（JSON文字列）を検証し、関数に渡せる辞書に変換します。
+
+        Parameters:
+        arguments (str): ツール呼び出しの引数。JSON文字列または辞書。
+
+        Returns:
+        dict: 検証・変換済みの引数。定義されていないキーは取り除かれます。
+        """
+        if not arguments:
+            values: Dict[str, Any] = {}
+        elif isinstance(arguments, str):
+            try:
+                values = json.loads(arguments)
+            except json.JSONDecodeError as e:
+                raise ToolArgumentError(f"{self.name}: invalid JSON arguments: {e}")
+        else:
+            values = arguments
+        if not isinstance(values, dict):
+            raise ToolArgumentError(f"{self.name}: arguments must be an object")
+
+        kwargs = {}
+        for name, convert, required in self._fields:
+            if name in values:
+                if values[name] is None and not required:
+                    continue
+                kwargs[name] = convert(values[name], name)
+            elif required:
+                raise ToolArgumentError(f"{self.name}: missing argument '{name}'")
+        return kwargs
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+
+class ToolRegistry:
+    """
+    デコレータで関数をツールとして登録し、アシスタントに渡す tools のスキーマの生成と、
+    ツール呼び出しのディスパッチを行うレジストリです。
+
+    スキーマと引数の変換関数は登録時に一度だけ生成するため、
+    ツール呼び出しごとの処理は辞書の検索と引数の変換だけになります。
+
+    使用例:
+        tools = ToolRegistry()
+
+        @tools.tool(description="Get the probability of rain for a specific location")
+        def get_rain_probability(location: str):
+            ...
+
+        client.beta.assistants.create(..., tools=tools.schemas())
+        result = tools.dispatch(tool_call.function.name, tool_call.function.arguments)
+    """
+
+    def __init__(self, cache=None):
+        """
+        Parameters:
+        cache (ToolResultCache): ツールの戻り値のキャッシュ。
+            cache_ttl を指定して登録したツールにのみ適用されます。
+        """
+        self.cache = cache
+        self._tools: Dict[str, Tool] = {}
+
+    def tool(
+        self,
+        function: Optional[Callable] = None,
+        *,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[float] = None,
+    ):
+        """
+        関数をツールとして登録するデコレータです。引数なしでも使用できます。
+
+        Parameters:
+        function (Callable): 登録する関数。
+        name (str): ツール名。省略時は関数名。
+        description (str): ツールの説明。省略時は docstring の最初の段落。
+        timeout (float): ToolExecutor で実行する際のタイムアウト（秒）。
+        cache_ttl (float): 戻り値をキャッシュする期間（秒）。指定した場合のみ、
+            レジストリの cache を使って同じ引数の呼び出しをキャッシュから返します。
+            引数が同じなら同じ結果を返す決定的なツールにのみ指定してください。
+
+        Returns:
+        Callable: 登録した関数（そのまま直接呼び出すこともできます）。
+        """
+
+        def register(function):
+            tool = Tool(
+                function,
+                name=name,
+                description=description,
+                timeout=timeout,
+                cache_ttl=cache_ttl,
+            )
+            if tool.name in self._tools:
+                raise ValueError(f"tool '{tool.name}' is already registered")
+            if self.cache is not None and cache_ttl is not None:
+                tool.call = self._cached(tool)
+            self._tools[tool.name] = tool
+            return function
+
+        if function is not None:
+            return register(function)
+        return register
+
+    def _cached(self, tool: Tool) -> Callable:
+        """ツールの関数を、キャッシュを参照してから呼び出す関数でラップします。"""
+        cache = self.cache
+        name, ttl, function = tool.name, tool.cache_ttl, tool.function
+        # 省略された引数とデフォルト値を明示した引数が同じキーになるようにする
+        defaults = {
+            param.name: param.default
+            for param in inspect.signature(function).parameters.values()
+            if param.default is not param.empty
+        }
+
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def call_async(**kwargs):
+                key_args = {**defaults, **kwargs}
+                value = cache.get(name, key_args)  # type: ignore
+                if value is MISS:
+                    value = await function(**kwargs)
+                    cache.set(name, key_args, value, ttl)  # type: ignore
+                return value
+
+            return call_async
+
+        @functools.wraps(function)
+        def call(**kwargs):
+            key_args = {**defaults, **kwargs}
+            value = cache.get(name, key_args)  # type: ignore
+            if value is MISS:
+                value = function(**kwargs)
+                cache.set(name, key_args, value, ttl)  # type: ignore
+            return value
+
+        return call
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __getitem__(self, name) -> Tool:
+        try:
+            return self._tools[name]
+        except KeyError:
+            raise KeyError(f"unknown tool: {name}") from None
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """
+        登録したツールのスキーマを、アシスタントの tools に渡す形式で返します。
+
+        Returns:
+        list: [{"type": "function", "function": {...}}, ...]
+        """
+        return [tool.schema for tool in self._tools.values()]
+
+    def timeouts(self) -> Dict[str, float]:
+        """タイムアウトが設定されたツールの {ツール名: 秒数} を返します。"""
+        return {
+            name: tool.timeout
+            for name, tool in self._tools.items()
+            if tool.timeout is not None
+        }
+
+    def prepare(self, name: str, arguments) -> Tuple[Callable, Dict[str, Any]]:
+        """
+        ツール名と引数から、実行する関数と検証済みの引数を返します。
+
+        Parameters:
+        name (str): ツール名。
+        arguments (str): ツール呼び出しの引数（JSON文字列）。
+
+        Returns:
+        tuple: (関数, 引数の辞書)
+        """
+        tool = self[name]
+        return tool.call, tool.parse(arguments)
+
+    def dispatch(self, name: str, arguments) -> Any:
+        """
+        ツール名と引数からツールを実行し、その戻り値を返します。
+
+        Parameters:
+        name (str): ツール名。
+        arguments (str): ツール呼び出しの引数（JSON文字列）。
+
+        Returns:
+        ツールの戻り値。
+        """
+        function, kwargs = self.prepare(name, arguments)
+        return function(**kwargs)
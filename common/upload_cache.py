@@ -0,0 +1,291 @@
+import hashlib
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import openai
+
+from common.utils import file_lock, read_json, write_json_atomic
+
+# マニフェストファイルのデフォルトの保存先
+DEFAULT_MANIFEST_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".cache",
+    "upload_manifest.json",
+)
+
+# ハッシュ計算時に一度に読み込むサイズ
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: str) -> str:
+    """
+    ファイルを一定サイズずつ読み込み、SHA-256のハッシュ値を計算します。
+
+    Parameters:
+    path (str): ファイルのパス。
+
+    Returns:
+    str: SHA-256のハッシュ値（16進数文字列）。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_owner() -> str:
+    """キャッシュのエントリを使用する者の既定値として、実行中のスクリプトのパスを返します。"""
+    return os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else "interactive"
+
+
+class UploadCache:
+    """
+    ファイルの内容のハッシュ値をキーに、アップロード済みのファイルIDを再利用するクラスです。
+
+    マニフェスト（JSON）に「ハッシュ値と用途 → file_id」を記録し、同じ内容のファイルは
+    リモートにまだ存在することを確認したうえで再利用します。見つからない場合のみアップロードします。
+    パスごとにサイズと更新時刻も記録し、ファイルが変更されていなければハッシュ値の再計算も省略します。
+
+    ハッシュ値の計算とネットワーク通信はロックの外で行い、マニフェストの更新だけをロックで保護するため、
+    複数のプロセスのアップロードが互いを待つことはありません。
+    エントリにはそのファイルを使用するスクリプト（owner）を記録し、evict でリモートのファイルを
+    削除するのは、ほかに使用するスクリプトがなくなった場合だけにします。
+    """
+
+    def __init__(self, client, manifest_path: Optional[str] = None):
+        """
+        Parameters:
+        client (OpenAI): OpenAIクライアント。
+        manifest_path (str): マニフェストファイルのパス。省略時は環境変数 UPLOAD_MANIFEST_PATH、
+            それもない場合はプロジェクトルートの .cache/upload_manifest.json を使用します。
+        """
+        self.client = client
+        self.manifest_path = manifest_path or os.getenv(
+            "UPLOAD_MANIFEST_PATH", DEFAULT_MANIFEST_PATH
+        )
+        self.lock_path = self.manifest_path + ".lock"
+
+    def _load(self) -> Dict[str, Dict]:
+        manifest = read_json(self.manifest_path, default={})
+        manifest.setdefault("files", {})
+        manifest.setdefault("paths", {})
+        return manifest
+
+    def _digest(self, path: str, manifest) -> str:
+        """パスのサイズと更新時刻が前回と同じであれば、記録済みのハッシュ値を返します。"""
+        stat = os.stat(path)
+        known = manifest["paths"].get(os.path.abspath(path))
+        if (
+            known
+            and known["size"] == stat.st_size
+            and known["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return known["sha256"]
+        return sha256_file(path)
+
+    def upload(
+        self,
+        path: str,
+        purpose: str = "assistants",
+        verify: bool = True,
+        owner: Optional[str] = None,
+    ):
+        """
+        ファイルをアップロードします。同じ内容のファイルがアップロード済みであれば再利用します。
+
+        Parameters:
+        path (str): アップロードするファイルのパス。
+        purpose (str): ファイルの用途。
+        verify (bool): 再利用する前に、リモートにファイルが存在することを確認するかどうか。
+            Falseの場合は確認せずにマニフェストの内容を信用します（ネットワーク通信なし）。
+        owner (str): ファイルを使用する者の名前。省略時は実行中のスクリプトのパス。
+
+        Returns:
+        FileObject: アップロード済みのファイル。verify=False でキャッシュを使った場合は、
+            id のみを持つオブジェクト。
+        """
+        owner = owner or default_owner()
+        # マニフェストは置き換えで書き込まれるため、ロックなしで読み込める
+        manifest = self._load()
+        sha256 = self._digest(path, manifest)
+        key = f"{sha256}:{purpose}"
+        stat = os.stat(path)
+
+        file = None
+        entry = manifest["files"].get(key)
+        if entry is not None:
+            if not verify:
+                file = CachedFile(entry["file_id"])
+            else:
+                try:
+                    file = self.client.files.retrieve(file_id=entry["file_id"])
+                except openai.NotFoundError:
+                    # リモートで削除されていた場合はアップロードし直す
+                    file = None
+
+        uploaded = None
+        if file is None:
+            with open(path, "rb") as stream:
+                uploaded = file = self.client.files.create(file=stream, purpose=purpose)  # type: ignore
+
+        duplicate = None
+        with file_lock(self.lock_path):
+            # ロックを取得するまでに他のプロセスが更新した内容を読み直してから変更する
+            manifest = self._load()
+            current = manifest["files"].get(key)
+            stale_id = entry["file_id"] if entry is not None else None
+            if uploaded is not None and current is not None and current["file_id"] != stale_id:
+                # 同じ内容を他のプロセスが先にアップロードしていた場合は、そちらを使う
+                duplicate, file = uploaded, CachedFile(current["file_id"])
+            elif uploaded is not None:
+                current = {
+                    "file_id": uploaded.id,
+                    "filename": os.path.basename(path),
+                    "bytes": stat.st_size,
+                    "purpose": purpose,
+                    "uploaded_at": time.time(),
+                    # リモートで削除されていたエントリを使用していた owner も引き継ぐ
+                    "owners": sorted(_owners(current)) if current is not None else [],
+                }
+            elif current is None:
+                # 再利用を確認している間に他のプロセスがエントリを削除した
+                current = dict(entry)  # type: ignore
+            current["last_used_at"] = time.time()
+            current["owners"] = sorted(_owners(current) | {owner})
+            manifest["files"][key] = current
+            manifest["paths"][os.path.abspath(path)] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+            }
+            write_json_atomic(self.manifest_path, manifest)
+        if duplicate is not None:
+            try:
+                self.client.files.delete(file_id=duplicate.id)
+            except openai.OpenAIError:
+                pass
+        return file
+
+    def entries(self) -> List[Dict]:
+        """マニフェストに記録されたファイルの一覧を返します。"""
+        return [{"key": key, **entry} for key, entry in self._load()["files"].items()]
+
+    def evict(
+        self,
+        file_id: str,
+        delete_remote: bool = False,
+        owner: Optional[str] = None,
+        force: bool = False,
+    ) -> bool:
+        """
+        ファイルIDの使用をやめ、ほかに使用する者がいなければマニフェストから削除します。
+
+        Parameters:
+        file_id (str): 削除するファイルのID。
+        delete_remote (bool): マニフェストから削除した場合に、リモートのファイルも削除するかどうか。
+            ほかの owner が使用しているファイルは削除しません。
+        owner (str): 使用をやめる者の名前。省略時は実行中のスクリプトのパス。
+        force (bool): Trueの場合は、ほかの owner の有無にかかわらずマニフェストから削除します。
+
+        Returns:
+        bool: マニフェストからファイルIDを削除した場合はTrue。
+        """
+        owner = owner or default_owner()
+        with file_lock(self.lock_path):
+            manifest = self._load()
+            keys = [k for k, e in manifest["files"].items() if e["file_id"] == file_id]
+            removed = []
+            for key in keys:
+                entry = manifest["files"][key]
+                others = _owners(entry) - {owner}
+                if others and not force:
+                    entry["owners"] = sorted(others)
+                else:
+                    del manifest["files"][key]
+                    removed.append(key)
+            if keys:
+                write_json_atomic(self.manifest_path, manifest)
+            # 削除したエントリ以外から参照されていないことを確認する
+            referenced = any(e["file_id"] == file_id for e in manifest["files"].values())
+        if not removed:
+            return False
+        if delete_remote and not referenced:
+            try:
+                self.client.files.delete(file_id=file_id)
+            except openai.NotFoundError:
+                pass
+        return True
+
+    def gc(
+        self,
+        max_age_days: Optional[float] = None,
+        verify: bool = True,
+        delete_remote: bool = False,
+        dry_run: bool = False,
+    ) -> List[Dict]:
+        """
+        マニフェストから不要なエントリを削除します。
+
+        Parameters:
+        max_age_days (float): 最後に使用してからこの日数を過ぎたエントリを削除します。
+        verify (bool): リモートに存在しないファイルのエントリを削除します。
+        delete_remote (bool): max_age_days で削除したエントリのリモートのファイルも削除します。
+        dry_run (bool): Trueの場合は削除対象を返すだけで、何も削除しません。
+
+        Returns:
+        list: 削除した（dry_runの場合は削除対象の）エントリと理由のリスト。
+        """
+        now = time.time()
+        removed = []
+        with file_lock(self.lock_path):
+            manifest = self._load()
+            for key, entry in list(manifest["files"].items()):
+                reason = None
+                last_used = entry.get("last_used_at", entry.get("uploaded_at", now))
+                if max_age_days is not None and now - last_used > max_age_days * 86400:
+                    reason = "expired"
+                elif verify:
+                    try:
+                        self.client.files.retrieve(file_id=entry["file_id"])
+                    except openai.NotFoundError:
+                        reason = "missing"
+                if reason is None:
+                    continue
+                removed.append({"key": key, "reason": reason, **entry})
+                if dry_run:
+                    continue
+                del manifest["files"][key]
+                if reason == "expired" and delete_remote:
+                    try:
+                        self.client.files.delete(file_id=entry["file_id"])
+                    except openai.NotFoundError:
+                        pass
+
+            # 存在しなくなったローカルファイルのパス情報も削除する
+            stale_paths = [p for p in manifest["paths"] if not os.path.exists(p)]
+            if not dry_run:
+                for path in stale_paths:
+                    del manifest["paths"][path]
+                if removed or stale_paths:
+                    write_json_atomic(self.manifest_path, manifest)
+        return removed
+
+
+def _owners(entry: Dict) -> set:
+    """エントリを使用する owner の集合。owner を記録していない古いエントリは、不明な使用者がいるものとみなします。"""
+    return set(entry.get("owners", ["unknown"]))
+
+
+class CachedFile:
+    """verify=False でマニフェストから返すファイルです。idのみを持ちます。"""
+
+    __slots__ = ("id",)
+
+    def __init__(self, file_id: str):
+        self.id = file_id
+
+    def __repr__(self):
+        return f"CachedFile(id={self.id!r})"
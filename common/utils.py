@@ -1,4 +1,8 @@
+import contextlib
+import fcntl
+import json
 import os
+import tempfile
 
 
 def create_and_open_file(filepath, mode="w"):
@@ -26,6 +30,8 @@ def create_and_open_file(filepath, mode="w"):
 def update_env_file(env_file_path, key_to_update, new_value):
     """
     .envファイルを更新し、指定されたキーの値を新しい値に変更します。
+    書き込みは ConfigStore によるロック付きのアトミックな置き換えです。
+    複数のキーを更新する場合は、ConfigStore.update でまとめて1回で書き込んでください。
 
     Parameters:
     env_file_path (str): .envファイルのパス。
@@ -33,24 +39,84 @@ def update_env_file(env_file_path, key_to_update, new_value):
     new_value (str): 新しい値。
 
     """
-    # .envファイルを読み込む
-    with open(env_file_path, "r") as file:
-        lines = file.readlines()
+    # config_store はこのモジュールを使用するため、循環importを避けて関数内でimportする
+    from common.config_store import shared_config
 
-    # 更新するキーを探し、値を変更する
-    updated_lines = []
-    key_found = False
-    for line in lines:
-        if line.startswith(key_to_update + "="):
-            updated_lines.append(f"{key_to_update}={new_value}\n")
-            key_found = True
-        else:
-            updated_lines.append(line)
+    shared_config(env_file_path).update({key_to_update: new_value})
 
-    # キーが存在しない場合は追加
-    if not key_found:
-        updated_lines.append(f"{key_to_update}={new_value}\n")
 
-    # 変更をファイルに書き戻す
-    with open(env_file_path, "w") as file:
-        file.writelines(updated_lines)
+@contextlib.contextmanager
+def file_lock(lock_path, shared=False):
+    """
+    fcntlによるプロセス間の排他ロックを取得するコンテキストマネージャです。
+
+    Parameters:
+    lock_path (str): ロックに使用するファイルのパス。存在しない場合は作成します。
+    shared (bool): Trueの場合は共有ロック（読み取り用）を取得します。
+    """
+    directory = os.path.dirname(lock_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_text_atomic(filepath, text):
+    """
+    テキストを一時ファイルに書き出してからリネームし、ファイルをアトミックに置き換えます。
+    既存のファイルがある場合は、そのパーミッションを引き継ぎます。
+
+    Parameters:
+    filepath (str): 書き込むファイルのパス。
+    text (str): 書き込む内容。
+    """
+    directory = os.path.dirname(filepath) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(filepath).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_atomic(filepath, data):
+    """
+    JSONファイルを一時ファイルに書き出してからリネームし、アトミックに置き換えます。
+
+    Parameters:
+    filepath (str): 書き込むファイルのパス。
+    data: JSONに変換するデータ。
+    """
+    write_text_atomic(filepath, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def read_json(filepath, default=None):
+    """
+    JSONファイルを読み込みます。ファイルが存在しない場合はdefaultを返します。
+
+    Parameters:
+    filepath (str): 読み込むファイルのパス。
+    default: ファイルが存在しない場合の戻り値。
+
+    Returns:
+    読み込んだデータ。
+    """
+    try:
+        with open(filepath, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
@@ -1,12 +1,20 @@
-from openai import OpenAI
+import sys
+import os
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
 from dotenv import load_dotenv
 
-load_dotenv(override=True)
+from common.cleanup import Cleaner
+from common.client import get_client
 
-client = OpenAI()
+load_dotenv(override=True)
+client = get_client()
 
-assistants = client.beta.assistants.list()
-for assistant in assistants:
-    client.beta.assistants.delete(assistant_id=assistant.id)
+report = Cleaner(client, "assistants").run()
+print(report)
 
 print("delete all assistants...")
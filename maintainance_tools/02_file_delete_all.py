@@ -1,12 +1,20 @@
-from openai import OpenAI
+import sys
+import os
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
 from dotenv import load_dotenv
 
-load_dotenv(override=True)
-client = OpenAI()
+from common.cleanup import Cleaner
+from common.client import get_client
 
-files = client.files.list()
+load_dotenv(override=True)
+client = get_client()
 
-for file in files:
-    client.files.delete(file_id=file.id)
+report = Cleaner(client, "files").run()
+print(report)
 
 print("all files deleted")
@@ -1,13 +1,23 @@
-from openai import OpenAI
+import sys
+import os
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
 from dotenv import load_dotenv
 
+from common.cleanup import Cleaner
+from common.client import get_client
+
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
 
 thead_ids = []
 
-for id in thead_ids:
-    client.beta.threads.delete(thread_id=id)
+report = Cleaner(client, "threads").run(ids=thead_ids)
+print(report)
 
 print("threads deleted")
 
@@ -1,11 +1,20 @@
-from openai import OpenAI
+import sys
+import os
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
 from dotenv import load_dotenv
 
+from common.cleanup import Cleaner
+from common.client import get_client
+
 load_dotenv(override=True)
-client = OpenAI()
+client = get_client()
 
-vs_list = client.beta.vector_stores.list()
-for vs in vs_list:
-    client.beta.vector_stores.delete(vector_store_id=vs.id)
+report = Cleaner(client, "vector_stores").run()
+print(report)
 
 print("vector store deleted")
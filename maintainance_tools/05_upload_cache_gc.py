@@ -0,0 +1,59 @@
+import sys
+import os
+import argparse
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from dotenv import load_dotenv
+
+from common.upload_cache import UploadCache
+from common.client import get_client
+
+load_dotenv(override=True)
+client = get_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="アップロードキャッシュのマニフェストから不要なエントリを削除します。"
+    )
+    parser.add_argument(
+        "--max-age-days", type=float, help="最後に使用してからこの日数を過ぎたエントリを削除する"
+    )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="リモートにファイルが存在するかどうかを確認しない",
+    )
+    parser.add_argument(
+        "--delete-remote",
+        action="store_true",
+        help="期限切れのエントリのリモートのファイルも削除する",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="削除対象を表示するだけにする")
+    parser.add_argument("--list", action="store_true", help="マニフェストの内容を表示する")
+    args = parser.parse_args()
+
+    cache = UploadCache(client)
+
+    if args.list:
+        for entry in cache.entries():
+            print(f"{entry['file_id']}  {entry['bytes']:>10}  {entry['filename']}")
+        return
+
+    removed = cache.gc(
+        max_age_days=args.max_age_days,
+        verify=not args.no_verify,
+        delete_remote=args.delete_remote,
+        dry_run=args.dry_run,
+    )
+    for entry in removed:
+        print(f"{entry['reason']:>8}  {entry['file_id']}  {entry['filename']}")
+    print(f"{len(removed)} entries {'would be ' if args.dry_run else ''}removed")
+
+
+if __name__ == "__main__":
+    main()
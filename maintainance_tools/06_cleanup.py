@@ -0,0 +1,70 @@
+import sys
+import os
+import argparse
+
+# 現在のファイルのパスからプロジェクトのルートパスを取得してsys.pathに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from dotenv import load_dotenv
+
+from common.cleanup import Cleaner
+from common.client import get_client
+
+load_dotenv(override=True)
+client = get_client()
+
+
+def read_ids(path):
+    with open(path, "r") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="アシスタント・ファイル・ベクターストア・スレッドをまとめて削除します。"
+    )
+    parser.add_argument(
+        "kind", choices=["assistants", "files", "vector_stores", "threads"]
+    )
+    parser.add_argument("ids", nargs="*", help="削除するID（指定しない場合は一覧から取得）")
+    parser.add_argument("--ids-file", help="削除するIDを1行ずつ記載したファイル")
+    parser.add_argument(
+        "--older-than-days", type=float, help="作成からこの日数を過ぎたものだけを削除する"
+    )
+    parser.add_argument("--name-prefix", help="名前（ファイル名）がこの文字列で始まるものだけを削除する")
+    parser.add_argument("--purpose", help="ファイルの用途（filesのみ）")
+    parser.add_argument("--workers", type=int, default=8, help="同時に実行する削除リクエスト数")
+    parser.add_argument("--checkpoint", help="削除済みのIDを記録し、再実行時にスキップするファイル")
+    parser.add_argument("--dry-run", action="store_true", help="削除対象を表示するだけにする")
+    args = parser.parse_args()
+
+    ids = list(args.ids)
+    if args.ids_file:
+        ids.extend(read_ids(args.ids_file))
+    if args.kind == "threads" and not ids:
+        parser.error("threads cannot be listed; pass IDs or --ids-file")
+    if ids and (args.older_than_days is not None or args.name_prefix or args.purpose):
+        parser.error("--older-than-days/--name-prefix/--purpose cannot be combined with IDs")
+    if args.purpose and args.kind != "files":
+        parser.error("--purpose can only be used with files")
+
+    cleaner = Cleaner(
+        client,
+        args.kind,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        checkpoint_path=args.checkpoint,
+    )
+    report = cleaner.run(
+        ids=ids or None,
+        older_than_days=args.older_than_days,
+        name_prefix=args.name_prefix,
+        purpose=args.purpose,
+    )
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
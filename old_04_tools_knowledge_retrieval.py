@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
-from openai import OpenAI
 import os
 import traceback
 from dotenv import load_dotenv
 from dotenv import load_dotenv
-from common.utils import update_env_file
-from common.helper import transform_latest_assistant_messages, retrieve_runs
+from common.config_store import shared_config
+from common.helper import retrieve_runs
+from common.message_cache import shared_message_cache
+from common.client import get_client
 
 # 環境変数をロードし、OpenAIクライアントを初期化します。
 load_dotenv()
-client = OpenAI()
+client = get_client()
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 THREAD_ID = os.getenv("THREAD_ID")
 
@@ -37,10 +38,8 @@ def response_chatbot(assistant, thread, user_input):
     )
     # runの完了を待ち、結果を取得します。
     run = retrieve_runs(client=client, thread_id=thread.id, run_id=run.id, max_time=360)
-    # スレッド内のメッセージを取得します。
-    messages = client.beta.threads.messages.list(thread_id=thread.id)
-    # メッセージを変換してわかりやすい形式にします。
-    assistant_msg_list = transform_latest_assistant_messages(messages=messages)
+    # 前回までに取得したメッセージより新しいメッセージだけを取得し、わかりやすい形式に変換します。
+    assistant_msg_list = shared_message_cache(client, thread.id).transform_latest()
 
     # 応答メッセージをリストに追加します。
     result = []
@@ -81,8 +80,7 @@ def main():
         )
 
         # 環境変数ファイルを更新します。
-        update_env_file(".env", "ASSISTANT_ID", assistant.id)
-        update_env_file(".env", "THREAD_ID", thread.id)
+        shared_config(".env").update(ASSISTANT_ID=assistant.id, THREAD_ID=thread.id)
 
         # インスタンスの削除フラグを設定します。
         delete_instance = False
@@ -127,8 +125,7 @@ def main():
                 print(result_del_thread)
 
             # 環境変数ファイルをクリアします。
-            update_env_file(".env", "ASSISTANT_ID", "")
-            update_env_file(".env", "THREAD_ID", "")
+            shared_config(".env").update(ASSISTANT_ID="", THREAD_ID="")
 
 
 # メイン関数を実行します。